@@ -1,21 +1,81 @@
 from sanic import Sanic, Request
-from sanic.response import json, file, html
+from sanic.response import json, empty, file_stream, text
+from sanic.handlers import ContentRangeHandler
+from sanic.exceptions import HeaderNotFound, RangeNotSatisfiable
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 import sys
-import tempfile
+import asyncio
+import stat
+import time
 from datetime import datetime
-import requests
+from email.utils import formatdate, parsedate_to_datetime
 import urllib.parse
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # 导入分析模块
-from core.analysis import generate_html_from_excel
-from config import SERVER_BASE_URL, REPORT_DIR
+from core.analysis import (
+    generate_html_from_excel,
+    has_incremental_state,
+    parse_sheet_selection,
+    SheetNotFoundError,
+    stream_html_from_excel,
+    new_report_path,
+    client,
+    report_cache,
+    report_store,
+    ingest_executor,
+    upstream_limiter,
+)
+from core.executor import IngestQueueFullError, IngestTimeoutError, IngestWorkerError
+from core.memory import IngestTooLargeError
+from core.serializers import DATA_FORMATS
+from core.report_renderer import REPORT_MODES
+from core.limiter import UpstreamBusyError
+from core.singleflight import SingleFlight
+from core.compression import ENCODINGS, select_precompressed
+from core.fetcher import DownloadError, DownloadTooLargeError, FileFetcher
+from core.jobs import JobQueue, JobQueueFullError, JobStore, STATUS_QUEUED
+from core.metrics import (
+    DOWNLOAD_BYTES,
+    HTTP_BYTES_IN,
+    HTTP_BYTES_OUT,
+    HTTP_LATENCY,
+    HTTP_REQUESTS,
+    PROCESS_RSS,
+    REPORT_CACHE_EVENTS,
+    REPORT_STORE_BYTES,
+    REPORT_STORE_FILES,
+    current_rss_bytes,
+    monitor_event_loop,
+    registry,
+    server_timing_header,
+    start_request_spans,
+    timed_stage,
+)
+from config import (
+    SERVER_BASE_URL,
+    REPORT_GC_INTERVAL,
+    JOB_DB_PATH,
+    JOB_CONCURRENCY,
+    JOB_MAX_QUEUED,
+    JOB_STALE_AFTER,
+    JOB_RETRY_LIMIT,
+    JOB_RETRY_BACKOFF,
+    JOB_MAX_AGE,
+    JOB_GC_INTERVAL,
+    FETCH_CHUNK_SIZE,
+    FETCH_MAX_BYTES,
+    FETCH_CONNECT_TIMEOUT,
+    FETCH_READ_TIMEOUT,
+    FETCH_POOL_SIZE,
+    FETCH_HASH_ALGORITHM,
+    SERVER_TIMING_ENABLED,
+)
 
 app = Sanic("app")
 
@@ -26,6 +86,68 @@ app.config.REQUEST_MAX_SIZE = 50 * 1024 * 1024
 app.config.REQUEST_TIMEOUT = 300
 app.config.RESPONSE_TIMEOUT = 300
 
+# 按文件URL分析时使用的共享下载器
+file_fetcher = FileFetcher(
+    chunk_size=FETCH_CHUNK_SIZE,
+    max_bytes=FETCH_MAX_BYTES,
+    connect_timeout=FETCH_CONNECT_TIMEOUT,
+    read_timeout=FETCH_READ_TIMEOUT,
+    pool_size=FETCH_POOL_SIZE,
+    hash_algorithm=FETCH_HASH_ALGORITHM,
+)
+
+
+@app.listener("after_server_start")
+async def start_background_tasks(app, loop):
+    """启动后台分析任务队列、事件循环延迟监控、报告和任务清理，并预热解析进程池"""
+    await job_queue.start()
+    app.add_task(job_queue.run_gc(JOB_GC_INTERVAL), name="job_gc")
+    app.add_task(monitor_event_loop(), name="event_loop_monitor")
+    app.add_task(report_store.run_gc(REPORT_GC_INTERVAL), name="report_gc")
+    await ingest_executor.warmup()
+
+
+@app.listener("before_server_stop")
+async def stop_job_queue(app, loop):
+    """停止后台分析任务队列"""
+    await job_queue.stop()
+
+
+@app.listener("after_server_stop")
+async def close_shared_resources(app, loop):
+    """关闭星云服务和文件下载的共享连接池、解析进程池以及报告索引"""
+    await client.aclose()
+    await file_fetcher.aclose()
+    ingest_executor.shutdown()
+    report_store.close()
+
+
+@app.on_request
+async def start_request_metrics(request: Request):
+    """记录请求开始时间，并开启阶段耗时记录"""
+    request.ctx.started = time.perf_counter()
+    start_request_spans()
+
+
+@app.on_response
+async def record_request_metrics(request: Request, response):
+    """记录请求指标，按需添加 Server-Timing 响应头"""
+    elapsed = time.perf_counter() - request.ctx.started
+    route = request.route.path if request.route else "unmatched"
+
+    HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status)
+    HTTP_LATENCY.observe(elapsed, route=route)
+    HTTP_BYTES_IN.inc(len(request.body or b""), route=route)
+    # file_stream 等流式响应在中间件执行时尚未产生响应体
+    body = getattr(response, "body", None)
+    if body:
+        HTTP_BYTES_OUT.inc(len(body), route=route)
+
+    if SERVER_TIMING_ENABLED or request.args.get("timing"):
+        spans = server_timing_header()
+        total = f"total;dur={elapsed * 1000:.1f}"
+        response.headers["Server-Timing"] = f"{spans}, {total}" if spans else total
+
 
 @app.route("/", methods=["GET"])
 async def index(request: Request):
@@ -35,11 +157,14 @@ async def index(request: Request):
             "message": "Excel分析API服务",
             "version": "1.0.0",
             "endpoints": {
-                "/analyze": "POST - 上传Excel文件进行分析 (参数: file, uid可选)",
+                "/analyze": "POST - 上传Excel文件进行分析 (参数: file, uid可选, stream可选, sheets可选, data_format可选, report_mode可选)",
                 "/analyze/download": "POST - 上传Excel文件并返回下载链接 (参数: file, uid可选)",
-                "/analyze_by_file_url": "POST - 通过文件URL分析Excel文件 (支持JSON和表单数据格式，参数: file_url, file_name, uid可选)",
+                "/analyze_by_file_url": "POST - 通过文件URL分析Excel文件 (支持JSON和表单数据格式，参数: file_url, file_name, uid可选, sheets可选, data_format可选, report_mode可选)",
+                "/jobs": "POST - 提交后台分析任务，立即返回任务ID (参数同 /analyze_by_file_url)",
+                "/jobs/<job_id>": "GET - 查询后台分析任务状态及下载链接",
                 "/download/<filename>": "GET - 下载生成的报告",
                 "/health": "GET - 健康检查",
+                "/metrics": "GET - Prometheus格式的性能指标",
             },
         }
     )
@@ -53,10 +178,25 @@ async def health_check(request: Request):
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
             "service": "data-analysis-api",
+            "report_cache": report_cache.stats() if report_cache else None,
+            "upstream": upstream_limiter.stats(),
         }
     )
 
 
+@app.route("/metrics", methods=["GET"])
+async def metrics(request: Request):
+    """Prometheus格式的性能指标"""
+    PROCESS_RSS.set(current_rss_bytes())
+    if report_cache:
+        for result, count in report_cache.stats().items():
+            REPORT_CACHE_EVENTS.set(count, result=result)
+    store_stats = await asyncio.to_thread(report_store.stats)
+    REPORT_STORE_FILES.set(store_stats["files"])
+    REPORT_STORE_BYTES.set(store_stats["bytes"])
+    return text(registry.render(), content_type="text/plain; version=0.0.4")
+
+
 @app.route("/analyze", methods=["POST"])
 async def analyze_excel(request: Request):
     """
@@ -65,6 +205,10 @@ async def analyze_excel(request: Request):
     请求参数:
     - file: Excel文件 (.xlsx 或 .xls)
     - uid: 用户ID（可选，用于区分不同的聊天会话，如果不提供将自动生成）
+    - stream: 是否流式返回报告（可选，true/1 时边生成边以分块方式返回）
+    - sheets: 要分析的工作表（可选，all 表示全部，或逗号分隔的工作表名称；默认只分析第一个工作表）
+    - data_format: 发送给大模型的数据格式（可选，csv、csv_compact、dict、markdown、tsv；默认由 PROMPT_DATA_FORMAT 配置）
+    - report_mode: 报告生成方式（可选，llm 由大模型生成完整页面，template 使用本地模板只请求文字解读；默认由 REPORT_MODE 配置）
 
     返回:
     - 成功: HTML分析报告文件
@@ -99,47 +243,65 @@ async def analyze_excel(request: Request):
                 status=400,
             )
 
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(
-            delete=False, suffix=file_extension
-        ) as temp_file:
-            # 写入上传的文件内容
-            temp_file.write(uploaded_file.body)
-            temp_file_path = temp_file.name
+        # 获取uid参数（可选），如果没有则生成一个
+        uid = request.form.get("uid") if request.form else None
+        if not uid:
+            import uuid
 
-        try:
-            # 获取uid参数（可选），如果没有则生成一个
-            uid = request.form.get("uid") if request.form else None
-            if not uid:
-                import uuid
-
-                uid = f"user_{uuid.uuid4().hex[:8]}"
-                print(f"Generated uid: {uid}")
-
-            # 使用demo.py中的函数生成HTML报告
-            html_report_path = await generate_html_from_excel(temp_file_path, uid)
-
-            # 读取生成的HTML文件
-            with open(html_report_path, "r", encoding="utf-8") as f:
-                html_content = f.read()
-
-            # 获取文件名
-            report_filename = os.path.basename(html_report_path)
-
-            # 返回HTML文件
-            return html(
-                html_content,
-                headers={
-                    "Content-Disposition": f'attachment; filename="{report_filename}"',
-                    "Content-Type": "text/html; charset=utf-8",
-                },
+            uid = f"user_{uuid.uuid4().hex[:8]}"
+            print(f"Generated uid: {uid}")
+
+        # 直接从请求体解析上传内容，不再写入临时文件
+        body = uploaded_file.body
+        sheets = parse_sheet_selection(request.form.get("sheets") if request.form else None)
+
+        data_format = request.form.get("data_format") if request.form else None
+        report_mode = request.form.get("report_mode") if request.form else None
+        error_response = validate_output_params(data_format, report_mode)
+        if error_response:
+            return error_response
+
+        stream = request.form.get("stream") if request.form else None
+        if stream and stream.lower() in ("true", "1"):
+            # 流式响应已直接发送给客户端，处理函数无需再返回响应对象
+            return await stream_analysis_report(
+                request, body, uid, file_extension, sheets, data_format, report_mode
             )
 
-        finally:
-            # 清理临时文件
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+        # 使用demo.py中的函数生成HTML报告
+        html_report_path = await generate_html_from_excel(
+            body,
+            uid,
+            file_extension=file_extension,
+            sheets=sheets,
+            data_format=data_format,
+            report_mode=report_mode,
+        )
 
+        # 获取文件名
+        report_filename = os.path.basename(html_report_path)
+
+        # 直接流式返回报告文件，不整体读入内存
+        return await file_stream(
+            html_report_path,
+            mime_type="text/html; charset=utf-8",
+            headers={
+                "Content-Disposition": f'attachment; filename="{report_filename}"',
+            },
+        )
+
+    except IngestQueueFullError as e:
+        return json({"error": "服务繁忙", "message": str(e)}, status=503)
+    except IngestTimeoutError as e:
+        return json({"error": "处理超时", "message": str(e)}, status=504)
+    except IngestWorkerError as e:
+        return json({"error": "解析服务暂不可用", "message": str(e)}, status=503)
+    except IngestTooLargeError as e:
+        return json({"error": "数据过大", "message": str(e)}, status=413)
+    except SheetNotFoundError as e:
+        return sheet_not_found_response(e)
+    except UpstreamBusyError as e:
+        return upstream_busy_response(e)
     except Exception as e:
         # 记录错误日志
         print(f"分析Excel文件时出错: {str(e)}")
@@ -150,6 +312,290 @@ async def analyze_excel(request: Request):
         )
 
 
+async def stream_analysis_report(
+    request: Request,
+    excel_path,
+    uid: str,
+    file_extension: str = None,
+    sheets=None,
+    data_format=None,
+    report_mode=None,
+):
+    """
+    以分块响应的方式将模型输出的HTML实时转发给客户端，同时写入报告文件
+
+    首个片段在发送响应头之前获取，解析阶段的错误仍可由调用方返回JSON；
+    响应头发送后无法再返回JSON错误，出错时仅记录日志并结束响应。
+    生成失败时删除未完成的报告及其索引记录
+    """
+    report_path = await asyncio.to_thread(new_report_path, uid)
+    report_filename = os.path.basename(report_path)
+
+    chunks = stream_html_from_excel(
+        excel_path,
+        uid,
+        report_path,
+        file_extension=file_extension,
+        sheets=sheets,
+        data_format=data_format,
+        report_mode=report_mode,
+    )
+    try:
+        first_chunk = await anext(chunks, "")
+    except BaseException:
+        await asyncio.to_thread(report_store.discard, report_path)
+        raise
+
+    response = await request.respond(
+        content_type="text/html; charset=utf-8",
+        headers={
+            "Content-Disposition": f'attachment; filename="{report_filename}"',
+            "X-Report-Filename": report_filename,
+        },
+    )
+    try:
+        await response.send(first_chunk)
+        async for chunk in chunks:
+            await response.send(chunk)
+    except Exception as e:
+        print(f"流式生成报告时出错: {str(e)}")
+        await asyncio.to_thread(report_store.discard, report_path)
+    finally:
+        await response.eof()
+
+
+def sheet_not_found_response(error: SheetNotFoundError):
+    """请求的工作表不存在时返回 400，并列出工作簿中可用的工作表"""
+    return json(
+        {"error": "工作表不存在", "message": str(error), "sheets": error.available},
+        status=400,
+    )
+
+
+def upstream_busy_response(error: UpstreamBusyError):
+    """星云接口排队已满或被限流时返回 503，并提示客户端重试时间"""
+    headers = {}
+    if error.retry_after is not None:
+        headers["Retry-After"] = str(max(int(error.retry_after + 0.999), 1))
+    return json({"error": "服务繁忙", "message": str(error)}, status=503, headers=headers)
+
+
+def get_file_url_params(request: Request):
+    """
+    解析按文件URL分析的请求参数，支持JSON和表单数据两种格式
+
+    Returns:
+        dict: file_url, file_name, analysis_prompt, user_content, uid, sheets, data_format,
+        report_mode
+    """
+    keys = [
+        "file_url",
+        "file_name",
+        "analysis_prompt",
+        "user_content",
+        "uid",
+        "sheets",
+        "data_format",
+        "report_mode",
+    ]
+    if request.content_type and "application/json" in request.content_type:
+        # JSON格式
+        json_data = request.json
+        return {key: json_data.get(key) for key in keys}
+
+    # 表单数据格式
+    return {key: request.form.get(key) for key in keys}
+
+
+def validate_file_url_params(params):
+    """
+    校验按文件URL分析的请求参数，并在缺少uid时自动生成
+
+    Returns:
+        校验失败时返回错误响应，否则返回 None
+    """
+    if not params["file_url"] or not params["file_name"]:
+        return json(
+            {
+                "error": "文件URL或文件名缺失",
+                "message": "请提供file_url和file_name参数",
+            },
+            status=400,
+        )
+
+    if not params["uid"]:
+        import uuid
+
+        params["uid"] = f"user_{uuid.uuid4().hex[:8]}"
+        print(f"Generated uid: {params['uid']}")
+
+    # 检查文件扩展名
+    file_extension = os.path.splitext(params["file_name"])[1].lower()
+    if file_extension not in [".xlsx", ".xls"]:
+        return json(
+            {
+                "error": "不支持的文件格式",
+                "message": "只支持Excel文件格式(.xlsx或.xls)",
+            },
+            status=400,
+        )
+
+    return validate_output_params(params["data_format"], params["report_mode"])
+
+
+def validate_output_params(data_format, report_mode):
+    """
+    校验数据格式和报告生成方式参数，未提供时使用默认配置
+
+    Returns:
+        校验失败时返回错误响应，否则返回 None
+    """
+    if data_format and data_format not in DATA_FORMATS:
+        return json(
+            {
+                "error": "数据格式错误",
+                "message": f"data_format 只支持: {', '.join(DATA_FORMATS)}",
+            },
+            status=400,
+        )
+    if report_mode and report_mode not in REPORT_MODES:
+        return json(
+            {
+                "error": "报告生成方式错误",
+                "message": f"report_mode 只支持: {', '.join(REPORT_MODES)}",
+            },
+            status=400,
+        )
+    return None
+
+
+# 相同文件与分析参数的并发请求只下载、解析并调用大模型一次
+analysis_flights = SingleFlight("file_url_analysis")
+
+
+async def analysis_params_key(params, source):
+    """
+    按 文件来源 + 分析提示词 + 用户问题 + 工作表 + 数据格式 + 报告生成方式 计算请求合并键
+
+    不同用户分析同一份数据时共享同一份报告；只有用户保存了增量分析指纹时，
+    结果取决于该用户上次的数据，此时键中加入用户ID，只合并同一用户的请求
+    """
+    sheets = params.get("sheets")
+    incremental = await asyncio.to_thread(
+        has_incremental_state,
+        params["uid"],
+        params["analysis_prompt"],
+        parse_sheet_selection(sheets),
+        params.get("report_mode"),
+    )
+    return SingleFlight.make_key(
+        params["uid"] if incremental else None,
+        source,
+        os.path.splitext(params["file_name"])[1].lower(),
+        params["analysis_prompt"],
+        params["user_content"],
+        str(sheets) if sheets else None,
+        params.get("data_format"),
+        params.get("report_mode"),
+    )
+
+
+async def run_file_url_analysis(params):
+    """
+    下载文件并生成分析报告
+
+    对同一URL、或内容相同的文件，在分析参数相同时与进行中的请求合并，共享同一份报告；
+    用户保存了增量分析指纹时只与该用户自己的请求合并
+
+    Args:
+        params (dict): 经过 validate_file_url_params 校验的请求参数
+
+    Returns:
+        dict: download_url 和 filename
+    """
+    key = await analysis_params_key(params, f"url:{params['file_url']}")
+    return await analysis_flights.do(key, download_and_analyze, params)
+
+
+async def download_and_analyze(params):
+    """下载文件后生成报告，内容相同的文件再按内容哈希合并"""
+    file_extension = os.path.splitext(params["file_name"])[1].lower()
+
+    # 流式下载文件到临时目录，使用传入文件名的扩展名
+    with timed_stage("download"):
+        fetched = await file_fetcher.fetch_to_file(params["file_url"], file_extension)
+    DOWNLOAD_BYTES.observe(fetched.size)
+    temp_file_path = fetched.path
+
+    # 下载时已计算的 sha256 直接用于解析缓存和报告索引，不再重新读取文件计算
+    content_hash = (
+        fetched.content_hash if file_fetcher.hash_algorithm == "sha256" else None
+    )
+    try:
+        if fetched.content_hash:
+            source = f"content:{fetched.content_hash}"
+        elif fetched.etag:
+            source = f"etag:{params['file_url']}:{fetched.etag}"
+        else:
+            return await analyze_downloaded_file(temp_file_path, params)
+        key = await analysis_params_key(params, source)
+        return await analysis_flights.do(
+            key, analyze_downloaded_file, temp_file_path, params, content_hash
+        )
+
+    finally:
+        # 清理临时文件
+        if os.path.exists(temp_file_path):
+            os.unlink(temp_file_path)
+
+
+async def analyze_downloaded_file(temp_file_path, params, content_hash=None):
+    """
+    分析已下载的文件
+
+    Args:
+        temp_file_path (str): 下载的临时文件路径
+        params (dict): 经过 validate_file_url_params 校验的请求参数
+        content_hash (str): 下载时计算的文件内容 sha256（可选）
+
+    Returns:
+        dict: download_url 和 filename
+    """
+    # 使用demo.py中的函数生成HTML报告
+    html_report_path = await generate_html_from_excel(
+        temp_file_path,
+        params["uid"],
+        params["analysis_prompt"],
+        params["user_content"],
+        sheets=parse_sheet_selection(params.get("sheets")),
+        data_format=params.get("data_format"),
+        report_mode=params.get("report_mode"),
+        content_hash=content_hash,
+    )
+
+    # 获取文件名
+    report_filename = os.path.basename(html_report_path)
+
+    # 返回完整的访问链接
+    return {
+        "download_url": f"{SERVER_BASE_URL}/download/{report_filename}",
+        "filename": report_filename,
+    }
+
+
+job_queue = JobQueue(
+    JobStore(JOB_DB_PATH),
+    run_file_url_analysis,
+    concurrency=JOB_CONCURRENCY,
+    max_queued=JOB_MAX_QUEUED,
+    stale_after=JOB_STALE_AFTER,
+    retryable=(UpstreamBusyError, IngestQueueFullError),
+    max_retries=JOB_RETRY_LIMIT,
+    retry_backoff=JOB_RETRY_BACKOFF,
+    max_age=JOB_MAX_AGE,
+)
+
+
 @app.route("/analyze_by_file_url", methods=["POST"])
 async def analyze_by_file_url(request: Request):
     """
@@ -163,145 +609,226 @@ async def analyze_by_file_url(request: Request):
     - file_url: 文件的URL
     - file_name: 文件名
     - uid: 用户ID（可选，用于区分不同的聊天会话，如果不提供将自动生成）
+    - sheets: 要分析的工作表（可选，all、逗号分隔的名称或JSON列表；默认只分析第一个工作表）
+    - data_format: 发送给大模型的数据格式（可选，csv、csv_compact、dict、markdown、tsv；默认由 PROMPT_DATA_FORMAT 配置）
+    - report_mode: 报告生成方式（可选，llm 由大模型生成完整页面，template 使用本地模板只请求文字解读；默认由 REPORT_MODE 配置）
 
     返回:
     - 成功: HTML分析报告文件
     - 失败: 错误信息
     """
     try:
-        # 支持JSON和表单数据两种格式
-        if request.content_type and "application/json" in request.content_type:
-            # JSON格式
-            try:
-                json_data = request.json
-                file_url = json_data.get("file_url")
-                file_name = json_data.get("file_name")
-                analysis_prompt = json_data.get("analysis_prompt")
-                user_content = json_data.get("user_content")
-                uid = json_data.get("uid")
-            except Exception as e:
-                return json(
-                    {
-                        "error": "JSON格式错误",
-                        "message": f"无法解析JSON数据: {str(e)}",
-                    },
-                    status=400,
-                )
-        else:
-            # 表单数据格式
-            file_url = request.form.get("file_url")
-            file_name = request.form.get("file_name")
-            analysis_prompt = request.form.get("analysis_prompt")
-            user_content = request.form.get("user_content")
-            uid = request.form.get("uid")
-
-        if not file_url or not file_name:
+        try:
+            params = get_file_url_params(request)
+        except Exception as e:
             return json(
                 {
-                    "error": "文件URL或文件名缺失",
-                    "message": "请提供file_url和file_name参数",
+                    "error": "JSON格式错误",
+                    "message": f"无法解析JSON数据: {str(e)}",
                 },
                 status=400,
             )
 
-        if not uid:
-            import uuid
-
-            uid = f"user_{uuid.uuid4().hex[:8]}"
-            print(f"Generated uid: {uid}")
+        error_response = validate_file_url_params(params)
+        if error_response:
+            return error_response
 
-        # 检查文件扩展名
-        file_extension = os.path.splitext(file_name)[1].lower()
-        if file_extension not in [".xlsx", ".xls"]:
-            return json(
-                {
-                    "error": "不支持的文件格式",
-                    "message": "只支持Excel文件格式(.xlsx或.xls)",
-                },
-                status=400,
-            )
+        result = await run_file_url_analysis(params)
+        return json(
+            {
+                "success": True,
+                "message": "分析完成",
+                "download_url": result["download_url"],
+                "filename": result["filename"],
+                "timestamp": datetime.now().isoformat(),
+            }
+        )
 
-        # 下载文件到临时目录，使用传入的文件名
-        with tempfile.NamedTemporaryFile(
-            delete=False, suffix=file_extension
-        ) as temp_file:
-            file_response = requests.get(file_url, stream=True)
-            if file_response.status_code != 200:
-                return json(
-                    {
-                        "error": "文件下载失败",
-                        "message": f"从URL下载文件失败: {file_response.status_code}",
-                    },
-                    status=500,
-                )
-            for chunk in file_response.iter_content(chunk_size=8192):
-                temp_file.write(chunk)
-            temp_file_path = temp_file.name
+    except DownloadTooLargeError as e:
+        return json({"error": "文件过大", "message": str(e)}, status=413)
+    except DownloadError as e:
+        return json({"error": "文件下载失败", "message": str(e)}, status=500)
+    except IngestQueueFullError as e:
+        return json({"error": "服务繁忙", "message": str(e)}, status=503)
+    except IngestTimeoutError as e:
+        return json({"error": "处理超时", "message": str(e)}, status=504)
+    except IngestWorkerError as e:
+        return json({"error": "解析服务暂不可用", "message": str(e)}, status=503)
+    except IngestTooLargeError as e:
+        return json({"error": "数据过大", "message": str(e)}, status=413)
+    except SheetNotFoundError as e:
+        return sheet_not_found_response(e)
+    except UpstreamBusyError as e:
+        return upstream_busy_response(e)
+    except Exception as e:
+        # 记录错误日志
+        print(f"通过URL分析Excel文件时出错: {str(e)}")
 
-        try:
-            # 使用demo.py中的函数生成HTML报告
-            html_report_path = await generate_html_from_excel(
-                temp_file_path, uid, analysis_prompt, user_content
-            )
+        return json(
+            {"error": "分析失败", "message": f"处理文件时发生错误: {str(e)}"},
+            status=500,
+        )
 
-            # 获取文件名
-            report_filename = os.path.basename(html_report_path)
 
-            # 返回完整的访问链接
-            full_url = f"{SERVER_BASE_URL}/download/{report_filename}"
-            return json(
-                {
-                    "success": True,
-                    "message": "分析完成",
-                    "download_url": full_url,
-                    "filename": report_filename,
-                    "timestamp": datetime.now().isoformat(),
-                }
-            )
+@app.route("/jobs", methods=["POST"])
+async def submit_job(request: Request):
+    """
+    提交后台分析任务，立即返回任务ID
 
-        finally:
-            # 清理临时文件
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+    请求参数与 /analyze_by_file_url 相同
 
+    返回:
+    - 成功: 任务ID及状态查询地址
+    - 失败: 错误信息
+    """
+    try:
+        params = get_file_url_params(request)
     except Exception as e:
-        # 记录错误日志
-        print(f"通过URL分析Excel文件时出错: {str(e)}")
+        return json(
+            {"error": "JSON格式错误", "message": f"无法解析JSON数据: {str(e)}"},
+            status=400,
+        )
+
+    error_response = validate_file_url_params(params)
+    if error_response:
+        return error_response
+
+    try:
+        job_id = await job_queue.submit(params)
+    except JobQueueFullError as e:
+        return json({"error": "服务繁忙", "message": str(e)}, status=503)
+
+    return json(
+        {
+            "success": True,
+            "job_id": job_id,
+            "status": STATUS_QUEUED,
+            "status_url": f"{SERVER_BASE_URL}/jobs/{job_id}",
+        },
+        status=202,
+    )
 
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+async def get_job(request: Request, job_id: str):
+    """
+    查询后台分析任务状态
+
+    返回:
+    - status: queued / running / done / failed
+    - 完成时包含 download_url 和 filename，失败时包含 message
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
         return json(
-            {"error": "分析失败", "message": f"处理文件时发生错误: {str(e)}"},
-            status=500,
+            {"error": "任务不存在", "message": f"任务 {job_id} 不存在"}, status=404
         )
 
+    response = {
+        "job_id": job_id,
+        "status": job["status"],
+        "created_at": datetime.fromtimestamp(job["created_at"]).isoformat(),
+        "updated_at": datetime.fromtimestamp(job["updated_at"]).isoformat(),
+    }
+    if job["result"]:
+        response.update(job["result"])
+    if job["error"]:
+        response["message"] = job["error"]
+    return json(response)
+
+
+def report_etag(stats, encoding=None):
+    """根据报告文件大小和修改时间生成强ETag，压缩副本带编码后缀"""
+    tag = f"{stats.st_size:x}-{stats.st_mtime_ns:x}"
+    if encoding:
+        tag = f"{tag}-{encoding}"
+    return f'"{tag}"'
+
+
+def is_not_modified(request: Request, stats):
+    """根据 If-None-Match / If-Modified-Since 判断客户端缓存是否仍然有效"""
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        etags = {report_etag(stats)} | {
+            report_etag(stats, encoding) for encoding, _ in ENCODINGS
+        }
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return bool(etags & candidates)
+
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(stats.st_mtime) <= since
+
+    return False
+
 
 @app.route("/download/<filename:path>", methods=["GET"])
 async def download_report(request: Request, filename: str):
     """
     下载生成的HTML报告
 
+    支持 ETag / Last-Modified 协商缓存、Range 分段下载，
+    并按 Accept-Encoding 返回预先生成的 .br / .gz 压缩副本
+
     参数:
     - filename: 报告文件名
     """
     try:
-        # 构建报告文件路径 - 修复路径问题
-        file_path = os.path.join(REPORT_DIR, filename)
-
-        print(f"Looking for file: {file_path}")
-        print(f"File exists: {os.path.exists(file_path)}")
-        print(f"Reports directory: {REPORT_DIR}")
+        # 按报告索引定位文件，只能访问索引中的报告或报告目录下的旧报告
+        file_path = await asyncio.to_thread(report_store.resolve, filename)
 
         # 检查文件是否存在
-        if not os.path.exists(file_path):
+        try:
+            stats = await asyncio.to_thread(os.stat, file_path) if file_path else None
+        except FileNotFoundError:
+            stats = None
+        if stats is None or not stat.S_ISREG(stats.st_mode):
             return json(
                 {"error": "文件不存在", "message": f"报告文件 {filename} 不存在"},
                 status=404,
             )
 
-            # 读取HTML文件内容并直接返回
-        with open(file_path, "r", encoding="utf-8") as f:
-            html_content = f.read()
+        headers = {
+            "ETag": report_etag(stats),
+            "Last-Modified": formatdate(stats.st_mtime, usegmt=True),
+            "Cache-Control": "public, max-age=3600",
+            "Accept-Ranges": "bytes",
+            "Vary": "Accept-Encoding",
+        }
+        if is_not_modified(request, stats):
+            return empty(status=304, headers=headers)
+
+        mime_type = "text/html; charset=utf-8" if file_path.endswith(".html") else None
+
+        # 分段请求直接返回原始文件
+        if request.headers.get("Range"):
+            try:
+                content_range = ContentRangeHandler(request, stats)
+            except (RangeNotSatisfiable, HeaderNotFound):
+                headers["Content-Range"] = f"bytes */{stats.st_size}"
+                return empty(status=416, headers=headers)
+            return await file_stream(
+                file_path,
+                mime_type=mime_type,
+                headers=headers,
+                _range=content_range,
+            )
+
+        compressed_path, encoding = await asyncio.to_thread(
+            select_precompressed, file_path, request.headers.get("Accept-Encoding")
+        )
+        if compressed_path:
+            headers["ETag"] = report_etag(stats, encoding)
+            headers["Content-Encoding"] = encoding
+            return await file_stream(compressed_path, mime_type=mime_type, headers=headers)
 
-        return html(html_content)
+        return await file_stream(file_path, mime_type=mime_type, headers=headers)
 
     except Exception as e:
         print(f"下载文件时出错: {str(e)}")
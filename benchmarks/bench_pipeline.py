@@ -0,0 +1,223 @@
+"""
+分析流程基准测试
+
+在不同形态的合成工作簿上分别测量 read_data_file、clean_dataframe、预计算指标、提示词构建的耗时和内存峰值，
+并可选地针对本地模拟星云服务测量 /analyze 端到端耗时。结果写入JSON，便于跨提交对比。
+
+用法:
+    python -m benchmarks.bench_pipeline --output bench_output.json
+    python -m benchmarks.bench_pipeline --scenarios small messy --e2e --requests 5 --latency 0.5
+    python -m benchmarks.bench_pipeline --e2e --output-tps 50 --report-mode template
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import SCENARIOS, write_scenario
+from benchmarks.utils import local_stack, measure_in_subprocess, run_metadata
+
+# 输出清洗耗时最长的列数
+SLOWEST_COLUMNS = 3
+
+
+def _pipeline_stages(path):
+    """子进程中依次执行解析、清洗和提示词构建，返回各阶段耗时"""
+    from core.analysis import (
+        DEFAULT_ANALYSIS_PROMPT,
+        build_analysis_prompt,
+        clean_dataframe,
+        read_data_file,
+    )
+    from core.insights import append_insights, compute_insights
+    from core.memory import optimize_dtypes
+    from core.summarize import build_data_section
+    from core.tokens import estimate_tokens
+    from config import (
+        INGEST_ARROW_STRINGS,
+        INGEST_CATEGORY_MAX_RATIO,
+        INGEST_OPTIMIZE_DTYPES,
+        INSIGHTS_ENABLED,
+        INSIGHTS_TOKEN_BUDGET,
+        PROMPT_DATA_FORMAT,
+        PROMPT_FLOAT_DIGITS,
+        PROMPT_TOKEN_BUDGET,
+    )
+
+    stages = {}
+    started = time.perf_counter()
+    df = read_data_file(path)
+    stages["read_data_file"] = time.perf_counter() - started
+
+    column_timings = {}
+    started = time.perf_counter()
+    df = clean_dataframe(df, column_timings)
+    stages["clean_dataframe"] = time.perf_counter() - started
+
+    # 与服务端一致：清洗后按配置压缩列类型，后续阶段在压缩后的类型上计时
+    if INGEST_OPTIMIZE_DTYPES:
+        started = time.perf_counter()
+        df = optimize_dtypes(df, INGEST_CATEGORY_MAX_RATIO, INGEST_ARROW_STRINGS)
+        stages["optimize_dtypes"] = time.perf_counter() - started
+
+    insights = {}
+    if INSIGHTS_ENABLED:
+        started = time.perf_counter()
+        insights = compute_insights(df, INSIGHTS_TOKEN_BUDGET)
+        stages["insights"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    data_text, data_label = build_data_section(
+        df, PROMPT_TOKEN_BUDGET, PROMPT_DATA_FORMAT, PROMPT_FLOAT_DIGITS
+    )
+    data_text = append_insights(data_text, insights)
+    prompt = build_analysis_prompt(data_text, DEFAULT_ANALYSIS_PROMPT, None, data_label)
+    stages["build_prompt"] = time.perf_counter() - started
+
+    return {
+        "stages": {name: round(seconds, 4) for name, seconds in stages.items()},
+        "slowest_clean_columns": {
+            col: round(seconds, 4)
+            for col, seconds in sorted(
+                column_timings.items(), key=lambda item: item[1], reverse=True
+            )[:SLOWEST_COLUMNS]
+        },
+        "rows": len(df),
+        "columns": len(df.columns),
+        "prompt_chars": len(prompt),
+        "prompt_tokens": estimate_tokens(prompt),
+    }
+
+
+def run_stage_benchmarks(paths):
+    results = {}
+    for name, path in paths.items():
+        measured = measure_in_subprocess(_pipeline_stages, path)
+        if "error" in measured:
+            print(f"  {name:<14} 失败\n{measured['error']}")
+            results[name] = measured
+            continue
+        detail = measured.pop("result")
+        measured.update(detail)
+        results[name] = measured
+        stages = "  ".join(f"{k}={v:.3f}s" for k, v in detail["stages"].items())
+        print(
+            f"  {name:<14} {stages}  峰值内存 {measured['peak_rss_mb']:.1f} MB"
+            f"  prompt≈{detail['prompt_tokens']} tokens"
+        )
+        slowest = "  ".join(
+            f"{col}={seconds:.3f}s" for col, seconds in detail["slowest_clean_columns"].items()
+        )
+        if slowest:
+            print(f"  {'':<14} 清洗最慢的列: {slowest}")
+    return results
+
+
+def run_e2e_benchmarks(paths, requests, mock_args, report_mode="llm"):
+    results = {}
+    # 关闭报告缓存和解析缓存，保证每次请求都完整走一遍流程
+    app_env = {
+        "REPORT_CACHE_ENABLED": "false",
+        "FRAME_CACHE_ENABLED": "false",
+        "REPORT_MODE": report_mode,
+    }
+    with local_stack(mock_args, app_env) as (base_url, _):
+        with httpx.Client(base_url=base_url, timeout=600) as http:
+            for name, path in paths.items():
+                latencies = []
+                report_bytes = []
+                server_timings = []
+                with open(path, "rb") as f:
+                    content = f.read()
+                for _ in range(requests):
+                    started = time.perf_counter()
+                    response = http.post(
+                        "/analyze",
+                        params={"timing": 1},
+                        files={"file": (os.path.basename(path), content)},
+                    )
+                    latencies.append(time.perf_counter() - started)
+                    report_bytes.append(len(response.content))
+                    if response.status_code != 200:
+                        print(f"  {name}: HTTP {response.status_code} {response.text[:200]}")
+                    server_timings.append(response.headers.get("Server-Timing"))
+                results[name] = {
+                    "requests": requests,
+                    "upload_bytes": len(content),
+                    "min_seconds": round(min(latencies), 4),
+                    "median_seconds": round(statistics.median(latencies), 4),
+                    "max_seconds": round(max(latencies), 4),
+                    "report_bytes": statistics.median(report_bytes),
+                    "server_timing": server_timings,
+                }
+                print(
+                    f"  {name:<14} 中位数 {results[name]['median_seconds']:.3f}s"
+                    f"  (min {results[name]['min_seconds']:.3f}s, max {results[name]['max_seconds']:.3f}s)"
+                    f"  报告 {results[name]['report_bytes'] / 1024:.0f} KB"
+                )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析流程基准测试")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--e2e", action="store_true", help="同时测量 /analyze 端到端耗时")
+    parser.add_argument("--requests", type=int, default=3, help="端到端测试每个场景的请求数")
+    parser.add_argument("--latency", type=float, default=0.5, help="模拟星云接口延迟（秒）")
+    parser.add_argument(
+        "--output-tps",
+        type=float,
+        default=0.0,
+        help="模拟星云接口输出速度（token/秒），0 表示输出耗时与报告长度无关",
+    )
+    parser.add_argument(
+        "--report-mode", choices=["llm", "template"], default="llm", help="端到端测试的报告生成方式"
+    )
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+
+    output = {"meta": run_metadata(), "scenarios": {}, "stages": {}, "e2e": {}}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = {}
+        for name in args.scenarios:
+            path = os.path.join(tmp_dir, f"{name}.xlsx")
+            write_scenario(path, name)
+            paths[name] = path
+            output["scenarios"][name] = dict(
+                SCENARIOS[name], file_bytes=os.path.getsize(path)
+            )
+
+        print("流程各阶段:")
+        output["stages"] = run_stage_benchmarks(paths)
+
+        if args.e2e:
+            print("\n/analyze 端到端:")
+            mock_args = [
+                "--latency",
+                str(args.latency),
+                "--chunks",
+                "1",
+                "--chunk-delay",
+                "0",
+                "--output-tps",
+                str(args.output_tps),
+            ]
+            output["e2e"] = run_e2e_benchmarks(
+                paths, args.requests, mock_args, args.report_mode
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
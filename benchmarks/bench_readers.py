@@ -0,0 +1,73 @@
+"""
+Excel读取引擎基准测试
+
+在合成工作簿上对比各读取引擎的耗时和内存峰值。与线上读取路径一致，
+计时包含读取原始单元格（read_sheet_raw）和识别表头（split_header）。
+每次读取在独立子进程中执行，以便准确统计内存峰值。
+
+用法:
+    python -m benchmarks.bench_readers --rows 1000 10000 100000 --cols 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import write_workbook
+from benchmarks.utils import measure_in_subprocess, run_metadata
+from config import HEADER_SCAN_ROWS
+from core.headers import split_header
+from core.readers import available_engines, read_sheet_raw
+
+
+def _read_shape(path, engine):
+    raw, merged = read_sheet_raw(path, engine)
+    df, _ = split_header(raw, merged, HEADER_SCAN_ROWS)
+    return list(df.shape)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Excel读取引擎基准测试")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--cols", type=int, default=20)
+    parser.add_argument("--messy", action="store_true", help="生成文本格式的货币金额")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in args.rows:
+            path = os.path.join(tmp_dir, f"bench_{rows}x{args.cols}.xlsx")
+            write_workbook(path, rows, args.cols, messy=args.messy)
+            size_mb = os.path.getsize(path) / 1024 / 1024
+            print(f"\n{rows} 行 x {args.cols} 列, 文件大小 {size_mb:.1f} MB")
+
+            for engine in available_engines(".xlsx"):
+                result = measure_in_subprocess(_read_shape, path, engine)
+                result["shape"] = result.pop("result", None)
+                result.update(
+                    {"engine": engine, "rows": rows, "cols": args.cols, "file_mb": size_mb}
+                )
+                results.append(result)
+                print(
+                    f"  {engine:<16} {result['seconds']:>8.3f}s"
+                    f"  峰值内存 {result['peak_rss_mb']:>8.1f} MB"
+                    f"  (+{result['delta_rss_mb']:.1f} MB)"
+                )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {"meta": run_metadata(), "results": results},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
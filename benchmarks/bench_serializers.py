@@ -0,0 +1,115 @@
+"""
+提示词数据格式基准测试
+
+在合成工作簿（及可选的真实文件）上对比各序列化格式的字符数、估算 token 数、
+相对 csv 的比例和序列化耗时，用于选择 PROMPT_DATA_FORMAT。数据与线上一致，
+清洗后按 INGEST_OPTIMIZE_DTYPES 等配置转换类型。
+
+用法:
+    python -m benchmarks.bench_serializers
+    python -m benchmarks.bench_serializers --scenarios small messy --files data/样例.xlsx --output formats.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import SCENARIOS, write_scenario
+from benchmarks.utils import run_metadata
+from core.analysis import clean_dataframe, read_data_file
+from core.memory import optimize_dtypes
+from core.serializers import DATA_FORMATS, FORMAT_CSV, serialize_frame
+from core.tokens import estimate_tokens
+from config import (
+    INGEST_ARROW_STRINGS,
+    INGEST_CATEGORY_MAX_RATIO,
+    INGEST_OPTIMIZE_DTYPES,
+    PROMPT_FLOAT_DIGITS,
+)
+
+# multi_sheet 只读取第一个工作表，与默认分析行为一致
+DEFAULT_SCENARIOS = ["small", "tall", "wide", "messy", "multi_header"]
+
+
+def compare_formats(df, float_digits):
+    """按各格式序列化同一份数据，返回字符数、token 数和耗时"""
+    results = {}
+    for data_format in DATA_FORMATS:
+        started = time.perf_counter()
+        text = serialize_frame(df, data_format, float_digits)
+        seconds = time.perf_counter() - started
+        results[data_format] = {
+            "chars": len(text),
+            "tokens": estimate_tokens(text),
+            "seconds": round(seconds, 4),
+        }
+
+    baseline = results[FORMAT_CSV]["tokens"] or 1
+    for result in results.values():
+        result["token_ratio"] = round(result["tokens"] / baseline, 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="提示词数据格式基准测试")
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=sorted(SCENARIOS),
+        default=DEFAULT_SCENARIOS,
+    )
+    parser.add_argument("--files", nargs="*", default=[], help="额外参与对比的Excel文件")
+    parser.add_argument("--float-digits", type=int, default=PROMPT_FLOAT_DIGITS)
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = {}
+        for name in args.scenarios:
+            path = os.path.join(tmp_dir, f"{name}.xlsx")
+            write_scenario(path, name)
+            paths[name] = path
+        for path in args.files:
+            paths[os.path.basename(path)] = path
+
+        for name, path in paths.items():
+            df = clean_dataframe(read_data_file(path))
+            if INGEST_OPTIMIZE_DTYPES:
+                df = optimize_dtypes(df, INGEST_CATEGORY_MAX_RATIO, INGEST_ARROW_STRINGS)
+            print(f"\n{name}: {len(df)} 行 x {len(df.columns)} 列")
+            formats = compare_formats(df, args.float_digits)
+            for data_format, result in formats.items():
+                print(
+                    f"  {data_format:<12} {result['chars']:>12,} 字符"
+                    f"  {result['tokens']:>12,} tokens"
+                    f"  {result['token_ratio']:>6.1%}"
+                    f"  {result['seconds']:>8.3f}s"
+                )
+            results[name] = {
+                "rows": len(df),
+                "columns": len(df.columns),
+                "formats": formats,
+            }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "meta": run_metadata(),
+                    "float_digits": args.float_digits,
+                    "results": results,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+并发压测
+
+对 /analyze、/analyze_by_file_url 或 /download/<filename> 做并发度阶梯扫描，
+默认启动本地模拟星云服务（模拟首字延迟和逐token输出）和分析服务，
+每一级并发输出 p50/p95/p99 延迟、吞吐量、错误数、事件循环延迟和进程内存。
+
+事件循环延迟和内存来自分析服务的 /metrics；多 worker 部署时指标按进程统计，
+每次抓取只反映处理该次请求的 worker。
+
+用法:
+    python -m benchmarks.loadtest --endpoint analyze --concurrency 1 2 4 8 16
+    python -m benchmarks.loadtest --endpoint analyze --stream --latency 1.0 --chunks 200
+    python -m benchmarks.loadtest --endpoint analyze_by_file_url --workers 2 --output load.json
+    python -m benchmarks.loadtest --endpoint download --base-url http://127.0.0.1:8000
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import time
+from contextlib import nullcontext
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import SCENARIOS, write_scenario
+from benchmarks.utils import local_stack, run_metadata
+
+ENDPOINTS = ["analyze", "analyze_by_file_url", "download"]
+
+_SAMPLE_RE = re.compile(r'^(\w+)(?:\{([^}]*)\})? (\S+)$')
+
+
+def parse_metrics(text):
+    """
+    解析 Prometheus 文本格式中压测关心的指标
+
+    Returns:
+        dict: rss 字节数、事件循环延迟的分桶计数、总和与次数
+    """
+    result = {"rss": None, "lag_buckets": {}, "lag_sum": 0.0, "lag_count": 0}
+    for line in text.splitlines():
+        match = _SAMPLE_RE.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        if name == "process_resident_memory_bytes":
+            result["rss"] = float(value)
+        elif name == "event_loop_lag_seconds_bucket":
+            bound = re.search(r'le="([^"]+)"', labels).group(1)
+            result["lag_buckets"][float(bound)] = float(value)
+        elif name == "event_loop_lag_seconds_sum":
+            result["lag_sum"] = float(value)
+        elif name == "event_loop_lag_seconds_count":
+            result["lag_count"] = float(value)
+    return result
+
+
+def lag_summary(before, after):
+    """根据两次抓取的差值估算本级并发期间的事件循环延迟"""
+    count = after["lag_count"] - before["lag_count"]
+    if count <= 0:
+        return {"samples": 0}
+    buckets = sorted(after["lag_buckets"])
+    deltas = [
+        after["lag_buckets"][bound] - before["lag_buckets"].get(bound, 0)
+        for bound in buckets
+    ]
+
+    def quantile(q):
+        # 取累计计数首次达到分位点的分桶上界
+        for bound, cumulative in zip(buckets, deltas):
+            if cumulative >= q * count:
+                return bound
+        return math.inf
+
+    return {
+        "samples": int(count),
+        "mean_ms": round((after["lag_sum"] - before["lag_sum"]) / count * 1000, 2),
+        "p99_le_ms": quantile(0.99) * 1000,
+        "max_le_ms": quantile(1.0) * 1000,
+    }
+
+
+def percentile(values, q):
+    """最近秩法分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(math.ceil(q * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+class LoadRunner:
+    """按固定并发度持续发送请求"""
+
+    def __init__(self, http, endpoint, workbook, file_url=None, download_path=None, stream=False):
+        """
+        初始化压测执行器
+
+        Args:
+            http (httpx.AsyncClient): 指向分析服务的客户端
+            endpoint (str): analyze / analyze_by_file_url / download
+            workbook (str): 上传用的工作簿路径
+            file_url (str): analyze_by_file_url 使用的文件URL
+            download_path (str): download 使用的报告下载路径
+            stream (bool): analyze 是否使用流式响应
+        """
+        self.http = http
+        self.endpoint = endpoint
+        self.file_name = os.path.basename(workbook)
+        with open(workbook, "rb") as f:
+            self.content = f.read()
+        self.file_url = file_url
+        self.download_path = download_path
+        self.stream = stream
+
+    async def request_once(self):
+        """发送一次请求，返回 (状态码, 首字节耗时, 总耗时, 响应字节数)"""
+        started = time.perf_counter()
+        if self.endpoint == "analyze":
+            request = self.http.build_request(
+                "POST",
+                "/analyze",
+                data={"stream": "true"} if self.stream else None,
+                files={"file": (self.file_name, self.content)},
+            )
+        elif self.endpoint == "analyze_by_file_url":
+            request = self.http.build_request(
+                "POST",
+                "/analyze_by_file_url",
+                json={"file_url": self.file_url, "file_name": self.file_name},
+            )
+        else:
+            request = self.http.build_request("GET", self.download_path)
+
+        response = await self.http.send(request, stream=True)
+        try:
+            first_byte = None
+            size = 0
+            async for chunk in response.aiter_raw():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - started
+                size += len(chunk)
+        finally:
+            await response.aclose()
+        elapsed = time.perf_counter() - started
+        return response.status_code, first_byte if first_byte is not None else elapsed, elapsed, size
+
+    async def run_step(self, concurrency, total):
+        """
+        以给定并发度完成 total 个请求
+
+        Returns:
+            dict: 本级并发的延迟分位数、吞吐量和错误统计
+        """
+        remaining = total
+        latencies, first_bytes, errors = [], [], {}
+        response_bytes = 0
+
+        async def worker():
+            nonlocal remaining, response_bytes
+            while remaining > 0:
+                remaining -= 1
+                try:
+                    status, first_byte, elapsed, size = await self.request_once()
+                except httpx.HTTPError as e:
+                    key = type(e).__name__
+                    errors[key] = errors.get(key, 0) + 1
+                    continue
+                if status >= 400:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+                    continue
+                latencies.append(elapsed)
+                first_bytes.append(first_byte)
+                response_bytes += size
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        wall = time.perf_counter() - started
+
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "concurrency": concurrency,
+            "requests": total,
+            "ok": len(latencies),
+            "errors": errors,
+            "wall_seconds": round(wall, 3),
+            "throughput_rps": round(len(latencies) / wall, 3) if wall else None,
+            "p50_ms": ms(percentile(latencies, 0.50)),
+            "p95_ms": ms(percentile(latencies, 0.95)),
+            "p99_ms": ms(percentile(latencies, 0.99)),
+            "ttfb_p50_ms": ms(percentile(first_bytes, 0.50)),
+            "ttfb_p95_ms": ms(percentile(first_bytes, 0.95)),
+            "response_bytes": response_bytes,
+        }
+
+
+async def scrape_metrics(http):
+    response = await http.get("/metrics")
+    response.raise_for_status()
+    return parse_metrics(response.text)
+
+
+async def sample_rss(http, interval, peaks):
+    """压测期间周期性抓取内存，记录观察到的峰值"""
+    while True:
+        try:
+            rss = (await scrape_metrics(http))["rss"]
+            if rss is not None:
+                peaks.append(rss)
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(interval)
+
+
+async def prepare_download_path(http, workbook):
+    """先完成一次分析，得到可重复下载的报告路径"""
+    with open(workbook, "rb") as f:
+        content = f.read()
+    response = await http.post(
+        "/analyze", files={"file": (os.path.basename(workbook), content)}
+    )
+    response.raise_for_status()
+    filename = response.headers["Content-Disposition"].split('filename="')[1].rstrip('"')
+    return f"/download/{filename}"
+
+
+async def run_sweep(base_url, args, workbook, file_url):
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as http:
+        download_path = None
+        if args.endpoint == "download":
+            download_path = await prepare_download_path(http, workbook)
+
+        runner = LoadRunner(http, args.endpoint, workbook, file_url, download_path, args.stream)
+        if args.warmup:
+            await runner.run_step(1, args.warmup)
+
+        steps = []
+        for concurrency in args.concurrency:
+            total = max(args.requests, concurrency * args.requests_per_slot)
+            before = await scrape_metrics(http)
+            peaks = []
+            sampler = asyncio.create_task(sample_rss(http, args.sample_interval, peaks))
+            try:
+                step = await runner.run_step(concurrency, total)
+            finally:
+                sampler.cancel()
+            after = await scrape_metrics(http)
+
+            step["event_loop_lag"] = lag_summary(before, after)
+            rss_values = peaks + [after["rss"]] if after["rss"] is not None else peaks
+            step["rss_mb"] = round(after["rss"] / 1024**2, 1) if after["rss"] else None
+            step["peak_rss_mb"] = round(max(rss_values) / 1024**2, 1) if rss_values else None
+            steps.append(step)
+
+            lag = step["event_loop_lag"]
+            lag_text = (
+                f"loop lag mean={lag['mean_ms']}ms p99≤{lag['p99_le_ms']}ms"
+                if lag["samples"]
+                else "loop lag 无采样"
+            )
+            print(
+                f"  c={concurrency:<4} ok={step['ok']:<5} err={sum(step['errors'].values()):<4}"
+                f"  p50={step['p50_ms']}ms p95={step['p95_ms']}ms p99={step['p99_ms']}ms"
+                f"  {step['throughput_rps']} req/s"
+                f"  {lag_text}"
+                f"  rss={step['rss_mb']}MB (峰值 {step['peak_rss_mb']}MB)"
+            )
+        return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析服务并发压测")
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="analyze")
+    parser.add_argument("--stream", action="store_true", help="/analyze 使用流式响应")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--requests", type=int, default=8, help="每级并发的最少请求数")
+    parser.add_argument("--requests-per-slot", type=int, default=2, help="每个并发槽位的请求数")
+    parser.add_argument("--warmup", type=int, default=1, help="正式压测前的预热请求数")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="small")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="内存采样间隔（秒）")
+    parser.add_argument("--base-url", help="压测已运行的服务，不启动本地模拟环境")
+    parser.add_argument("--file-url", help="配合 --base-url 压测 analyze_by_file_url 时的文件URL")
+    parser.add_argument("--workers", type=int, default=1, help="本地分析服务的 worker 数")
+    parser.add_argument("--latency", type=float, default=1.0, help="模拟星云首字延迟（秒）")
+    parser.add_argument("--chunks", type=int, default=200, help="模拟星云输出分块数量")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="模拟星云分块间隔（秒）")
+    parser.add_argument("--report-cache", action="store_true", help="保留报告缓存（默认关闭）")
+    parser.add_argument("--frame-cache", action="store_true", help="保留解析结果缓存（默认关闭）")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+
+    output = {"meta": run_metadata(), "config": vars(args), "steps": []}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        workbook = os.path.join(tmp_dir, f"{args.scenario}.xlsx")
+        write_scenario(workbook, args.scenario)
+
+        if args.base_url:
+            stack = nullcontext((args.base_url, None))
+        else:
+            mock_args = [
+                "--latency", str(args.latency),
+                "--chunks", str(args.chunks),
+                "--chunk-delay", str(args.chunk_delay),
+                "--files-dir", tmp_dir,
+            ]
+            app_env = {
+                "WORKERS": str(args.workers),
+                "REPORT_CACHE_ENABLED": "true" if args.report_cache else "false",
+                "FRAME_CACHE_ENABLED": "true" if args.frame_cache else "false",
+            }
+            stack = local_stack(mock_args, app_env)
+
+        with stack as (base_url, mock_url):
+            file_url = args.file_url
+            if file_url is None and mock_url is not None:
+                file_url = f"{mock_url}/files/{os.path.basename(workbook)}"
+            if args.endpoint == "analyze_by_file_url" and not file_url:
+                parser.error("压测已运行的服务时需通过 --file-url 指定文件URL")
+
+            print(f"压测 {args.endpoint}{' (stream)' if args.stream else ''} @ {base_url}:")
+            output["steps"] = asyncio.run(run_sweep(base_url, args, workbook, file_url))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+本地模拟的星云 v1/chat/completions 接口，用于基准测试和压测
+
+支持普通响应和SSE流式响应，可配置首字延迟、分块数量和分块间隔，模拟大模型逐token输出；
+可按输出 token 数模拟生成耗时，对比完整HTML与模板报告（只输出JSON文字解读）的延迟。
+
+用法:
+    python -m benchmarks.mock_xingyun --port 9100 --latency 1.0 --chunks 200 --chunk-delay 0.02
+"""
+
+import argparse
+import asyncio
+import json as jsonlib
+import re
+
+from sanic import Sanic
+from sanic.response import json
+
+
+def build_report(prompt, report_bytes):
+    """生成固定大小的模拟HTML报告"""
+    head = f"<html><head><title>mock</title></head><body><p>prompt={len(prompt)}</p>"
+    tail = "</body></html>"
+    filler = "<div>mock chart</div>" * max(
+        (report_bytes - len(head) - len(tail)) // 21, 0
+    )
+    return head + filler + tail
+
+
+def build_narrative(prompt):
+    """模板报告的prompt要求输出JSON文字解读，为其中列出的每个图表生成一句解读"""
+    chart_ids = re.findall(r"^- (chart-\d+)：", prompt, re.MULTILINE)
+    return jsonlib.dumps(
+        {
+            "title": "mock",
+            "summary": f"prompt={len(prompt)}",
+            "findings": ["mock finding"] * 3,
+            "charts": {chart_id: "mock caption" for chart_id in chart_ids},
+            "suggestions": ["mock suggestion"],
+        },
+        ensure_ascii=False,
+    )
+
+
+def create_app(
+    latency, chunks, chunk_delay, report_bytes, files_dir=None, output_tps=0.0
+):
+    """
+    创建模拟服务
+
+    Args:
+        latency (float): 首个token前的延迟（秒）
+        chunks (int): 输出分块数量
+        chunk_delay (float): 分块间隔（秒）
+        report_bytes (int): 模拟报告大小（字节）
+        files_dir (str): 可选，通过 /files/<name> 提供该目录下的文件，模拟文件URL
+        output_tps (float): 模拟的输出速度（token/秒），为0时不按输出长度增加耗时
+    """
+    app = Sanic("mock_xingyun")
+
+    if files_dir:
+        app.static("/files", files_dir)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request):
+        body = request.json
+        prompt = str(body["messages"][-1]["content"])
+        if '"findings"' in prompt:
+            report = build_narrative(prompt)
+        else:
+            report = build_report(prompt, report_bytes)
+        usage = {
+            "prompt_tokens": len(prompt) // 2,
+            "completion_tokens": len(report) // 4,
+        }
+        generation = usage["completion_tokens"] / output_tps if output_tps > 0 else 0.0
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency + chunks * chunk_delay + generation)
+            return json(
+                {
+                    "choices": [{"message": {"role": "assistant", "content": report}}],
+                    "usage": usage,
+                }
+            )
+
+        response = await request.respond(content_type="text/event-stream")
+        await asyncio.sleep(latency)
+        size = max(len(report) // max(chunks, 1), 1)
+        for start in range(0, len(report), size):
+            chunk = {"choices": [{"delta": {"content": report[start : start + size]}}]}
+            await response.send(f"data: {jsonlib.dumps(chunk, ensure_ascii=False)}\n\n")
+            await asyncio.sleep(chunk_delay + generation * size / len(report))
+        await response.send("data: [DONE]\n\n")
+        await response.eof()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟星云接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=1.0, help="首个token前的延迟（秒）")
+    parser.add_argument("--chunks", type=int, default=100, help="输出分块数量")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="分块间隔（秒）")
+    parser.add_argument("--report-bytes", type=int, default=200 * 1024)
+    parser.add_argument("--files-dir", help="通过 /files/<name> 提供的文件目录")
+    parser.add_argument(
+        "--output-tps", type=float, default=0.0, help="模拟的输出速度（token/秒），0 表示不模拟"
+    )
+    args = parser.parse_args()
+
+    app = create_app(
+        args.latency,
+        args.chunks,
+        args.chunk_delay,
+        args.report_bytes,
+        args.files_dir,
+        args.output_tps,
+    )
+    app.run(host=args.host, port=args.port, single_process=True, access_log=False)
+
+
+if __name__ == "__main__":
+    main()
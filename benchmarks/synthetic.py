@@ -0,0 +1,85 @@
+"""
+合成Excel工作簿生成工具，供基准测试使用
+"""
+
+import datetime
+import random
+
+from openpyxl import Workbook
+
+# 基准测试使用的工作簿形态
+SCENARIOS = {
+    "small": {"rows": 500, "cols": 10},
+    "tall": {"rows": 50000, "cols": 10},
+    "wide": {"rows": 2000, "cols": 200},
+    "messy": {"rows": 20000, "cols": 12, "messy": True},
+    "multi_sheet": {"rows": 5000, "cols": 10, "sheets": 6},
+    "multi_header": {"rows": 5000, "cols": 12, "header_rows": 2},
+}
+
+
+def _cell_value(rng, col_index, row_index, messy):
+    """按列类型生成单元格的值"""
+    kind = col_index % 4
+    if kind == 0:
+        return f"类别{rng.randint(1, 20)}"
+    if kind == 1:
+        return datetime.date(2024, 1, 1) + datetime.timedelta(days=row_index % 365)
+    value = round(rng.uniform(-1e6, 1e6), 2)
+    if messy and kind == 2:
+        return f"¥{value:,.2f}"
+    if messy and kind == 3 and row_index % 7 == 0:
+        return f"（{abs(value):,.2f}）"
+    return value
+
+
+def _header_rows(cols, header_rows):
+    """生成表头行；多级表头时上层每4列合并为一个分组"""
+    if header_rows == 1:
+        return [[f"指标{i + 1}" for i in range(cols)]]
+    top = [f"分组{i // 4 + 1}" if i % 4 == 0 else None for i in range(cols)]
+    bottom = [f"指标{i + 1}" for i in range(cols)]
+    return [top, bottom]
+
+
+def write_workbook(path, rows, cols, messy=False, seed=0, sheets=1, header_rows=1):
+    """
+    生成合成工作簿
+
+    Args:
+        path (str): 输出路径（.xlsx）
+        rows (int): 每个工作表的数据行数
+        cols (int): 列数
+        messy (bool): 是否生成带货币符号、千分位和括号的文本金额
+        seed (int): 随机种子，保证结果可复现
+        sheets (int): 工作表数量
+        header_rows (int): 表头行数，大于1时上层表头使用合并单元格
+    """
+    rng = random.Random(seed)
+    # 合并单元格需要普通模式，单层表头使用更快的 write_only 模式
+    workbook = Workbook(write_only=header_rows == 1)
+    if header_rows > 1:
+        workbook.remove(workbook.active)
+
+    for sheet_index in range(sheets):
+        worksheet = workbook.create_sheet(f"Sheet{sheet_index + 1}")
+        for header in _header_rows(cols, header_rows):
+            worksheet.append(header)
+        for row_index in range(rows):
+            worksheet.append(
+                [_cell_value(rng, c, row_index, messy) for c in range(cols)]
+            )
+        if header_rows > 1:
+            for start in range(0, cols, 4):
+                end = min(start + 4, cols)
+                if end - start > 1:
+                    worksheet.merge_cells(
+                        start_row=1, start_column=start + 1, end_row=1, end_column=end
+                    )
+
+    workbook.save(path)
+
+
+def write_scenario(path, name, seed=0):
+    """按场景名称生成工作簿"""
+    write_workbook(path, seed=seed, **SCENARIOS[name])
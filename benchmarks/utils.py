@@ -0,0 +1,169 @@
+"""
+基准测试公用工具
+"""
+
+import multiprocessing
+import os
+import platform
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime
+
+import httpx
+
+
+def _run_measured(target, args, queue):
+    """子进程中执行一次并回报耗时和内存峰值"""
+    try:
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        result = target(*args)
+        elapsed = time.perf_counter() - started
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        queue.put(
+            {
+                "seconds": round(elapsed, 4),
+                "peak_rss_mb": round(peak / 1024, 1),
+                "delta_rss_mb": round((peak - baseline) / 1024, 1),
+                "result": result,
+            }
+        )
+    except Exception:
+        queue.put({"error": traceback.format_exc()})
+
+
+def measure_in_subprocess(target, *args):
+    """
+    在独立子进程中执行函数，准确统计内存峰值
+
+    Args:
+        target: 模块级函数，返回值需可被 pickle
+        *args: 函数参数
+
+    Returns:
+        dict: seconds, peak_rss_mb, delta_rss_mb, result（出错时为 error）
+    """
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run_measured, args=(target, args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def run_metadata():
+    """记录本次运行的环境信息，便于跨提交对比"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": multiprocessing.cpu_count(),
+    }
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    """获取一个空闲的本地端口"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_http(url, timeout=60.0):
+    """轮询直到URL可访问"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"等待服务启动超时: {url}")
+
+
+@contextmanager
+def local_stack(mock_args=(), app_env=None):
+    """
+    启动本地模拟星云服务和分析服务
+
+    Args:
+        mock_args (Sequence[str]): 传给 benchmarks.mock_xingyun 的命令行参数
+        app_env (dict): 分析服务额外的环境变量
+
+    Yields:
+        tuple: (分析服务地址, 模拟星云服务地址)
+    """
+    mock_port = free_port()
+    app_port = free_port()
+    processes = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ)
+        env.update(
+            {
+                "PORT": str(app_port),
+                "DATA_DIR": data_dir,
+                "XINGYUN_BASE_URL": f"http://127.0.0.1:{mock_port}",
+                "XINGYUN_API_KEY": "benchmark",
+                "XINGYUN_HTTP2": "false",
+                "SERVER_BASE_URL": f"http://127.0.0.1:{app_port}",
+            }
+        )
+        env.update(app_env or {})
+        try:
+            processes.append(
+                subprocess.Popen(
+                    [
+                        sys.executable,
+                        "-m",
+                        "benchmarks.mock_xingyun",
+                        "--port",
+                        str(mock_port),
+                        *mock_args,
+                    ],
+                    cwd=ROOT_DIR,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+            )
+            processes.append(
+                subprocess.Popen(
+                    [sys.executable, "server.py"],
+                    cwd=ROOT_DIR,
+                    env=env,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+            )
+            base_url = f"http://127.0.0.1:{app_port}"
+            wait_for_http(f"http://127.0.0.1:{mock_port}/")
+            wait_for_http(f"{base_url}/health")
+            yield base_url, f"http://127.0.0.1:{mock_port}"
+        finally:
+            for process in processes:
+                process.send_signal(signal.SIGINT)
+            for process in processes:
+                try:
+                    process.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    process.kill()
@@ -14,11 +14,131 @@ AZURE_DEPLOYMENT_NAME = os.getenv("AZURE_DEPLOYMENT_NAME", "o3")
 AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY", "your-api-key")
 AZURE_API_VERSION = os.getenv("AZURE_API_VERSION", "2024-08-01-preview")
 
+# Xingyun configuration
+XINGYUN_API_KEY = os.getenv("XINGYUN_API_KEY")
+XINGYUN_BASE_URL = os.getenv("XINGYUN_BASE_URL", "https://www.xingyunlink.com/api")
+XINGYUN_POOL_SIZE = int(os.getenv("XINGYUN_POOL_SIZE", "100"))
+XINGYUN_CONNECT_TIMEOUT = float(os.getenv("XINGYUN_CONNECT_TIMEOUT", "10"))
+XINGYUN_READ_TIMEOUT = float(os.getenv("XINGYUN_READ_TIMEOUT", "600"))
+XINGYUN_HTTP2 = os.getenv("XINGYUN_HTTP2", "true").lower() == "true"
+
+# Upstream backpressure: concurrent calls (global / per uid), waiting queue and rate limit
+XINGYUN_MAX_CONCURRENCY = int(os.getenv("XINGYUN_MAX_CONCURRENCY", "8"))
+XINGYUN_MAX_CONCURRENCY_PER_UID = int(os.getenv("XINGYUN_MAX_CONCURRENCY_PER_UID", "2"))
+XINGYUN_MAX_WAITING = int(os.getenv("XINGYUN_MAX_WAITING", "32"))
+XINGYUN_QUEUE_TIMEOUT = float(os.getenv("XINGYUN_QUEUE_TIMEOUT", "60"))
+# Requests per second including retries; 0 disables the token bucket
+XINGYUN_RATE_LIMIT = float(os.getenv("XINGYUN_RATE_LIMIT", "0"))
+XINGYUN_RATE_BURST = int(os.getenv("XINGYUN_RATE_BURST", "5"))
+# Retries on 429/5xx and connection errors with jittered exponential backoff
+XINGYUN_MAX_RETRIES = int(os.getenv("XINGYUN_MAX_RETRIES", "3"))
+XINGYUN_BACKOFF_BASE = float(os.getenv("XINGYUN_BACKOFF_BASE", "1"))
+XINGYUN_BACKOFF_MAX = float(os.getenv("XINGYUN_BACKOFF_MAX", "30"))
+
+# File download for /analyze_by_file_url
+FETCH_CHUNK_SIZE = int(os.getenv("FETCH_CHUNK_SIZE", str(64 * 1024)))
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(50 * 1024 * 1024)))
+FETCH_CONNECT_TIMEOUT = float(os.getenv("FETCH_CONNECT_TIMEOUT", "10"))
+FETCH_READ_TIMEOUT = float(os.getenv("FETCH_READ_TIMEOUT", "60"))
+FETCH_POOL_SIZE = int(os.getenv("FETCH_POOL_SIZE", "50"))
+FETCH_HASH_ALGORITHM = os.getenv("FETCH_HASH_ALGORITHM", "sha256")
+
+# Ingest (Excel parsing and cleaning) process pool
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "16"))
+INGEST_TIMEOUT = float(os.getenv("INGEST_TIMEOUT", "120"))
+
+# Excel reader engine: auto / calamine / openpyxl / openpyxl_stream / xlrd
+READER_ENGINE = os.getenv("READER_ENGINE", "auto")
+READER_STREAM_THRESHOLD = int(os.getenv("READER_STREAM_THRESHOLD", str(5 * 1024 * 1024)))
+# Maximum number of leading rows considered as (multi-level) header rows
+HEADER_SCAN_ROWS = int(os.getenv("HEADER_SCAN_ROWS", "10"))
+
+# Prompt data section token budget; larger sheets are summarized
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "30000"))
+# Serialization of the full data section: csv / csv_compact / dict / markdown / tsv
+PROMPT_DATA_FORMAT = os.getenv("PROMPT_DATA_FORMAT", "csv_compact")
+# Significant digits kept for floats by the compact formats
+PROMPT_FLOAT_DIGITS = int(os.getenv("PROMPT_FLOAT_DIGITS", "15"))
+
+# Locally pre-computed shares, trends, correlations and column profiles sent as JSON
+INSIGHTS_ENABLED = os.getenv("INSIGHTS_ENABLED", "true").lower() == "true"
+INSIGHTS_TOKEN_BUDGET = int(os.getenv("INSIGHTS_TOKEN_BUDGET", "3000"))
+INSIGHTS_TOP_N = int(os.getenv("INSIGHTS_TOP_N", "10"))
+INSIGHTS_MAX_DIMENSIONS = int(os.getenv("INSIGHTS_MAX_DIMENSIONS", "3"))
+INSIGHTS_MAX_MEASURES = int(os.getenv("INSIGHTS_MAX_MEASURES", "5"))
+
+# Report generation: llm (model writes the full HTML page) or template (charts are
+# rendered locally from the pre-computed insights, the model only writes JSON narrative).
+# template falls back to llm when INSIGHTS_ENABLED is false, since there is nothing to chart
+REPORT_MODE = os.getenv("REPORT_MODE", "llm")
+ECHARTS_URL = os.getenv(
+    "ECHARTS_URL", "https://cdn.jsdelivr.net/npm/echarts@5/dist/echarts.min.js"
+)
+
+# Maximum number of sheets analyzed together in one multi-sheet request
+MAX_SHEETS = int(os.getenv("MAX_SHEETS", "20"))
+
+# Add a Server-Timing header to every response (otherwise only with ?timing=1)
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+
 # Data
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.getenv("DATA_DIR", os.path.join(CURRENT_DIR, "data"))
 REPORT_DIR = os.path.join(DATA_DIR, "reports")
 
+# Report storage: SQLite index plus periodic cleanup by idle time and total size
+REPORT_INDEX_PATH = os.path.join(DATA_DIR, "reports.db")
+REPORT_MAX_AGE = float(os.getenv("REPORT_MAX_AGE", str(30 * 24 * 3600)))
+REPORT_MAX_BYTES = int(os.getenv("REPORT_MAX_BYTES", str(10 * 1024 * 1024 * 1024)))
+REPORT_GC_INTERVAL = float(os.getenv("REPORT_GC_INTERVAL", "600"))
+
+# Background analysis jobs
+JOB_DB_PATH = os.path.join(DATA_DIR, "jobs.db")
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "1800"))
+# Jobs failing with a transient error (upstream busy, ingest queue full) are requeued
+# with exponential backoff starting at JOB_RETRY_BACKOFF seconds, up to JOB_RETRY_LIMIT times
+JOB_RETRY_LIMIT = int(os.getenv("JOB_RETRY_LIMIT", "5"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "2"))
+# Finished jobs are deleted JOB_MAX_AGE seconds after completion (0 keeps them forever)
+JOB_MAX_AGE = float(os.getenv("JOB_MAX_AGE", str(7 * 24 * 3600)))
+JOB_GC_INTERVAL = float(os.getenv("JOB_GC_INTERVAL", "600"))
+
+# Report cache
+REPORT_CACHE_ENABLED = os.getenv("REPORT_CACHE_ENABLED", "true").lower() == "true"
+REPORT_CACHE_DIR = os.path.join(REPORT_DIR, "cache")
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+REPORT_CACHE_MAX_AGE = float(os.getenv("REPORT_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+
+# Parsed-data cache: cleaned DataFrames stored as Arrow IPC files, or pickle when a column
+# mixes types (requires pyarrow). Keyed by file content, sheet and the INGEST_* dtype settings
+FRAME_CACHE_ENABLED = os.getenv("FRAME_CACHE_ENABLED", "true").lower() == "true"
+FRAME_CACHE_DIR = os.path.join(DATA_DIR, "frames")
+FRAME_CACHE_MAX_BYTES = int(os.getenv("FRAME_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Incremental re-analysis: per-uid fingerprints of the previous upload.
+# Only incremental prompts bypass the report cache; a cache hit does not record a fingerprint
+INCREMENTAL_ENABLED = os.getenv("INCREMENTAL_ENABLED", "true").lower() == "true"
+INCREMENTAL_DIR = os.path.join(DATA_DIR, "fingerprints")
+INCREMENTAL_MAX_AGE = float(os.getenv("INCREMENTAL_MAX_AGE", str(7 * 24 * 3600)))
+# Fall back to a full analysis when changed rows exceed this share of the table
+INCREMENTAL_MAX_DELTA_RATIO = float(os.getenv("INCREMENTAL_MAX_DELTA_RATIO", "0.3"))
+# Token budget of the compact summary kept for the next incremental prompt
+INCREMENTAL_SUMMARY_BUDGET = int(os.getenv("INCREMENTAL_SUMMARY_BUDGET", "2000"))
+
+# Ingest memory: dtype optimisation of cleaned data and a per-request ceiling
+INGEST_OPTIMIZE_DTYPES = os.getenv("INGEST_OPTIMIZE_DTYPES", "true").lower() == "true"
+# Text columns whose unique values are at most this share of rows become category
+INGEST_CATEGORY_MAX_RATIO = float(os.getenv("INGEST_CATEGORY_MAX_RATIO", "0.5"))
+# Store remaining text columns as Arrow strings (requires pyarrow)
+INGEST_ARROW_STRINGS = os.getenv("INGEST_ARROW_STRINGS", "false").lower() == "true"
+# Largest parsed DataFrame per request in MB, 0 disables the check
+INGEST_MAX_FRAME_MB = int(os.getenv("INGEST_MAX_FRAME_MB", "512"))
+# What to do with larger inputs: "sample" rows down to the limit or "reject" with 413
+INGEST_OVERSIZE_POLICY = os.getenv("INGEST_OVERSIZE_POLICY", "sample")
+
 # Initialize Async OpenAI client
 gpt_client = AsyncAzureOpenAI(
     azure_endpoint=AZURE_ENDPOINT_URL,
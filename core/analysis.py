@@ -1,71 +1,400 @@
 import pandas as pd
+import aiofiles
+import asyncio
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
-import datetime
+import hashlib
+import io
+import shutil
 import sys
+import tempfile
+import time
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # 导入配置
-from core.xingyun_service import XingyunService
-from config import REPORT_DIR
-from core.prompt import DEFAULT_ANALYSIS_PROMPT
+from core.xingyun_service import AsyncXingyunService
+from core.limiter import UpstreamBusyError, UpstreamLimiter
+from config import (
+    REPORT_DIR,
+    REPORT_INDEX_PATH,
+    REPORT_MAX_AGE,
+    REPORT_MAX_BYTES,
+    REPORT_CACHE_ENABLED,
+    REPORT_CACHE_DIR,
+    REPORT_CACHE_MAX_BYTES,
+    REPORT_CACHE_MAX_AGE,
+    XINGYUN_API_KEY,
+    XINGYUN_BASE_URL,
+    XINGYUN_POOL_SIZE,
+    XINGYUN_CONNECT_TIMEOUT,
+    XINGYUN_READ_TIMEOUT,
+    XINGYUN_HTTP2,
+    XINGYUN_MAX_CONCURRENCY,
+    XINGYUN_MAX_CONCURRENCY_PER_UID,
+    XINGYUN_MAX_WAITING,
+    XINGYUN_QUEUE_TIMEOUT,
+    XINGYUN_RATE_LIMIT,
+    XINGYUN_RATE_BURST,
+    XINGYUN_MAX_RETRIES,
+    XINGYUN_BACKOFF_BASE,
+    XINGYUN_BACKOFF_MAX,
+    INGEST_WORKERS,
+    INGEST_MAX_PENDING,
+    INGEST_TIMEOUT,
+    READER_ENGINE,
+    READER_STREAM_THRESHOLD,
+    HEADER_SCAN_ROWS,
+    PROMPT_TOKEN_BUDGET,
+    PROMPT_DATA_FORMAT,
+    PROMPT_FLOAT_DIGITS,
+    INSIGHTS_ENABLED,
+    INSIGHTS_TOKEN_BUDGET,
+    INSIGHTS_TOP_N,
+    INSIGHTS_MAX_DIMENSIONS,
+    INSIGHTS_MAX_MEASURES,
+    REPORT_MODE,
+    ECHARTS_URL,
+    MAX_SHEETS,
+    FRAME_CACHE_ENABLED,
+    FRAME_CACHE_DIR,
+    FRAME_CACHE_MAX_BYTES,
+    INCREMENTAL_ENABLED,
+    INCREMENTAL_DIR,
+    INCREMENTAL_MAX_AGE,
+    INCREMENTAL_MAX_DELTA_RATIO,
+    INCREMENTAL_SUMMARY_BUDGET,
+    INGEST_OPTIMIZE_DTYPES,
+    INGEST_CATEGORY_MAX_RATIO,
+    INGEST_ARROW_STRINGS,
+    INGEST_MAX_FRAME_MB,
+    INGEST_OVERSIZE_POLICY,
+)
+from core.prompt import DEFAULT_ANALYSIS_PROMPT, NARRATIVE_PROMPT
+from core.report_cache import ReportCache
+from core.report_store import ReportStore
+from core.frame_cache import FrameCache, frame_cache_available
+from core.executor import (
+    IngestExecutor,
+    IngestQueueFullError,
+    IngestTimeoutError,
+    IngestWorkerError,
+)
+from core.memory import (
+    IngestTooLargeError,
+    ParseLimit,
+    enforce_memory_limit,
+    optimize_dtypes,
+)
+from core.readers import read_sheet_raw, select_engine, sheet_names
+from core.headers import split_header
+from core.summarize import (
+    CSV_DATA_LABEL,
+    MULTI_SHEET_DATA_LABEL,
+    build_data_section,
+    combine_sheet_sections,
+)
+from core.insights import append_insights, compute_insights
+from core.report_renderer import (
+    REPORT_MODE_TEMPLATE,
+    build_sections,
+    list_charts,
+    parse_narrative,
+    render_report,
+)
+from core.compression import precompress_report
+from core.tokens import estimate_tokens
+from core.incremental import (
+    FingerprintStore,
+    compute_fingerprint,
+    describe_stats_change,
+    diff_rows,
+)
+from core.metrics import (
+    ANALYSIS_MODE,
+    CLEAN_COLUMN_LATENCY,
+    FRAME_CACHE_REQUESTS,
+    INPUT_COLUMNS,
+    INPUT_ROWS,
+    LLM_TOKENS,
+    PROMPT_TOKENS,
+    REPORT_BYTES,
+    record_stage,
+    timed_stage,
+)
 
-client = XingyunService(api_key=os.getenv("XINGYUN_API_KEY"))
+upstream_limiter = UpstreamLimiter(
+    max_concurrency=XINGYUN_MAX_CONCURRENCY,
+    per_uid_concurrency=XINGYUN_MAX_CONCURRENCY_PER_UID,
+    max_waiting=XINGYUN_MAX_WAITING,
+    queue_timeout=XINGYUN_QUEUE_TIMEOUT,
+    rate=XINGYUN_RATE_LIMIT,
+    burst=XINGYUN_RATE_BURST,
+)
 
+client = AsyncXingyunService(
+    api_key=XINGYUN_API_KEY,
+    base_url=XINGYUN_BASE_URL,
+    pool_size=XINGYUN_POOL_SIZE,
+    connect_timeout=XINGYUN_CONNECT_TIMEOUT,
+    read_timeout=XINGYUN_READ_TIMEOUT,
+    http2=XINGYUN_HTTP2,
+    limiter=upstream_limiter,
+    max_retries=XINGYUN_MAX_RETRIES,
+    backoff_base=XINGYUN_BACKOFF_BASE,
+    backoff_max=XINGYUN_BACKOFF_MAX,
+)
 
-def read_data_file(file_path):
-    """智能读取Excel文件，优化多级表头处理"""
-    file_extension = os.path.splitext(file_path)[1].lower()
+report_store = ReportStore(REPORT_DIR, REPORT_INDEX_PATH, REPORT_MAX_AGE, REPORT_MAX_BYTES)
 
+report_cache = (
+    ReportCache(REPORT_CACHE_DIR, REPORT_CACHE_MAX_BYTES, REPORT_CACHE_MAX_AGE)
+    if REPORT_CACHE_ENABLED
+    else None
+)
+
+# 解析结果缓存在解析进程中读写，多个进程共享同一缓存目录
+frame_cache = (
+    FrameCache(FRAME_CACHE_DIR, FRAME_CACHE_MAX_BYTES)
+    if FRAME_CACHE_ENABLED and frame_cache_available()
+    else None
+)
+
+fingerprint_store = (
+    FingerprintStore(INCREMENTAL_DIR, INCREMENTAL_MAX_AGE) if INCREMENTAL_ENABLED else None
+)
+
+ingest_executor = IngestExecutor(INGEST_WORKERS, INGEST_MAX_PENDING, INGEST_TIMEOUT)
+
+
+def _open_source(file_path, file_extension=None):
+    """
+    将文件路径或文件内容统一为可读取的数据源
+
+    Returns:
+        tuple: (数据源, 文件大小, 小写扩展名)
+    """
+    if isinstance(file_path, (bytes, bytearray, memoryview)):
+        # 直接从内存读取上传内容，不经过临时文件
+        source = io.BytesIO(file_path)
+        file_size = len(file_path)
+    else:
+        source = file_path
+        file_size = os.path.getsize(file_path)
+        file_extension = file_extension or os.path.splitext(file_path)[1]
+
+    file_extension = (file_extension or "").lower()
     if file_extension not in [".xlsx", ".xls"]:
         raise ValueError(f"不支持的文件格式: {file_extension}")
+    return source, file_size, file_extension
+
+
+def _select_engine(file_size, file_extension):
+    # 根据文件类型和大小选择读取引擎
+    return select_engine(
+        file_extension,
+        file_size,
+        READER_ENGINE,
+        READER_STREAM_THRESHOLD,
+    )
+
+
+def read_data_file(file_path, file_extension=None, sheet_name=0, limit=None):
+    """
+    智能读取Excel文件，自动识别并合并多级表头
+
+    Args:
+        file_path (str | bytes): Excel文件路径，或直接传入文件内容
+        file_extension (str): 传入文件内容时必须指定扩展名，如 .xlsx
+        sheet_name (int | str): 工作表序号或名称，默认第一个工作表
+        limit (ParseLimit): 解析前的内存上限检查（可选），发生抽样时在 limit.sampled_from 记录原始数据行数
+
+    Returns:
+        pd.DataFrame: 读取结果
+    """
+    source, file_size, file_extension = _open_source(file_path, file_extension)
 
     try:
-        # 读取Excel文件
-        df = pd.read_excel(file_path, engine="openpyxl")
-
-        # 检查是否有多级表头
-        if isinstance(df.columns, pd.MultiIndex):
-            # 处理多级表头，合并为单级
-            new_columns = []
-            for col in df.columns:
-                if isinstance(col, tuple):
-                    # 合并多级表头，去除空值和重复值
-                    col_parts = []
-                    for part in col:
-                        if pd.notna(part) and str(part).strip():
-                            col_parts.append(str(part).strip())
-
-                    if col_parts:
-                        # 去除重复的部分
-                        unique_parts = []
-                        for part in col_parts:
-                            if part not in unique_parts:
-                                unique_parts.append(part)
-                        new_col = "_".join(unique_parts)
-                    else:
-                        new_col = f"列{len(new_columns)+1}"
-                else:
-                    new_col = str(col)
-                new_columns.append(new_col)
-
-            df.columns = new_columns
-            print(f"成功处理多级表头，合并后的列名: {list(df.columns)}")
+        # 只解析指定的工作表，其余工作表不会被加载；表头在读取后识别，无需重新读取
+        engine = _select_engine(file_size, file_extension)
+        raw, merged = read_sheet_raw(source, engine, sheet_name=sheet_name, limit=limit)
+        df, header_rows = split_header(raw, merged, HEADER_SCAN_ROWS)
+        if limit is not None and limit.sheet_rows is not None:
+            limit.sampled_from = limit.sheet_rows - header_rows
+
+        if header_rows > 1:
+            print(f"成功处理多级表头（{header_rows}行），合并后的列名: {list(df.columns)}")
 
         return df
 
+    except IngestTooLargeError:
+        raise
+    except Exception as e:
+        raise Exception(f"读取文件失败: {str(e)}")
+
+
+def list_sheet_names(file_path, file_extension=None):
+    """
+    列出Excel文件中的工作表名称，只读取工作簿目录，不解析工作表内容
+
+    Args:
+        file_path (str | bytes): Excel文件路径，或直接传入文件内容
+        file_extension (str): 传入文件内容时必须指定扩展名
+
+    Returns:
+        List[str]: 工作表名称
+    """
+    source, file_size, file_extension = _open_source(file_path, file_extension)
+    try:
+        return sheet_names(source, _select_engine(file_size, file_extension))
     except Exception as e:
         raise Exception(f"读取文件失败: {str(e)}")
 
 
-def clean_dataframe(df):
-    """清理数据框，处理常见的数据问题"""
-    # 复制数据框避免修改原始数据
-    df_clean = df.copy()
+# 请求分析全部工作表时使用的取值
+SHEETS_ALL = "all"
+
+
+class SheetNotFoundError(Exception):
+    """请求的工作表名称不存在或序号超出范围"""
+
+    def __init__(self, message, available):
+        super().__init__(message)
+        self.available = list(available)
+
+
+def parse_sheet_selection(value):
+    """
+    解析请求中的工作表参数
+
+    Args:
+        value (str | list): "all" 表示全部工作表；逗号分隔的名称或列表表示指定工作表；
+            为空时只分析第一个工作表
+
+    Returns:
+        None | str | list: None、SHEETS_ALL 或工作表名称/序号列表
+    """
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        selection = [item for item in value if str(item).strip()]
+        return selection or None
+    value = str(value).strip()
+    if not value:
+        return None
+    if value.lower() in (SHEETS_ALL, "*"):
+        return SHEETS_ALL
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+
+def resolve_sheets(names, selection):
+    """
+    根据工作表参数确定要分析的工作表
+
+    Args:
+        names (List[str]): 工作簿中的全部工作表名称
+        selection (str | list): parse_sheet_selection 的返回值
+
+    Returns:
+        List[str]: 要分析的工作表名称，最多 MAX_SHEETS 个
+
+    Raises:
+        SheetNotFoundError: 工作表不存在或序号超出范围
+    """
+    if selection == SHEETS_ALL:
+        selected = list(names)
+    else:
+        selected = []
+        for item in selection:
+            if isinstance(item, int) and not isinstance(item, bool):
+                if not 0 <= item < len(names):
+                    raise SheetNotFoundError(
+                        f"工作表序号超出范围: {item}，可用的工作表: {'，'.join(names)}", names
+                    )
+                name = names[item]
+            elif str(item) in names:
+                name = str(item)
+            else:
+                raise SheetNotFoundError(
+                    f"工作表不存在: {item}，可用的工作表: {'，'.join(names)}", names
+                )
+            if name not in selected:
+                selected.append(name)
+
+    if len(selected) > MAX_SHEETS:
+        print(f"工作表数量 {len(selected)} 超过上限，只分析前 {MAX_SHEETS} 个")
+        selected = selected[:MAX_SHEETS]
+    return selected
+
+
+# 数值清洗时一次性移除的字符：千分位分隔符、货币符号、半角/全角空格及括号
+NUMERIC_NOISE_TABLE = str.maketrans("", "", ",，$¥￥ 　()（）")
+
+# 数值转换前先抽样检查的行数，抽样无法转换的列直接跳过
+NUMERIC_SAMPLE_SIZE = 200
+
+DATE_COLUMN_KEYWORDS = ["date", "time", "日期", "时间", "年", "月", "日"]
+
+# 单列清洗耗时超过该值（秒）时输出日志，最多列出的列数
+SLOW_CLEAN_COLUMN_SECONDS = 0.5
+SLOW_CLEAN_COLUMN_COUNT = 5
+
+# 清洗逻辑版本，修改 read_data_file / clean_dataframe 的输出时递增，使旧的解析缓存失效
+CLEAN_VERSION = 3
+
+# 影响缓存数据类型的配置，修改后旧的解析缓存失效
+FRAME_CACHE_SETTINGS = (
+    f"optimize={INGEST_OPTIMIZE_DTYPES};category={INGEST_CATEGORY_MAX_RATIO};"
+    f"arrow_strings={INGEST_ARROW_STRINGS}"
+)
+
+
+def _to_numeric_series(series):
+    """
+    尝试将文本列转换为数值列
+
+    Args:
+        series (pd.Series): object 类型的列
+
+    Returns:
+        pd.Series | None: 全部非空值都能转换时返回数值列，否则返回 None
+    """
+    values = series.dropna()
+    if values.empty:
+        return None
+
+    # 先抽样，明显不是数值的列不做整列转换
+    sample = values.iloc[:NUMERIC_SAMPLE_SIZE].astype(str).str.translate(
+        NUMERIC_NOISE_TABLE
+    )
+    sample_numeric = pd.to_numeric(sample, errors="coerce")
+    if (sample_numeric.isna() & sample.ne("")).any():
+        return None
+
+    stripped = values.astype(str).str.translate(NUMERIC_NOISE_TABLE)
+    numeric = pd.to_numeric(stripped, errors="coerce")
+    if (numeric.isna() & stripped.ne("")).any():
+        return None
+
+    return numeric.reindex(series.index)
+
+
+def clean_dataframe(df, timings=None):
+    """
+    清理数据框，处理常见的数据问题
+
+    Args:
+        df (pd.DataFrame): 原始数据
+        timings (dict): 可选，传入时按列记录清洗耗时（秒）
+
+    Returns:
+        pd.DataFrame: 清理后的数据
+    """
+    # 浅拷贝即可：写时复制下修改列不会影响原始数据，也不会复制整表
+    df_clean = df.copy(deep=False)
 
     # 1. 清理列名
     df_clean.columns = [str(col).strip() for col in df_clean.columns]
@@ -76,113 +405,875 @@ def clean_dataframe(df):
 
     # 3. 处理数值型列中的非数值数据
     for col in df_clean.select_dtypes(include=["object"]).columns:
-        try:
-            # 移除常见的非数值字符
-            temp_series = df_clean[col].astype(str)
-            temp_series = temp_series.str.replace(",", "").str.replace("，", "")
-            temp_series = (
-                temp_series.str.replace("$", "")
-                .str.replace("¥", "")
-                .str.replace("￥", "")
-            )
-            temp_series = temp_series.str.replace(" ", "").str.replace("　", "")
-            temp_series = temp_series.str.replace("(", "").str.replace(")", "")
-            temp_series = temp_series.str.replace("（", "").str.replace("）", "")
-
-            # 尝试转换为数值
-            pd.to_numeric(temp_series, errors="raise")
-            df_clean[col] = pd.to_numeric(temp_series, errors="coerce")
+        started = time.perf_counter()
+        numeric = _to_numeric_series(df_clean[col])
+        if numeric is not None:
+            df_clean[col] = numeric
             print(f"列 '{col}' 已转换为数值型")
-        except:
-            # 如果转换失败，保持原样
-            pass
+        if timings is not None:
+            timings[col] = timings.get(col, 0.0) + time.perf_counter() - started
 
     # 4. 处理日期列
     for col in df_clean.columns:
-        if any(
-            keyword in str(col).lower()
-            for keyword in ["date", "time", "日期", "时间", "年", "月", "日"]
-        ):
+        if any(keyword in col.lower() for keyword in DATE_COLUMN_KEYWORDS):
+            started = time.perf_counter()
             try:
                 df_clean[col] = pd.to_datetime(df_clean[col], errors="coerce")
                 print(f"列 '{col}' 已转换为日期型")
-            except:
+            except (ValueError, TypeError, OverflowError):
                 pass
+            if timings is not None:
+                timings[col] = timings.get(col, 0.0) + time.perf_counter() - started
 
     return df_clean
 
 
-async def generate_html_from_excel(
-    excel_path, chat_id, analysis_prompt=None, user_content=None
+def _content_hash(excel_path):
+    """计算文件内容的 sha256"""
+    if isinstance(excel_path, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(excel_path).hexdigest()
+    digest = hashlib.sha256()
+    with open(excel_path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_and_clean(
+    excel_path, file_extension, sheet_name, stages, column_timings, content_hash=None
 ):
     """
-    从Excel文件生成HTML分析报告
+    读取并清洗一个工作表，将各阶段耗时写入 stages，各列清洗耗时写入 column_timings
+
+    启用解析缓存时先按文件内容哈希查找，命中则跳过读取和清洗；调用方已知内容哈希时
+    通过 content_hash 传入，避免每个工作表重新读取文件计算；
+    读取的数据超过内存上限时按 INGEST_OVERSIZE_POLICY 抽样或拒绝
+
+    Returns:
+        tuple: (清洗后的数据, 解析缓存查询结果 hit/miss，未启用缓存时为 None,
+            抽样前的行数，未抽样时为 None)
+    """
+    cache_key = None
+    if frame_cache is not None:
+        started = time.perf_counter()
+        cache_key = FrameCache.make_key(
+            content_hash or _content_hash(excel_path),
+            sheet_name,
+            CLEAN_VERSION,
+            FRAME_CACHE_SETTINGS,
+        )
+        df = frame_cache.get(cache_key)
+        stages["frame_cache"] = time.perf_counter() - started
+        if df is not None:
+            return df, "hit", None
+
+    # 解析前按工作表行列数预估内存，超出上限时拒绝或按间隔抽取行，避免解析过程中内存峰值超限
+    max_bytes = INGEST_MAX_FRAME_MB * 1024 * 1024
+    limit = ParseLimit(max_bytes, INGEST_OVERSIZE_POLICY, HEADER_SCAN_ROWS)
+    started = time.perf_counter()
+    df = read_data_file(excel_path, file_extension, sheet_name, limit)
+    stages["read"] = time.perf_counter() - started
+
+    # 预估不准确时按实际占用再检查一次，在清洗前抽样以减少后续开销
+    df, sampled_from = enforce_memory_limit(df, max_bytes, INGEST_OVERSIZE_POLICY)
+    # 解析前已抽样时以工作表的原始行数为准
+    sampled_from = limit.sampled_from or sampled_from
+
+    started = time.perf_counter()
+    df = clean_dataframe(df, column_timings)
+    stages["clean"] = time.perf_counter() - started
+
+    if INGEST_OPTIMIZE_DTYPES:
+        started = time.perf_counter()
+        df = optimize_dtypes(df, INGEST_CATEGORY_MAX_RATIO, INGEST_ARROW_STRINGS)
+        stages["optimize"] = time.perf_counter() - started
+
+    # 抽样结果不写入缓存，上限调整后可重新读取完整数据
+    if cache_key is None or sampled_from:
+        return df, None, sampled_from
+    frame_cache.put(cache_key, df)
+    return df, "miss", sampled_from
+
+
+def _log_slow_columns(column_timings):
+    """单列清洗耗时超过 SLOW_CLEAN_COLUMN_SECONDS 时输出最慢的几列，便于定位需要优化的数据"""
+    slow = sorted(
+        (
+            (seconds, col)
+            for col, seconds in column_timings.items()
+            if seconds >= SLOW_CLEAN_COLUMN_SECONDS
+        ),
+        reverse=True,
+    )[:SLOW_CLEAN_COLUMN_COUNT]
+    if slow:
+        print(
+            "清洗耗时较长的列: "
+            + ", ".join(f"'{col}' {seconds:.3f}秒" for seconds, col in slow)
+        )
+
+
+def _sampled_label(data_label, sampled_from, rows):
+    """数据经过抽样时在数据说明前注明，提醒模型合计类结论需按比例估算"""
+    if not sampled_from:
+        return data_label
+    return (
+        f"注意：原始数据共 {sampled_from} 行，超出解析内存上限，以下仅基于抽样的 {rows} 行。"
+        f"{data_label}"
+    )
+
+
+def _with_insights(data_text, df, token_budget, stages, sampled_from=None):
+    """
+    在数据部分之后附加本地预计算的指标，数据经过抽样时在说明中注明原始行数
+
+    Returns:
+        tuple: (数据文本, 预计算指标)
+    """
+    if not INSIGHTS_ENABLED:
+        return data_text, {}
+    started = time.perf_counter()
+    insights = compute_insights(
+        df,
+        token_budget,
+        top_n=INSIGHTS_TOP_N,
+        max_dimensions=INSIGHTS_MAX_DIMENSIONS,
+        max_measures=INSIGHTS_MAX_MEASURES,
+    )
+    stages["insights"] = time.perf_counter() - started
+    return append_insights(data_text, insights, sampled_from), insights
+
+
+def load_prompt_data(
+    excel_path,
+    file_extension=None,
+    sheet_name=0,
+    token_budget=PROMPT_TOKEN_BUDGET,
+    data_format=PROMPT_DATA_FORMAT,
+    insights_budget=INSIGHTS_TOKEN_BUDGET,
+    content_hash=None,
+):
+    """
+    读取并清洗一个工作表，生成发送给大模型的数据部分
+
+    数据在 token 预算内时为完整CSV，超出预算时为数据摘要；启用预计算指标时，
+    占比、环比/同比、相关系数等指标以JSON附加在数据之后
 
     Args:
-        excel_path (str): Excel文件路径
-        uid (str): 用户ID，用作chat_id
+        excel_path (str | bytes): Excel文件路径或文件内容
+        file_extension (str): 传入文件内容时的扩展名
+        sheet_name (int | str): 工作表序号或名称
+        token_budget (int): 数据部分的 token 预算
+        data_format (str): 完整数据的序列化格式
+        insights_budget (int): 预计算指标的 token 预算
+        content_hash (str): 文件内容的 sha256（可选），用于解析缓存键
 
     Returns:
-        str: 生成的HTML文件路径
+        tuple: (数据文本, 数据说明, 统计信息)，统计信息包含各阶段耗时、各列清洗耗时、行列数、
+        解析缓存查询结果、抽样前行数及预计算指标
+    """
+    stages = {}
+    column_timings = {}
+    df, frame_cache_result, sampled_from = _read_and_clean(
+        excel_path, file_extension, sheet_name, stages, column_timings, content_hash
+    )
+
+    started = time.perf_counter()
+    data_text, data_label = build_data_section(
+        df, token_budget, data_format, PROMPT_FLOAT_DIGITS
+    )
+    data_label = _sampled_label(data_label, sampled_from, len(df))
+    stages["serialize"] = time.perf_counter() - started
+    data_text, insights = _with_insights(
+        data_text, df, insights_budget, stages, sampled_from
+    )
+
+    stats = {
+        "stages": stages,
+        "clean_columns": column_timings,
+        "rows": len(df),
+        "columns": len(df.columns),
+        "frame_cache": frame_cache_result,
+        "sampled_from": sampled_from,
+        "insights": insights,
+    }
+    return data_text, data_label, stats
+
+
+def load_incremental_data(
+    excel_path,
+    file_extension=None,
+    previous=None,
+    data_format=PROMPT_DATA_FORMAT,
+    content_hash=None,
+):
     """
+    读取并清洗第一个工作表，计算数据指纹并与上次的指纹对比
+
+    变化适合增量分析时，数据部分只包含新增或变更的行，否则为完整数据部分
+
+    Args:
+        excel_path (str | bytes): Excel文件路径或文件内容
+        file_extension (str): 传入文件内容时的扩展名
+        previous (Fingerprint): 该用户上次分析的数据指纹（可选）
+        data_format (str): 完整数据的序列化格式
+        content_hash (str): 文件内容的 sha256（可选），用于解析缓存键
+
+    Returns:
+        tuple: (数据文本, 数据说明, 统计信息, 行变化或None, 本次数据指纹；数据经过抽样时为None)
+    """
+    stages = {}
+    column_timings = {}
+    df, frame_cache_result, sampled_from = _read_and_clean(
+        excel_path, file_extension, 0, stages, column_timings, content_hash
+    )
+
+    # 抽样数据的逐行哈希无法与完整数据对比，不做增量分析也不保存指纹
+    fingerprint = delta = None
+    if not sampled_from:
+        started = time.perf_counter()
+        fingerprint = compute_fingerprint(df, INCREMENTAL_SUMMARY_BUDGET)
+        delta = (
+            diff_rows(previous, fingerprint, INCREMENTAL_MAX_DELTA_RATIO)
+            if previous is not None
+            else None
+        )
+        stages["fingerprint"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rows = df if delta is None else df.iloc[delta.positions]
+    data_text, data_label = build_data_section(
+        rows, PROMPT_TOKEN_BUDGET, data_format, PROMPT_FLOAT_DIGITS
+    )
+    if delta is None:
+        data_label = _sampled_label(data_label, sampled_from, len(df))
+    stages["serialize"] = time.perf_counter() - started
+    # 增量分析时指标仍基于全量数据计算
+    data_text, insights = _with_insights(
+        data_text, df, INSIGHTS_TOKEN_BUDGET, stages, sampled_from
+    )
+
+    stats = {
+        "stages": stages,
+        "clean_columns": column_timings,
+        "rows": len(df),
+        "columns": len(df.columns),
+        "frame_cache": frame_cache_result,
+        "sampled_from": sampled_from,
+        "insights": insights,
+    }
+    return data_text, data_label, stats, delta, fingerprint
+
+
+def _spool_upload(content, file_extension):
+    """将上传的文件内容写入临时文件，返回文件路径"""
+    fd, path = tempfile.mkstemp(suffix=(file_extension or "").lower())
     try:
-        # 读取Excel文件
-        df = read_data_file(excel_path)
-        df = clean_dataframe(df)
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+    except BaseException:
+        _remove_quietly(path)
+        raise
+    return path
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
 
-        # 将数据转换为CSV格式的字符串，方便发送给大模型
-        csv_data = df.to_csv(index=False, encoding="utf-8")
+async def load_sheets_prompt_data(
+    excel_path, file_extension, sheets, data_format=PROMPT_DATA_FORMAT, content_hash=None
+):
+    """
+    并行读取并清洗多个工作表，合并为一份数据部分
+
+    每个工作表在独立的解析进程中处理，数据和预计算指标的 token 预算在所选工作表之间平均分配；
+    上传的文件内容只写入一次临时文件，各任务按路径读取
+
+    Args:
+        excel_path (str | bytes): Excel文件路径或文件内容
+        file_extension (str): 传入文件内容时的扩展名
+        sheets (str | list): parse_sheet_selection 的返回值
+        data_format (str): 完整数据的序列化格式
+        content_hash (str): 文件内容的 sha256（可选），用于解析缓存键
+
+    Returns:
+        tuple: (数据文本, 数据说明, 各工作表统计信息列表)
+    """
+    # 上传的文件内容先写入临时文件，各工作表的任务只传递路径，避免文件内容随每个任务序列化
+    spooled = None
+    if isinstance(excel_path, (bytes, bytearray, memoryview)):
+        spooled = excel_path = await asyncio.to_thread(
+            _spool_upload, excel_path, file_extension
+        )
+    try:
+        names = await asyncio.to_thread(list_sheet_names, excel_path, file_extension)
+        selected = resolve_sheets(names, sheets)
+        if not selected:
+            raise ValueError("工作簿中没有可分析的工作表")
 
-        analysis_prompt = (
-            analysis_prompt if analysis_prompt else DEFAULT_ANALYSIS_PROMPT
+        token_budget = max(PROMPT_TOKEN_BUDGET // len(selected), 1)
+        insights_budget = INSIGHTS_TOKEN_BUDGET // len(selected)
+        results = await ingest_executor.map(
+            load_prompt_data,
+            [
+                (
+                    excel_path,
+                    file_extension,
+                    name,
+                    token_budget,
+                    data_format,
+                    insights_budget,
+                    content_hash,
+                )
+                for name in selected
+            ],
         )
+    finally:
+        # 超时后尚未开始的任务会因文件已删除而失败，调用方已不再等待其结果
+        if spooled is not None:
+            await asyncio.to_thread(_remove_quietly, spooled)
+    for name, (_, _, stats) in zip(selected, results):
+        stats["sheet"] = name
+
+    if len(results) == 1:
+        data_text, data_label, stats = results[0]
+        return data_text, data_label, [stats]
+
+    data_text = combine_sheet_sections(
+        [(name, text, label) for name, (text, label, _) in zip(selected, results)]
+    )
+    return data_text, MULTI_SHEET_DATA_LABEL, [stats for _, _, stats in results]
+
+
+def build_analysis_prompt(
+    data_text, analysis_prompt, user_content=None, data_label=CSV_DATA_LABEL
+):
+    """
+    构建发送给大模型的分析prompt
 
-        # 构建分析prompt
+    Args:
+        data_text (str): 数据内容（CSV或数据摘要）
+        analysis_prompt (str): 分析提示词
+        user_content (str): 用户问题（可选）
+        data_label (str): 数据内容的说明文字
 
-        if user_content:
-            prompt = f"""{analysis_prompt}
+    Returns:
+        str: 完整的分析prompt
+    """
+    if user_content:
+        prompt = f"""{analysis_prompt}
 ## 示例数据
-以下是Excel文件的数据内容（CSV格式）：
-{csv_data}
+{data_label}
+{data_text}
 请根据以上数据以及用户问题进行分析并生成HTML报告，确保所有图表都是用代码实现的，不要使用图片。
 
 ## 用户问题
 {user_content}
 """
-        else:
-            prompt = f"""{analysis_prompt}
+    else:
+        prompt = f"""{analysis_prompt}
 ## 示例数据
-以下是Excel文件的数据内容（CSV格式）：
-{csv_data}
+{data_label}
+{data_text}
 请根据以上数据进行分析并生成HTML报告，确保所有图表都是用代码实现的，不要使用图片。"""
 
-        response = client.chat_with_text(
-            text=prompt,
-            chat_id=chat_id,
+    return prompt
+
+
+def build_incremental_prompt(
+    previous, current, delta, data_text, data_label, analysis_prompt, user_content=None
+):
+    """
+    构建增量分析prompt：上次的数据摘要 + 新增或变更的行 + 数值列统计变化
+
+    Args:
+        previous (Fingerprint): 上次的数据指纹
+        current (Fingerprint): 本次的数据指纹
+        delta (RowDelta): 行变化
+        data_text (str): 新增或变更行的数据内容
+        data_label (str): 数据内容的说明文字
+        analysis_prompt (str): 分析提示词
+        user_content (str): 用户问题（可选）
+
+    Returns:
+        str: 完整的分析prompt
+    """
+    prompt = f"""{analysis_prompt}
+## 增量数据
+本次上传的数据与上次分析的数据表结构相同：上次共 {delta.previous_rows} 行，本次共 {delta.current_rows} 行，
+其中新增或变更 {delta.changed} 行，删除 {delta.removed} 行。
+
+### 上次分析的数据摘要
+{previous.summary_label}
+{previous.summary}
+
+### 新增或变更的行
+{data_label}
+{data_text}
+
+### 全量数据数值列统计（上次 → 本次）
+{describe_stats_change(previous.column_stats, current.column_stats)}
+
+请结合上次的分析报告和以上变化，对全量数据重新分析并生成完整的HTML报告，重点说明本次数据的变化，确保所有图表都是用代码实现的，不要使用图片。"""
+
+    if user_content:
+        prompt += f"""
+
+## 用户问题
+{user_content}
+"""
+    return prompt
+
+
+def build_narrative_prompt(data_text, data_label, charts, user_content=None):
+    """
+    构建模板报告的文字解读prompt：模型只输出JSON格式的总结、发现和图表解读
+
+    Args:
+        data_text (str): 数据内容（含预计算指标）
+        data_label (str): 数据内容的说明文字
+        charts (list): 报告中的图表 {"id", "title"}
+        user_content (str): 用户问题（可选）
+
+    Returns:
+        str: 完整的prompt
+    """
+    chart_lines = "\n".join(f"- {chart['id']}：{chart['title']}" for chart in charts)
+    prompt = f"""{NARRATIVE_PROMPT}
+## 示例数据
+{data_label}
+{data_text}
+
+## 报告中的图表
+{chart_lines or "（无图表，charts 输出空对象）"}
+"""
+    if user_content:
+        prompt += f"""
+## 用户问题
+{user_content}
+请在总结和关键发现中回答用户问题。
+"""
+    return prompt
+
+
+def lookup_cached_report(data_text, analysis_prompt, user_content=None):
+    """
+    查找报告缓存
+
+    Returns:
+        tuple: (缓存键, 命中的缓存文件路径或None)；未启用缓存时均为None
+    """
+    if report_cache is None:
+        return None, None
+    cache_key = ReportCache.make_key(data_text, analysis_prompt, user_content)
+    return cache_key, report_cache.get(cache_key)
+
+
+def new_report_path(uid=None):
+    """生成新的HTML报告保存路径，文件名唯一且记录在报告索引中"""
+    return report_store.new_report(uid)
+
+
+def _template_mode(report_mode, analysis_prompt):
+    """
+    是否套用本地模板生成报告：使用自定义分析提示词时提示词可能对页面有具体要求，
+    模板的图表依赖本地预计算的指标，这两种情况仍由模型生成完整HTML
+    """
+    return (
+        (report_mode or REPORT_MODE) == REPORT_MODE_TEMPLATE
+        and not analysis_prompt
+        and INSIGHTS_ENABLED
+    )
+
+
+def _incremental_mode(chat_id, sheets, template):
+    """
+    是否可能进行增量分析：只针对单个工作表；模板报告由本地重新生成，不需要模型参考上次的报告
+    """
+    return bool(fingerprint_store is not None and chat_id and sheets is None and not template)
+
+
+def _prompt_key(analysis_prompt):
+    """分析提示词的哈希，增量分析要求提示词与上次相同"""
+    prompt = analysis_prompt if analysis_prompt else DEFAULT_ANALYSIS_PROMPT
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def has_incremental_state(chat_id, analysis_prompt=None, sheets=None, report_mode=None):
+    """
+    该用户是否保存了可用于本次请求增量分析的上次数据指纹
+
+    有指纹时分析结果取决于该用户上次的数据和报告，不能与其他用户共享；
+    没有时结果只取决于文件和分析参数
+
+    Args:
+        chat_id (str): 对话ID（用户ID）
+        analysis_prompt (str): 自定义分析提示词（可选）
+        sheets (str | list): parse_sheet_selection 的返回值
+        report_mode (str): 报告生成方式（可选）
+
+    Returns:
+        bool: 是否有可用的指纹
+    """
+    template = _template_mode(report_mode, analysis_prompt)
+    if not _incremental_mode(chat_id, sheets, template):
+        return False
+    return fingerprint_store.exists(chat_id, _prompt_key(analysis_prompt))
+
+
+async def prepare_analysis(
+    excel_path,
+    analysis_prompt=None,
+    user_content=None,
+    file_extension=None,
+    sheets=None,
+    chat_id=None,
+    data_format=None,
+    report_mode=None,
+    content_hash=None,
+):
+    """
+    解析数据并构建prompt，同时查找报告缓存
+
+    模板模式下图表由本地生成，prompt 只要求模型输出文字解读；使用自定义分析提示词时
+    提示词可能对页面有具体要求，仍由模型生成完整HTML。模板的图表依赖本地预计算的指标，
+    INSIGHTS_ENABLED 关闭时同样由模型生成完整HTML
+
+    Args:
+        excel_path (str | bytes): Excel文件路径，或上传的文件内容
+        analysis_prompt (str): 自定义分析提示词（可选）
+        user_content (str): 用户问题（可选）
+        file_extension (str): 传入文件内容时的扩展名
+        sheets (str | list): 要分析的工作表，见 parse_sheet_selection；为空时只分析第一个工作表
+        chat_id (str): 对话ID，同一对话再次上传相近的数据时改为增量分析
+        data_format (str): 数据部分的序列化格式（可选），默认使用 PROMPT_DATA_FORMAT
+        report_mode (str): 报告生成方式（可选），llm 或 template，默认使用 REPORT_MODE
+        content_hash (str): 文件内容的 sha256（可选），各工作表的解析缓存共用，不再重复计算
+
+    Returns:
+        tuple: (prompt, 缓存键, 命中的缓存文件路径, 待保存的数据指纹, 模板报告分节)；
+        命中缓存时 prompt 和数据指纹为 None，非模板模式时报告分节为 None；
+        只有构建增量prompt时不查找报告缓存
+    """
+    template = _template_mode(report_mode, analysis_prompt)
+    incremental = _incremental_mode(chat_id, sheets, template)
+    analysis_prompt = analysis_prompt if analysis_prompt else DEFAULT_ANALYSIS_PROMPT
+    data_format = data_format or PROMPT_DATA_FORMAT
+    previous = delta = fingerprint = None
+
+    with timed_stage("ingest"):
+        if incremental:
+            prompt_key = _prompt_key(analysis_prompt)
+            previous = fingerprint_store.load(chat_id, prompt_key)
+            data_text, data_label, stats, delta, fingerprint = await ingest_executor.run(
+                load_incremental_data,
+                excel_path,
+                file_extension,
+                previous,
+                data_format,
+                content_hash,
+            )
+            if fingerprint is not None:
+                fingerprint = fingerprint._replace(prompt_key=prompt_key)
+            sheet_stats = [stats]
+        elif sheets is None:
+            data_text, data_label, stats = await ingest_executor.run(
+                load_prompt_data,
+                excel_path,
+                file_extension,
+                0,
+                PROMPT_TOKEN_BUDGET,
+                data_format,
+                INSIGHTS_TOKEN_BUDGET,
+                content_hash,
+            )
+            sheet_stats = [stats]
+        else:
+            data_text, data_label, sheet_stats = await load_sheets_prompt_data(
+                excel_path, file_extension, sheets, data_format, content_hash
+            )
+    for stats in sheet_stats:
+        for stage, seconds in stats["stages"].items():
+            record_stage(stage, seconds)
+        for seconds in stats["clean_columns"].values():
+            CLEAN_COLUMN_LATENCY.observe(seconds)
+        _log_slow_columns(stats["clean_columns"])
+        INPUT_ROWS.observe(stats["rows"])
+        INPUT_COLUMNS.observe(stats["columns"])
+        if stats["frame_cache"]:
+            FRAME_CACHE_REQUESTS.inc(result=stats["frame_cache"])
+
+    if delta is not None:
+        # 增量prompt依赖对话上下文，不使用报告缓存
+        print(
+            f"检测到数据变化：新增或变更 {delta.changed} 行，删除 {delta.removed} 行，改为增量分析"
+        )
+        ANALYSIS_MODE.inc(mode="incremental")
+        prompt = build_incremental_prompt(
+            previous, fingerprint, delta, data_text, data_label, analysis_prompt, user_content
+        )
+        PROMPT_TOKENS.observe(estimate_tokens(prompt))
+        return prompt, None, None, fingerprint, None
+
+    ANALYSIS_MODE.inc(mode="template" if template else "full")
+    cache_key, cached_path = await asyncio.to_thread(
+        lookup_cached_report,
+        data_text,
+        NARRATIVE_PROMPT if template else analysis_prompt,
+        user_content,
+    )
+    if cached_path:
+        # 下次增量分析会引用本次的报告，命中缓存的报告并非由模型在该对话中生成，
+        # 不保存本次的数据指纹，该用户已有的指纹保持不变
+        print(f"命中报告缓存: {cache_key}")
+        return None, cache_key, cached_path, None, None
+
+    sections = None
+    if template:
+        multi_sheet = len(sheet_stats) > 1
+        sections = build_sections(
+            [
+                (stats.get("sheet") if multi_sheet else None, stats["insights"])
+                for stats in sheet_stats
+            ]
+        )
+        prompt = build_narrative_prompt(
+            data_text, data_label, list_charts(sections), user_content
+        )
+    else:
+        prompt = build_analysis_prompt(
+            data_text, analysis_prompt, user_content, data_label
+        )
+    PROMPT_TOKENS.observe(estimate_tokens(prompt))
+    return prompt, cache_key, None, fingerprint, sections
+
+
+def _response_content(response):
+    """记录 token 用量并取出模型输出的文本"""
+    usage = response.get("usage") or {}
+    for token_type in ("prompt_tokens", "completion_tokens"):
+        if usage.get(token_type):
+            LLM_TOKENS.inc(usage[token_type], type=token_type)
+
+    # 星云API的响应格式与OpenAI不同
+    if "choices" in response and len(response["choices"]) > 0:
+        return response["choices"][0]["message"]["content"]
+    if "message" in response:
+        return response["message"]["content"]
+    if "content" in response:
+        return response["content"]
+    # 如果响应格式不明确，尝试直接获取内容
+    return str(response)
+
+
+async def render_template_report(prompt, chat_id, sections):
+    """
+    请求模型输出文字解读，与本地生成的图表一起套用模板得到完整HTML
+
+    Args:
+        prompt (str): build_narrative_prompt 构建的prompt
+        chat_id (str): 对话ID
+        sections (list): 模板报告分节
+
+    Returns:
+        str: HTML报告
+    """
+    with timed_stage("llm"):
+        response = await client.chat_with_text(text=prompt, chat_id=chat_id)
+    narrative = parse_narrative(_response_content(response))
+    with timed_stage("render"):
+        return render_report(
+            sections,
+            narrative,
+            ECHARTS_URL,
+            subtitle=f"生成时间：{time.strftime('%Y-%m-%d %H:%M')}",
+        )
+
+
+async def finish_report(
+    report_path, cache_key=None, chat_id=None, fingerprint=None, source_hash=None
+):
+    """报告写入完成后：写入缓存、保存数据指纹、记录大小、生成压缩副本并在报告索引中记录源文件哈希"""
+    if cache_key:
+        await asyncio.to_thread(report_cache.put, cache_key, report_path)
+    if fingerprint is not None:
+        await asyncio.to_thread(fingerprint_store.save, chat_id, fingerprint)
+    REPORT_BYTES.observe(os.path.getsize(report_path))
+    await asyncio.to_thread(precompress_report, report_path)
+    await asyncio.to_thread(report_store.complete, report_path, source_hash)
+
+
+# 调用方需要按类型返回不同状态码的错误（过载、超时、数据过大、参数错误），不包装为通用的生成失败
+PASSTHROUGH_ERRORS = (
+    IngestQueueFullError,
+    IngestTimeoutError,
+    IngestWorkerError,
+    IngestTooLargeError,
+    UpstreamBusyError,
+    SheetNotFoundError,
+)
+
+
+async def generate_html_from_excel(
+    excel_path,
+    chat_id,
+    analysis_prompt=None,
+    user_content=None,
+    file_extension=None,
+    sheets=None,
+    data_format=None,
+    report_mode=None,
+    content_hash=None,
+):
+    """
+    从Excel文件生成HTML分析报告
+
+    Args:
+        excel_path (str | bytes): Excel文件路径，或上传的文件内容
+        uid (str): 用户ID，用作chat_id
+        file_extension (str): 传入文件内容时的扩展名
+        sheets (str | list): 要分析的工作表（可选），默认只分析第一个工作表
+        data_format (str): 数据部分的序列化格式（可选），见 core.serializers.DATA_FORMATS
+        report_mode (str): 报告生成方式（可选），llm 由模型生成完整HTML，template 套用本地模板
+        content_hash (str): 文件内容的 sha256（可选），如下载时已计算，未传入时在此计算一次
+
+    Returns:
+        str: 生成的HTML文件路径
+    """
+    try:
+        if content_hash is None:
+            content_hash = await asyncio.to_thread(_content_hash, excel_path)
+        prompt, cache_key, cached_path, fingerprint, sections = await prepare_analysis(
+            excel_path,
+            analysis_prompt,
+            user_content,
+            file_extension,
+            sheets,
+            chat_id,
+            data_format,
+            report_mode,
+            content_hash,
         )
+        if cached_path:
+            report_path = await asyncio.to_thread(new_report_path, chat_id)
+            await asyncio.to_thread(shutil.copyfile, cached_path, report_path)
+            await finish_report(report_path, source_hash=content_hash)
+            return report_path
 
-        # 获取大模型的HTML输出
-        # 星云API的响应格式与OpenAI不同
-        if "choices" in response and len(response["choices"]) > 0:
-            html_content = response["choices"][0]["message"]["content"]
-        elif "message" in response:
-            html_content = response["message"]["content"]
-        elif "content" in response:
-            html_content = response["content"]
+        if sections is not None:
+            html_content = await render_template_report(prompt, chat_id, sections)
         else:
-            # 如果响应格式不明确，尝试直接获取内容
-            html_content = str(response)
+            with timed_stage("llm"):
+                response = await client.chat_with_text(
+                    text=prompt,
+                    chat_id=chat_id,
+                )
+            # 获取大模型的HTML输出
+            html_content = _response_content(response)
 
         # 保存HTML报告
-        now = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        report_path = os.path.join(REPORT_DIR, f"ai_analysis_report_{now}.html")
-        os.makedirs(os.path.dirname(report_path), exist_ok=True)
+        with timed_stage("report_write"):
+            report_path = await asyncio.to_thread(new_report_path, chat_id)
+
+            async with aiofiles.open(report_path, "w", encoding="utf-8") as f:
+                await f.write(html_content)
 
-        with open(report_path, "w", encoding="utf-8") as f:
-            f.write(html_content)
+            await finish_report(
+                report_path, cache_key, chat_id, fingerprint, content_hash
+            )
 
         return report_path
 
+    except PASSTHROUGH_ERRORS:
+        raise
+    except Exception as e:
+        raise Exception(f"生成HTML报告失败: {str(e)}")
+
+
+async def stream_html_from_excel(
+    excel_path,
+    chat_id,
+    report_path,
+    analysis_prompt=None,
+    user_content=None,
+    file_extension=None,
+    sheets=None,
+    data_format=None,
+    report_mode=None,
+    content_hash=None,
+):
+    """
+    以流式方式从Excel文件生成HTML分析报告，边接收边写入报告文件
+
+    模板模式下模型只输出简短的文字解读，报告组装完成后一次性返回
+
+    Args:
+        excel_path (str | bytes): Excel文件路径，或上传的文件内容
+        chat_id (str): 对话ID
+        report_path (str): 报告保存路径，通常由 new_report_path() 生成
+        analysis_prompt (str): 自定义分析提示词（可选）
+        user_content (str): 用户问题（可选）
+        file_extension (str): 传入文件内容时的扩展名
+        sheets (str | list): 要分析的工作表（可选），默认只分析第一个工作表
+        data_format (str): 数据部分的序列化格式（可选），见 core.serializers.DATA_FORMATS
+        report_mode (str): 报告生成方式（可选），llm 由模型生成完整HTML，template 套用本地模板
+        content_hash (str): 文件内容的 sha256（可选），未传入时在此计算一次
+
+    Yields:
+        str: 模型输出的HTML片段
+    """
+    try:
+        if content_hash is None:
+            content_hash = await asyncio.to_thread(_content_hash, excel_path)
+        prompt, cache_key, cached_path, fingerprint, sections = await prepare_analysis(
+            excel_path,
+            analysis_prompt,
+            user_content,
+            file_extension,
+            sheets,
+            chat_id,
+            data_format,
+            report_mode,
+            content_hash,
+        )
+        if cached_path:
+            await asyncio.to_thread(shutil.copyfile, cached_path, report_path)
+            async with aiofiles.open(report_path, "r", encoding="utf-8") as f:
+                while chunk := await f.read(64 * 1024):
+                    yield chunk
+            await finish_report(report_path, source_hash=content_hash)
+            return
+
+        if sections is not None:
+            html_content = await render_template_report(prompt, chat_id, sections)
+            async with aiofiles.open(report_path, "w", encoding="utf-8") as f:
+                await f.write(html_content)
+            yield html_content
+            await finish_report(
+                report_path, cache_key, chat_id, fingerprint, content_hash
+            )
+            return
+
+        started = time.perf_counter()
+        first_chunk = True
+        async with aiofiles.open(report_path, "w", encoding="utf-8") as f:
+            async for chunk in client.stream_chat_with_text(
+                text=prompt, chat_id=chat_id
+            ):
+                if first_chunk:
+                    record_stage("llm_first_chunk", time.perf_counter() - started)
+                    first_chunk = False
+                await f.write(chunk)
+                yield chunk
+        record_stage("llm", time.perf_counter() - started)
+
+        await finish_report(report_path, cache_key, chat_id, fingerprint, content_hash)
+
+    except PASSTHROUGH_ERRORS:
+        raise
     except Exception as e:
         raise Exception(f"生成HTML报告失败: {str(e)}")
 
@@ -198,14 +1289,14 @@ def analyze_excel_sync(excel_path, uid=None):
     Returns:
         tuple: (success, result_or_error_message)
     """
-    import asyncio
-
     try:
         # 在事件循环中运行异步函数
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         result = loop.run_until_complete(generate_html_from_excel(excel_path, uid))
+        loop.run_until_complete(client.aclose())
         loop.close()
+        ingest_executor.shutdown()
         return True, result
     except Exception as e:
         return False, str(e)
@@ -0,0 +1,98 @@
+"""
+报告预压缩
+报告生成后写入 .gz / .br 压缩副本，下载时按 Accept-Encoding 直接返回，无需每次压缩
+"""
+
+import gzip
+import logging
+import os
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 压缩副本后缀与对应的 Content-Encoding，按优先级排列
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def precompress_report(report_path):
+    """
+    为报告写入压缩副本
+
+    Args:
+        report_path (str): 报告文件路径
+    """
+    try:
+        with open(report_path, "rb") as f:
+            content = f.read()
+
+        _write_atomic(f"{report_path}.gz", gzip.compress(content, compresslevel=9))
+        if brotli is not None:
+            _write_atomic(f"{report_path}.br", brotli.compress(content, quality=11))
+    except OSError as e:
+        logger.warning(f"写入报告压缩副本失败: {str(e)}")
+
+
+def _encoding_qualities(accept_encoding):
+    """解析 Accept-Encoding，返回 {编码: q值}，q 值无法解析的项忽略"""
+    qualities = {}
+    for part in (accept_encoding or "").split(","):
+        token, *params = [item.strip() for item in part.split(";")]
+        if not token:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = None
+        if quality is not None:
+            qualities[token.lower()] = quality
+    return qualities
+
+
+def select_precompressed(report_path, accept_encoding):
+    """
+    根据 Accept-Encoding 选择可用的压缩副本
+
+    按 q 值从高到低选择，q 值相同时按 ENCODINGS 的顺序；q=0 表示明确拒绝该编码，
+    未列出的编码按 * 的 q 值处理，没有 * 时视为不接受
+
+    Args:
+        report_path (str): 报告文件路径
+        accept_encoding (str): 请求头 Accept-Encoding
+
+    Returns:
+        tuple: (压缩副本路径, Content-Encoding)；无可用副本时返回 (None, None)
+    """
+    qualities = _encoding_qualities(accept_encoding)
+    wildcard = qualities.get("*", 0.0)
+    candidates = [
+        (qualities.get(encoding, wildcard), -index, encoding, suffix)
+        for index, (encoding, suffix) in enumerate(ENCODINGS)
+    ]
+    candidates = sorted((item for item in candidates if item[0] > 0), reverse=True)
+    if not candidates:
+        return None, None
+
+    report_mtime = os.stat(report_path).st_mtime_ns
+    for _, _, encoding, suffix in candidates:
+        try:
+            # 忽略早于报告本身的压缩副本
+            if os.stat(report_path + suffix).st_mtime_ns >= report_mtime:
+                return report_path + suffix, encoding
+        except FileNotFoundError:
+            continue
+    return None, None
@@ -0,0 +1,275 @@
+"""
+解析执行器
+将Excel解析与清洗等CPU密集型任务交给独立的解析边车进程（core.ingest_sidecar）中的进程池执行，
+避免阻塞Sanic事件循环
+
+Sanic 的工作进程是守护进程，multiprocessing 不允许其创建子进程，因此进程池放在通过 subprocess
+启动的边车进程中，两者通过 Unix 套接字通信。边车进程在标准输入关闭（服务进程退出或被杀死）时退出，
+进程池的工作进程在边车进程退出后也随之退出，不会遗留孤儿进程
+"""
+
+import asyncio
+import logging
+import os
+import pickle
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 等待边车进程启动并预热进程池的最长时间（秒）
+SIDECAR_START_TIMEOUT = 60
+
+# 进程池工作进程检查父进程是否存活的间隔（秒）
+PARENT_CHECK_INTERVAL = 1.0
+
+_FRAME_HEADER = struct.Struct("!Q")
+
+
+class IngestQueueFullError(Exception):
+    """排队中的解析任务已达上限"""
+
+
+class IngestTimeoutError(Exception):
+    """解析任务超时"""
+
+
+class IngestWorkerError(Exception):
+    """解析边车进程不可用"""
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    """读取一个带长度前缀的消息"""
+    header = await reader.readexactly(_FRAME_HEADER.size)
+    (length,) = _FRAME_HEADER.unpack(header)
+    return await reader.readexactly(length)
+
+
+def write_frame(writer: asyncio.StreamWriter, payload: bytes) -> None:
+    """写入一个带长度前缀的消息"""
+    writer.write(_FRAME_HEADER.pack(len(payload)))
+    writer.write(payload)
+
+
+def run_payload(payload: bytes) -> bytes:
+    """
+    在进程池工作进程中执行序列化的任务
+
+    边车进程只转发字节，不反序列化任务，因此不需要导入任务所在的模块
+
+    Args:
+        payload (bytes): pickle 序列化的 (函数, 参数)
+
+    Returns:
+        bytes: pickle 序列化的 ("ok", 返回值) 或 ("error", 异常)
+    """
+    try:
+        func, args = pickle.loads(payload)
+        result = ("ok", func(*args))
+    except Exception as e:
+        result = ("error", e)
+    try:
+        return pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        # 返回值或异常无法序列化时只返回错误信息
+        return pickle.dumps(("error", RuntimeError(f"解析结果无法序列化: {str(e)}")))
+
+
+def watch_parent() -> None:
+    """进程池工作进程的初始化函数：父进程（边车进程）退出后立即退出"""
+    parent = os.getppid()
+
+    def watch():
+        while True:
+            time.sleep(PARENT_CHECK_INTERVAL)
+            if os.getppid() != parent:
+                os._exit(1)
+
+    threading.Thread(target=watch, name="parent-watch", daemon=True).start()
+
+
+class IngestExecutor:
+    """带排队上限和单任务超时的进程池执行器"""
+
+    def __init__(self, max_workers: int, max_pending: int, timeout: float):
+        """
+        初始化执行器
+
+        Args:
+            max_workers (int): 进程数，为0时退化为在线程池中执行
+            max_pending (int): 除正在执行的任务外，最多允许排队的任务数
+            timeout (float): 单个任务的超时时间（秒）
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._process: Optional[subprocess.Popen] = None
+        self._socket_dir: Optional[str] = None
+        self._start_lock = threading.Lock()
+        self._inflight = 0
+
+    @property
+    def capacity(self) -> int:
+        return max(self.max_workers, 1) + self.max_pending
+
+    @property
+    def _address(self) -> str:
+        return os.path.join(self._socket_dir, "ingest.sock")
+
+    def _ensure_sidecar(self) -> str:
+        """启动边车进程（已在运行时直接返回），等待其进程池预热完成后返回套接字地址"""
+        with self._start_lock:
+            if self._process is not None and self._process.poll() is None:
+                return self._address
+            self._stop_sidecar()
+
+            self._socket_dir = tempfile.mkdtemp(prefix="ingest-")
+            env = dict(os.environ)
+            env["PYTHONPATH"] = os.pathsep.join(
+                filter(None, [ROOT_DIR, env.get("PYTHONPATH")])
+            )
+            ready_read, ready_write = os.pipe()
+            try:
+                # 标准输入保持打开且从不写入，服务进程退出时边车进程读到 EOF 后退出
+                self._process = subprocess.Popen(
+                    [
+                        sys.executable,
+                        "-m",
+                        "core.ingest_sidecar",
+                        "--address",
+                        self._address,
+                        "--workers",
+                        str(self.max_workers),
+                        "--ready-fd",
+                        str(ready_write),
+                    ],
+                    stdin=subprocess.PIPE,
+                    env=env,
+                    pass_fds=(ready_write,),
+                )
+            finally:
+                os.close(ready_write)
+
+            with os.fdopen(ready_read, "rb") as ready:
+                started = time.perf_counter()
+                line = ready.readline()
+            if line.strip() != b"ready":
+                self._stop_sidecar()
+                raise IngestWorkerError("解析边车进程启动失败")
+            logger.info(
+                f"解析边车进程已启动: pid={self._process.pid}, "
+                f"工作进程 {self.max_workers} 个, 耗时 {time.perf_counter() - started:.2f}秒"
+            )
+            return self._address
+
+    async def _call(self, func: Callable, args: Tuple):
+        """将单个任务发送给边车进程执行并等待结果"""
+        payload = pickle.dumps((func, args), protocol=pickle.HIGHEST_PROTOCOL)
+        address = await asyncio.wait_for(
+            asyncio.to_thread(self._ensure_sidecar), SIDECAR_START_TIMEOUT
+        )
+        try:
+            reader, writer = await asyncio.open_unix_connection(address)
+        except OSError as e:
+            raise IngestWorkerError(f"无法连接解析边车进程: {str(e)}")
+        try:
+            write_frame(writer, payload)
+            await writer.drain()
+            status, value = pickle.loads(await read_frame(reader))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            # 边车进程或其进程池异常退出，下次任务时重新启动
+            logger.error(f"解析边车进程连接中断: {str(e)}")
+            raise IngestWorkerError("解析进程异常退出，请重试")
+        finally:
+            writer.close()
+        if status == "error":
+            raise value
+        return value
+
+    async def run(self, func: Callable, *args):
+        """
+        在执行器中运行任务
+
+        Args:
+            func (Callable): 可被 pickle 的模块级函数
+            *args: 函数参数
+
+        Returns:
+            函数返回值
+        """
+        results = await self.map(func, [args])
+        return results[0]
+
+    async def _gather(self, func: Callable, args_list: List[Tuple]) -> List:
+        if self.max_workers <= 0:
+            loop = asyncio.get_running_loop()
+            futures = [loop.run_in_executor(None, func, *args) for args in args_list]
+        else:
+            futures = [self._call(func, args) for args in args_list]
+        return await asyncio.gather(*futures)
+
+    def _release(self, task: asyncio.Task) -> None:
+        self._inflight -= 1
+        if not task.cancelled():
+            # 调用方已超时或取消时，避免事件循环报告异常未被获取
+            task.exception()
+
+    async def map(self, func: Callable, args_list: List[Tuple]) -> List:
+        """
+        并行执行一批任务，整批只占用一个排队名额，超时时间对整批生效
+
+        已开始执行的任务无法中断，超时或调用方取消后仍会执行完毕，
+        排队名额在整批任务实际结束时才释放
+
+        Args:
+            func (Callable): 可被 pickle 的模块级函数
+            args_list (List[Tuple]): 每个任务的参数
+
+        Returns:
+            List: 与 args_list 顺序一致的返回值
+        """
+        if self._inflight >= self.capacity:
+            raise IngestQueueFullError(
+                f"解析任务排队已满（上限 {self.capacity}），请稍后重试"
+            )
+
+        self._inflight += 1
+        task = asyncio.ensure_future(self._gather(func, args_list))
+        task.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise IngestTimeoutError(f"解析任务超时（{self.timeout}秒）")
+
+    async def warmup(self) -> None:
+        """预先启动边车进程及其全部工作进程，避免首批请求承担进程启动耗时"""
+        if self.max_workers <= 0:
+            return
+        await asyncio.to_thread(self._ensure_sidecar)
+
+    def _stop_sidecar(self) -> None:
+        process, self._process = self._process, None
+        if process is not None:
+            # 关闭标准输入通知边车进程退出，未按时退出时强制结束
+            process.stdin.close()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+    def shutdown(self) -> None:
+        """关闭边车进程及其进程池"""
+        with self._start_lock:
+            self._stop_sidecar()
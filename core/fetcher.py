@@ -0,0 +1,135 @@
+"""
+文件下载
+基于共享连接池的异步流式下载，下载过程中限制文件大小并同步计算内容哈希
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from typing import NamedTuple, Optional
+
+import aiofiles
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadError(Exception):
+    """从文件URL下载失败"""
+
+
+class DownloadTooLargeError(DownloadError):
+    """下载的文件超过大小上限"""
+
+
+class FetchResult(NamedTuple):
+    """下载结果"""
+
+    path: str
+    size: int
+    content_hash: Optional[str]
+    etag: Optional[str]
+
+
+class FileFetcher:
+    """异步流式文件下载器"""
+
+    def __init__(
+        self,
+        chunk_size: int = 64 * 1024,
+        max_bytes: int = 50 * 1024 * 1024,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 60.0,
+        pool_size: int = 50,
+        hash_algorithm: Optional[str] = "sha256",
+    ):
+        """
+        初始化下载器
+
+        Args:
+            chunk_size (int): 每次读取的块大小（字节）
+            max_bytes (int): 文件大小上限（字节），下载过程中超出即中止
+            connect_timeout (float): 建立连接超时时间（秒）
+            read_timeout (float): 两次读取之间的最长等待时间（秒）
+            pool_size (int): 连接池最大连接数
+            hash_algorithm (Optional[str]): 边下载边计算的哈希算法，为空时不计算
+        """
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.hash_algorithm = hash_algorithm or None
+        self.limits = httpx.Limits(
+            max_connections=pool_size, max_keepalive_connections=pool_size
+        )
+        self.timeout = httpx.Timeout(
+            read_timeout, connect=connect_timeout, pool=connect_timeout
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """懒加载共享的 httpx.AsyncClient，需在事件循环内首次访问"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=self.limits, timeout=self.timeout, follow_redirects=True
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """关闭连接池"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch_to_file(self, url: str, suffix: str = "") -> FetchResult:
+        """
+        下载文件到临时目录
+
+        Args:
+            url (str): 文件URL
+            suffix (str): 临时文件后缀
+
+        Returns:
+            FetchResult: 临时文件路径、大小、内容哈希和ETag
+        """
+        hasher = hashlib.new(self.hash_algorithm) if self.hash_algorithm else None
+        fd, temp_path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+
+        try:
+            async with self.client.stream("GET", url) as response:
+                if response.status_code != 200:
+                    raise DownloadError(f"从URL下载文件失败: {response.status_code}")
+
+                content_length = response.headers.get("Content-Length")
+                if content_length and int(content_length) > self.max_bytes:
+                    raise DownloadTooLargeError(
+                        f"文件大小 {content_length} 字节超过上限 {self.max_bytes} 字节"
+                    )
+
+                size = 0
+                async with aiofiles.open(temp_path, "wb") as f:
+                    async for chunk in response.aiter_bytes(self.chunk_size):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise DownloadTooLargeError(
+                                f"文件大小超过上限 {self.max_bytes} 字节"
+                            )
+                        if hasher is not None:
+                            hasher.update(chunk)
+                        await f.write(chunk)
+
+                return FetchResult(
+                    path=temp_path,
+                    size=size,
+                    content_hash=hasher.hexdigest() if hasher is not None else None,
+                    etag=response.headers.get("ETag"),
+                )
+
+        except httpx.HTTPError as e:
+            os.unlink(temp_path)
+            logger.error(f"下载文件失败: {str(e)}")
+            raise DownloadError(f"从URL下载文件失败: {str(e)}")
+        except BaseException:
+            os.unlink(temp_path)
+            raise
@@ -0,0 +1,216 @@
+"""
+解析结果缓存
+将清洗后的 DataFrame 以 Arrow IPC 格式保存到磁盘，按 文件内容哈希 + 工作表 + 清洗版本 + 类型优化配置
+索引，读取时通过内存映射加载，同一文件再次分析时跳过 Excel 解析和清洗。
+含混合类型列（如数字与文本混在一列）的数据无法转换为 Arrow，改用 pickle 保存，读取结果与原数据完全一致
+"""
+
+import hashlib
+import logging
+import os
+import time
+from typing import Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # pyarrow 为可选依赖，未安装时不启用缓存
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# 未超出大小上限时，至少间隔该时间（秒）扫描一次缓存目录以校准总大小
+EVICT_INTERVAL = 600
+
+ARROW_SUFFIX = ".arrow"
+PICKLE_SUFFIX = ".pkl"
+
+
+def frame_cache_available() -> bool:
+    """判断 pyarrow 是否已安装"""
+    return pa is not None
+
+
+class FrameCache:
+    """基于 Arrow IPC 文件的清洗结果缓存，按总大小和最近访问时间淘汰"""
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir (str): 缓存目录
+            max_bytes (int): 缓存总大小上限（字节），超出时按最近访问时间淘汰
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # 缓存目录的估算总大小，首次写入时扫描目录得到，之后随写入累加，淘汰时重新校准
+        self._total_bytes: Optional[int] = None
+        self._last_evict = 0.0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(content_hash: str, sheet_name, version: int, settings: str = "") -> str:
+        """
+        计算缓存键
+
+        Args:
+            content_hash (str): 文件内容哈希
+            sheet_name (int | str): 工作表序号或名称
+            version (int): 清洗逻辑版本，清洗逻辑变化后旧缓存自动失效
+            settings (str): 影响缓存数据类型的配置（如类型优化选项），配置变化后旧缓存自动失效
+
+        Returns:
+            str: sha256 十六进制摘要
+        """
+        digest = hashlib.sha256()
+        parts = (
+            content_hash,
+            f"{type(sheet_name).__name__}:{sheet_name}",
+            str(version),
+            settings,
+        )
+        for part in parts:
+            encoded = part.encode("utf-8")
+            digest.update(len(encoded).to_bytes(8, "big"))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str, suffix: str = ARROW_SUFFIX) -> str:
+        return os.path.join(self.cache_dir, f"{key}{suffix}")
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """
+        读取缓存
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            Optional[pd.DataFrame]: 命中时返回清洗后的数据，否则返回 None
+        """
+        for suffix in (ARROW_SUFFIX, PICKLE_SUFFIX):
+            path = self._entry_path(key, suffix)
+            try:
+                if suffix == ARROW_SUFFIX:
+                    with pa.memory_map(path, "r") as source:
+                        table = pa.ipc.open_file(source).read_all()
+                    df = table.to_pandas()
+                else:
+                    # 只读取本缓存写入的文件
+                    df = pd.read_pickle(path)
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.warning(f"读取解析缓存失败: {str(e)}")
+                self._remove(path)
+                return None
+
+            # atime 记录最近访问时间用于淘汰
+            try:
+                os.utime(path, (time.time(), os.stat(path).st_mtime))
+            except OSError:
+                pass
+            return df
+        return None
+
+    @staticmethod
+    def _has_mixed_columns(df: pd.DataFrame) -> bool:
+        """是否有混合类型的 object 列，这类列无法转换为 Arrow"""
+        return any(
+            pd.api.types.infer_dtype(df[col], skipna=True) not in ("string", "empty")
+            for col in df.columns
+            if df[col].dtype == object
+        )
+
+    def _write_arrow(self, df: pd.DataFrame, tmp_path: str) -> None:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        """
+        写入缓存，含混合类型列或无法转换为 Arrow 的数据改用 pickle 保存
+
+        只有估算总大小超限或距上次扫描超过 EVICT_INTERVAL 时才扫描目录淘汰，
+        避免每次写入都遍历整个缓存目录
+
+        Args:
+            key (str): 缓存键
+            df (pd.DataFrame): 清洗后的数据
+        """
+        suffix = PICKLE_SUFFIX if self._has_mixed_columns(df) else ARROW_SUFFIX
+        if suffix == ARROW_SUFFIX:
+            path = self._entry_path(key, ARROW_SUFFIX)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                self._write_arrow(df, tmp_path)
+            except pa.ArrowException as e:
+                logger.info(f"数据无法转换为 Arrow，解析缓存改用 pickle: {str(e)}")
+                self._remove(tmp_path)
+                suffix = PICKLE_SUFFIX
+            except OSError as e:
+                logger.warning(f"写入解析缓存失败: {str(e)}")
+                self._remove(tmp_path)
+                return
+        if suffix == PICKLE_SUFFIX:
+            path = self._entry_path(key, PICKLE_SUFFIX)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                df.to_pickle(tmp_path)
+            except Exception as e:
+                logger.warning(f"写入解析缓存失败: {str(e)}")
+                self._remove(tmp_path)
+                return
+
+        try:
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"写入解析缓存失败: {str(e)}")
+            self._remove(tmp_path)
+            return
+
+        if self._total_bytes is not None:
+            self._total_bytes += size
+        if (
+            self._total_bytes is None
+            or self._total_bytes > self.max_bytes
+            or time.time() - self._last_evict > EVICT_INTERVAL
+        ):
+            self.evict()
+
+    def evict(self) -> None:
+        """总大小超限时按最近访问时间从旧到新淘汰"""
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith((ARROW_SUFFIX, PICKLE_SUFFIX)):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+        self._total_bytes = total
+        self._last_evict = time.time()
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,204 @@
+"""
+表头识别
+读取工作表时不指定表头行，根据合并单元格区域和各行单元格的类型判断顶部有几行表头，
+再将多级表头一次性合并为单级列名，不需要按识别结果重新读取文件
+"""
+
+import numpy as np
+import pandas as pd
+
+# 单元格类型
+KIND_EMPTY = 0
+KIND_TEXT = 1
+KIND_VALUE = 2
+
+# 判断某行下方各列数据类型时使用的行数
+TYPE_SAMPLE_ROWS = 200
+
+# 数值或日期单元格占非空单元格的比例达到该值的列视为数值列
+TYPED_COLUMN_RATIO = 0.8
+
+# 表头行中出现在数值列上的文本单元格至少占数值列的比例
+HEADER_MISMATCH_RATIO = 0.5
+
+
+def _cell_kind(value):
+    if isinstance(value, str):
+        return KIND_TEXT if value.strip() else KIND_EMPTY
+    return KIND_EMPTY if pd.isna(value) else KIND_VALUE
+
+
+def _header_text(value):
+    if isinstance(value, float) and value.is_integer():
+        # 数值列中的表头（如年份）读取为浮点数
+        return str(int(value))
+    return "" if pd.isna(value) else str(value).strip()
+
+
+_cell_kinds = np.frompyfunc(_cell_kind, 1, 1)
+_header_texts = np.frompyfunc(_header_text, 1, 1)
+
+
+def _relative_ranges(merged, positions):
+    """
+    将合并区域的行号转换为顶部非空行中的序号
+
+    Args:
+        merged (list): 合并单元格区域 [((首行, 首列), (末行, 末列)), ...]
+        positions (np.ndarray): 顶部非空行在工作表中的行号
+
+    Returns:
+        list: 相对坐标的合并区域 (首行, 首列, 末行, 末列)，只包含非空行的区域
+    """
+    ranges = []
+    for (r0, c0), (r1, c1) in merged:
+        first = int(np.searchsorted(positions, r0))
+        last = int(np.searchsorted(positions, r1, side="right")) - 1
+        if first < len(positions) and first <= last:
+            ranges.append((first, c0, last, c1))
+    return sorted(ranges)
+
+
+def _typed_columns(kinds):
+    """数值或日期单元格占多数的列"""
+    filled = (kinds > KIND_EMPTY).sum(axis=0)
+    values = (kinds == KIND_VALUE).sum(axis=0)
+    return (filled > 0) & (values >= TYPED_COLUMN_RATIO * filled)
+
+
+def detect_header_rows(kinds, ranges, scan_rows):
+    """
+    判断表头行数
+
+    表头行的非空单元格全部为文本；最后一行表头的文本至少覆盖下方一半的数值/日期列。
+    横向合并的单元格是分组表头，其下一行也属于表头；纵向合并的单元格所跨的行都属于表头
+
+    Args:
+        kinds (np.ndarray): 顶部若干行的单元格类型矩阵
+        ranges (list): 相对坐标的合并区域 (首行, 首列, 末行, 末列)，None 表示未知
+        scan_rows (int): 最多识别的表头行数
+
+    Returns:
+        int: 表头行数，至少为1
+    """
+    n_rows = min(scan_rows, len(kinds))
+    non_empty = kinds > KIND_EMPTY
+    text_rows = non_empty.any(axis=1) & ((kinds == KIND_TEXT) | ~non_empty).all(axis=1)
+    # 从首行开始连续的文本行数，表头只能出现在这个范围内
+    leading_text = int(np.argmin(text_rows)) if not text_rows.all() else len(text_rows)
+    limit = min(n_rows, leading_text)
+
+    header_rows = 1
+    for i in range(1, limit):
+        typed = _typed_columns(kinds[i + 1 : i + 1 + TYPE_SAMPLE_ROWS])
+        if not typed.any():
+            continue
+        mismatched = ((kinds[i] == KIND_TEXT) & typed).sum()
+        if mismatched >= HEADER_MISMATCH_RATIO * typed.sum():
+            header_rows = i + 1
+
+    if ranges is None:
+        # 无法获取合并区域时，分组表头下方只在数值列有值、文本列为空的一行（如年份）也视为表头
+        i = header_rows
+        if i < n_rows and (kinds[i - 1] == KIND_EMPTY).any():
+            typed = _typed_columns(kinds[i + 1 : i + 1 + TYPE_SAMPLE_ROWS])
+            filled = kinds[i] > KIND_EMPTY
+            if (~typed).any() and typed.any() and not (filled & ~typed).any():
+                header_rows += 1
+        return header_rows
+
+    changed = True
+    while changed:
+        changed = False
+        for r0, c0, r1, c1 in ranges:
+            if r0 >= header_rows or r0 >= limit:
+                continue
+            needed = r1 + 1
+            if c1 > c0 and r1 == r0:
+                needed = r0 + 2
+            needed = min(needed, n_rows)
+            if needed > header_rows:
+                header_rows = needed
+                changed = True
+    return header_rows
+
+
+def flatten_header(block, ranges=None):
+    """
+    将多行表头合并为单级列名
+
+    合并单元格的值填充到整个区域；无法获取合并区域时，上层表头向右填充空白单元格。
+    所有列取值相同的表头行（如标题行）不参与合并，各层去掉空值和重复值后用下划线连接
+
+    Args:
+        block (np.ndarray): 表头行的单元格，object 类型
+        ranges (list): 相对坐标的合并区域，None 表示未知
+
+    Returns:
+        List[str]: 列名
+    """
+    block = block.copy()
+    n_levels, n_cols = block.shape
+    if ranges is not None:
+        for r0, c0, r1, c1 in ranges:
+            if r0 < n_levels:
+                block[r0 : r1 + 1, c0 : c1 + 1] = block[r0, c0]
+    elif n_levels > 1:
+        block[:-1] = pd.DataFrame(block[:-1]).ffill(axis=1).to_numpy()
+
+    parts = _header_texts(block).astype(str)
+
+    if n_levels > 1 and n_cols > 1:
+        constant = (parts == parts[:, :1]).all(axis=1)
+        if constant.all():
+            constant[-1] = False
+        parts = parts[~constant]
+
+    names = parts[0]
+    for level in range(1, len(parts)):
+        part = parts[level]
+        keep = part != ""
+        for previous in parts[:level]:
+            keep &= part != previous
+        separator = np.where((names != "") & keep, "_", "")
+        names = np.char.add(names, np.char.add(separator, np.where(keep, part, "")))
+
+    names = names.astype(object)
+    blank = np.flatnonzero(names == "")
+    names[blank] = [f"列{i + 1}" for i in blank]
+
+    # 与 pandas 一致，重复的列名依次加 .1、.2 后缀
+    occurrence = pd.Series(names).groupby(names).cumcount().to_numpy()
+    duplicated = np.flatnonzero(occurrence > 0)
+    names[duplicated] = [f"{names[i]}.{occurrence[i]}" for i in duplicated]
+    return names.tolist()
+
+
+def split_header(raw, merged=None, scan_rows=10):
+    """
+    识别并拆分原始单元格中的表头和数据
+
+    Args:
+        raw (pd.DataFrame): 未指定表头读取的工作表
+        merged (list): 合并单元格区域 [((首行, 首列), (末行, 末列)), ...]，None 表示未知
+        scan_rows (int): 最多识别的表头行数
+
+    Returns:
+        tuple: (以识别出的表头为列名的数据, 表头行数)
+    """
+    # 空行不参与识别，表头与数据之间的空行随表头一起去掉
+    positions = np.flatnonzero(raw.notna().to_numpy().any(axis=1))
+    if len(positions) == 0:
+        return pd.DataFrame(), 0
+    positions = positions[: scan_rows + TYPE_SAMPLE_ROWS]
+
+    top = raw.iloc[positions].to_numpy(dtype=object)
+    kinds = _cell_kinds(top).astype(np.int8)
+    ranges = _relative_ranges(merged, positions) if merged is not None else None
+    header_rows = detect_header_rows(kinds, ranges, scan_rows)
+
+    columns = flatten_header(top[:header_rows], ranges)
+    df = raw.iloc[positions[header_rows - 1] + 1 :].reset_index(drop=True)
+    df.columns = columns
+    # 原始读取时表头和数据混在同一列中，按数据部分重新推断列类型
+    return df.infer_objects(), header_rows
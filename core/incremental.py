@@ -0,0 +1,273 @@
+"""
+增量分析
+按用户保存上一次清洗后数据的指纹（逐行哈希、列统计和紧凑摘要），
+再次上传时识别新增或变更的行，只将变化部分和上次的摘要发送给大模型
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.summarize import build_data_section
+
+logger = logging.getLogger(__name__)
+
+
+class Fingerprint(NamedTuple):
+    """一次分析所用数据的指纹"""
+
+    columns: List[str]
+    # 各列类型的大类，见 dtype_kind
+    dtypes: List[str]
+    row_hashes: np.ndarray
+    column_stats: Dict[str, Dict]
+    summary: str
+    summary_label: str
+    prompt_key: str = ""
+
+
+class RowDelta(NamedTuple):
+    """与上次数据相比的行变化"""
+
+    positions: np.ndarray
+    changed: int
+    removed: int
+    previous_rows: int
+    current_rows: int
+
+
+def column_stats(df):
+    """统计数值列的行数、总和、均值、最小值和最大值"""
+    stats = {}
+    for col in df.select_dtypes(include="number").columns:
+        series = df[col]
+        stats[str(col)] = {
+            "count": int(series.count()),
+            "sum": float(series.sum()),
+            "mean": float(series.mean()) if series.count() else None,
+            "min": float(series.min()) if series.count() else None,
+            "max": float(series.max()) if series.count() else None,
+        }
+    return stats
+
+
+def dtype_kind(series):
+    """
+    列类型的大类（bool/int/float/datetime/string 等）
+
+    optimize_dtypes 按数据选择整数宽度、category 或 Arrow 字符串，追加几行数据就可能改变具体类型，
+    指纹只按大类比较表结构
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return "bool"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "int"
+    if pd.api.types.is_float_dtype(dtype):
+        return "float"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    if pd.api.types.is_string_dtype(dtype):
+        return "string"
+    return str(dtype)
+
+
+def _canonical_frame(df):
+    """
+    将各列转换为与 optimize_dtypes 无关的统一类型，使逐行哈希只取决于取值
+
+    整数列的哈希与类型宽度有关（如 int8 与 int16 中的负数不同），category 和 Arrow 字符串列
+    同样按普通对象列计算
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype(object)
+        if pd.api.types.is_bool_dtype(series):
+            pass
+        elif pd.api.types.is_integer_dtype(series):
+            nullable = pd.api.types.is_extension_array_dtype(series)
+            series = series.astype("Int64" if nullable else np.int64)
+        elif pd.api.types.is_string_dtype(series) and series.dtype != object:
+            series = series.astype(object)
+        columns[col] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+def compute_fingerprint(df, summary_budget):
+    """
+    计算清洗后数据的指纹，表结构和逐行哈希不受 optimize_dtypes 选择的具体类型影响
+
+    Args:
+        df (pd.DataFrame): 清洗后的数据
+        summary_budget (int): 紧凑摘要的 token 预算
+
+    Returns:
+        Fingerprint: 数据指纹
+    """
+    summary, summary_label = build_data_section(df, summary_budget)
+    return Fingerprint(
+        columns=[str(col) for col in df.columns],
+        dtypes=[dtype_kind(df[col]) for col in df.columns],
+        row_hashes=pd.util.hash_pandas_object(_canonical_frame(df), index=False).to_numpy(),
+        column_stats=column_stats(df),
+        summary=summary,
+        summary_label=summary_label,
+    )
+
+
+def diff_rows(previous, current, max_ratio):
+    """
+    对比两次数据的逐行哈希
+
+    Args:
+        previous (Fingerprint): 上次的指纹
+        current (Fingerprint): 本次的指纹
+        max_ratio (float): 变化行占比上限，超出时不适合增量分析
+
+    Returns:
+        Optional[RowDelta]: 适合增量分析时返回行变化，表结构不同、数据无变化或变化过大时返回 None
+    """
+    if previous.columns != current.columns or previous.dtypes != current.dtypes:
+        return None
+
+    positions = np.flatnonzero(~np.isin(current.row_hashes, previous.row_hashes))
+    removed = int((~np.isin(previous.row_hashes, current.row_hashes)).sum())
+    if len(positions) == 0 and removed == 0:
+        return None
+    if len(positions) + removed > max_ratio * max(len(current.row_hashes), 1):
+        return None
+
+    return RowDelta(
+        positions=positions,
+        changed=len(positions),
+        removed=removed,
+        previous_rows=len(previous.row_hashes),
+        current_rows=len(current.row_hashes),
+    )
+
+
+def describe_stats_change(previous_stats, current_stats):
+    """生成数值列统计的前后对比文本"""
+
+    def fmt(value):
+        return "-" if value is None else f"{value:.6g}"
+
+    lines = ["列名,指标,上次,本次"]
+    for col, current in current_stats.items():
+        previous = previous_stats.get(col, {})
+        for key in ("count", "sum", "mean", "min", "max"):
+            lines.append(f"{col},{key},{fmt(previous.get(key))},{fmt(current[key])}")
+    return "\n".join(lines)
+
+
+class FingerprintStore:
+    """按用户保存最近一次分析的数据指纹"""
+
+    def __init__(self, directory: str, max_age: float):
+        """
+        初始化指纹存储
+
+        Args:
+            directory (str): 指纹文件目录
+            max_age (float): 指纹最长有效时间（秒），超过后重新全量分析
+        """
+        self.directory = directory
+        self.max_age = max_age
+        self._last_prune = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, uid):
+        name = hashlib.sha256(uid.encode("utf-8")).hexdigest()[:32]
+        base = os.path.join(self.directory, name)
+        return f"{base}.json", f"{base}.npy"
+
+    def load(self, uid: str, prompt_key: str) -> Optional[Fingerprint]:
+        """
+        读取用户上一次的指纹
+
+        Args:
+            uid (str): 用户ID
+            prompt_key (str): 分析提示词的哈希，提示词不同时不做增量分析
+
+        Returns:
+            Optional[Fingerprint]: 不存在、已过期或提示词不同时返回 None
+        """
+        meta_path, hashes_path = self._paths(uid)
+        try:
+            meta = self._load_meta(meta_path, prompt_key)
+            if meta is None:
+                return None
+            row_hashes = np.load(hashes_path, allow_pickle=False)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取数据指纹失败: {str(e)}")
+            return None
+        return Fingerprint(row_hashes=row_hashes, **meta)
+
+    def exists(self, uid: str, prompt_key: str) -> bool:
+        """用户是否有可用的指纹，只读取元数据，不加载逐行哈希"""
+        meta_path, _ = self._paths(uid)
+        try:
+            return self._load_meta(meta_path, prompt_key) is not None
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取数据指纹失败: {str(e)}")
+            return False
+
+    def _load_meta(self, meta_path, prompt_key):
+        """读取指纹元数据，已过期或提示词不同时返回 None"""
+        if time.time() - os.stat(meta_path).st_mtime > self.max_age:
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["prompt_key"] != prompt_key:
+            return None
+        return meta
+
+    def save(self, uid: str, fingerprint: Fingerprint) -> None:
+        """保存用户本次分析的指纹，覆盖上一次的记录"""
+        meta_path, hashes_path = self._paths(uid)
+        meta = fingerprint._asdict()
+        row_hashes = meta.pop("row_hashes")
+        suffix = f".{os.getpid()}.tmp"
+        try:
+            # 先写哈希再写元数据：元数据的修改时间即指纹的保存时间
+            with open(hashes_path + suffix, "wb") as f:
+                np.save(f, row_hashes, allow_pickle=False)
+            os.replace(hashes_path + suffix, hashes_path)
+            with open(meta_path + suffix, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(meta_path + suffix, meta_path)
+        except OSError as e:
+            logger.warning(f"保存数据指纹失败: {str(e)}")
+
+        # 未传 uid 的请求每次都会生成新的 uid，定期清理过期指纹
+        if time.time() - self._last_prune > min(self.max_age, 3600):
+            self.prune()
+
+    def prune(self) -> int:
+        """删除过期的指纹文件，返回删除的文件数"""
+        self._last_prune = time.time()
+        expire_before = self._last_prune - self.max_age
+        removed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < expire_before:
+                        os.unlink(entry.path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
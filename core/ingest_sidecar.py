@@ -0,0 +1,109 @@
+"""
+解析边车进程
+由 core.executor.IngestExecutor 通过 subprocess 启动，持有解析进程池，
+在 Unix 套接字上接收序列化的解析任务并返回结果
+
+用法（由执行器自动调用）:
+    python -m core.ingest_sidecar --address /tmp/ingest-xxx/ingest.sock --workers 2 --ready-fd 5
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import pickle
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from core.executor import read_frame, run_payload, watch_parent, write_frame
+
+logger = logging.getLogger(__name__)
+
+
+class SidecarServer:
+    """转发解析任务到进程池，进程池异常退出时自动重建"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # 使用 spawn，工作进程在边车进程退出后自行退出
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=watch_parent,
+            )
+        return self._pool
+
+    async def warmup(self) -> None:
+        """预先启动全部工作进程"""
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        await asyncio.gather(
+            *[loop.run_in_executor(pool, os.getpid) for _ in range(self.workers)]
+        )
+
+    async def handle(self, reader, writer) -> None:
+        """处理一个连接：读取一个任务，执行后写回结果"""
+        loop = asyncio.get_running_loop()
+        try:
+            payload = await read_frame(reader)
+            try:
+                result = await loop.run_in_executor(self._get_pool(), run_payload, payload)
+            except BrokenProcessPool as e:
+                logger.error("解析进程池异常退出，将在下次任务时重建")
+                self._pool = None
+                result = pickle.dumps(("error", e))
+            write_frame(writer, result)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # 调用方已放弃等待（超时或取消）
+            pass
+        except asyncio.CancelledError:
+            # 边车进程退出时取消未完成的连接，调用方会收到连接中断
+            pass
+        finally:
+            writer.close()
+
+    def shutdown(self) -> None:
+        """结束工作进程并关闭进程池，不等待仍在执行的解析任务"""
+        if self._pool is not None:
+            for child in multiprocessing.active_children():
+                child.terminate()
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+async def wait_for_stdin_close() -> None:
+    """标准输入读到 EOF 表示启动边车进程的服务进程已退出"""
+    await asyncio.to_thread(sys.stdin.buffer.read)
+
+
+async def serve(address: str, workers: int, ready_fd: int) -> None:
+    sidecar = SidecarServer(workers)
+    server = await asyncio.start_unix_server(sidecar.handle, path=address)
+    try:
+        await sidecar.warmup()
+        with os.fdopen(ready_fd, "wb") as ready:
+            ready.write(b"ready\n")
+        await wait_for_stdin_close()
+    finally:
+        server.close()
+        sidecar.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="解析边车进程")
+    parser.add_argument("--address", required=True, help="Unix 套接字路径")
+    parser.add_argument("--workers", type=int, required=True, help="解析进程数")
+    parser.add_argument("--ready-fd", type=int, required=True, help="启动完成后写入 ready 的文件描述符")
+    args = parser.parse_args()
+    asyncio.run(serve(args.address, args.workers, args.ready_fd))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+"""
+本地预计算指标
+在调用大模型之前用 pandas 计算占比、环比/同比、相关系数、TopN 和各列概况，
+以紧凑 JSON 的形式随数据一起发送，模型直接引用这些数值绘图和撰写结论，
+不再根据原始数据自行计算
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from core.tokens import estimate_tokens
+
+INSIGHTS_LABEL = (
+    "以下是基于全部数据在本地精确计算的指标（JSON格式，百分比字段单位为%）。"
+    "图表和结论中涉及占比、环比、同比、相关系数、排名等数值时请直接引用，不要根据原始数据重新计算："
+)
+
+# 数据经过抽样时使用的说明，合计等数值只代表抽样的行
+INSIGHTS_SAMPLED_LABEL = (
+    "以下是基于抽样的 {rows} 行数据在本地计算的指标（原始数据共 {source_rows} 行，"
+    "JSON格式，百分比字段单位为%）。合计、行数等为抽样数据的数值，不代表全部数据；"
+    "占比、环比、同比、相关系数可作为全部数据的估计。"
+    "图表和结论中涉及这些数值时请直接引用并注明基于抽样数据，不要根据原始数据重新计算："
+)
+
+# 作为分组维度的列的唯一值数量范围，唯一值超过行数一半的列视为编号等标识列
+DIMENSION_MIN_UNIQUE = 2
+DIMENSION_MAX_UNIQUE = 1000
+
+# 识别为年份的整数列取值范围
+YEAR_RANGE = (1900, 2100)
+
+# 时间趋势最多包含的周期数，从细到粗选择第一个不超过该数量的粒度
+MAX_PERIODS = 36
+PERIOD_FREQS = [("D", "day"), ("M", "month"), ("Q", "quarter"), ("Y", "year")]
+# 同比对应的周期偏移
+YOY_SHIFTS = {"M": 12, "Q": 4}
+
+# 参与相关性分析的数值列上限，强相关的阈值
+MAX_CORRELATION_COLUMNS = 10
+STRONG_CORRELATION = 0.7
+
+# 各列概况中文本列展示的高频取值数量
+PROFILE_TOP_VALUES = 3
+
+# 按行数统计的序列名称
+COUNT_LABEL = "行数"
+
+
+def _number(value, digits=10):
+    """转换为 JSON 数值，保留有效数字，整数值去掉小数部分，缺失值为 None"""
+    if value is None or pd.isna(value) or not np.isfinite(value):
+        return None
+    value = float(f"{float(value):.{digits}g}")
+    return int(value) if value.is_integer() and abs(value) < 2**53 else value
+
+
+def _numbers(values, digits=10):
+    return [_number(value, digits) for value in values]
+
+
+def _pct(values):
+    """比例转换为保留两位小数的百分比，无法计算（如上期为0）时为 None"""
+    return [
+        round(float(value) * 100, 2) if pd.notna(value) and np.isfinite(value) else None
+        for value in values
+    ]
+
+
+def _is_year_column(series):
+    if not pd.api.types.is_integer_dtype(series):
+        return False
+    values = series.dropna()
+    return (
+        not values.empty
+        and values.min() >= YEAR_RANGE[0]
+        and values.max() <= YEAR_RANGE[1]
+    )
+
+
+def _is_identifier(series):
+    """取值互不相同且递增的整数列（如序号、订单号），求和没有意义"""
+    if not pd.api.types.is_integer_dtype(series):
+        return False
+    values = series.dropna()
+    return len(values) > 1 and values.is_unique and values.is_monotonic_increasing
+
+
+def _date_text(value):
+    return str(value.date()) if value == value.normalize() else str(value)
+
+
+def select_columns(df, max_dimensions, max_measures):
+    """
+    挑选分组维度、度量和时间列
+
+    Args:
+        df (pd.DataFrame): 清洗后的数据
+        max_dimensions (int): 最多使用的分组维度数量
+        max_measures (int): 最多使用的度量数量
+
+    Returns:
+        tuple: (分组维度列表, 度量列表, 日期列列表, 年份列列表)
+    """
+    dimensions, measures, dates, years = [], [], [], []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_datetime64_any_dtype(series):
+            dates.append(col)
+        elif _is_year_column(series):
+            years.append(col)
+        elif pd.api.types.is_numeric_dtype(series):
+            if series.notna().any() and not _is_identifier(series):
+                measures.append(col)
+        else:
+            unique = series.nunique(dropna=True)
+            if (
+                DIMENSION_MIN_UNIQUE <= unique <= DIMENSION_MAX_UNIQUE
+                and unique * 2 <= series.count()
+            ):
+                dimensions.append((unique, col))
+    # 低基数维度更适合占比分析
+    dimensions = [col for _, col in sorted(dimensions, key=lambda item: item[0])]
+    return dimensions[:max_dimensions], measures[:max_measures], dates, years
+
+
+def breakdown(df, dimension, measures, top_n):
+    """
+    按维度分组汇总，计算各组占总量的比例，超过 top_n 组时其余合并为「其他」
+
+    Args:
+        df (pd.DataFrame): 清洗后的数据
+        dimension (str): 分组维度列
+        measures (list): 求和的度量列，为空时按行数统计
+        top_n (int): 保留的分组数
+
+    Returns:
+        dict: 可直接用于柱状图/饼图的分组名称、各度量的合计与占比
+    """
+    counts = df.groupby(dimension, observed=True, sort=False).size()
+    if measures:
+        # 按 float64 汇总，避免窄类型的度量列在求和时累积误差
+        values = df[measures].astype(np.float64)
+        totals = values.groupby(df[dimension], observed=True, sort=False).sum()
+    else:
+        totals = pd.DataFrame(index=counts.index)
+    if COUNT_LABEL not in totals.columns:
+        totals.insert(0, COUNT_LABEL, counts)
+
+    order_by = measures[0] if measures else COUNT_LABEL
+    totals = totals.sort_values(order_by, ascending=False, kind="stable")
+    groups = len(totals)
+    if groups > top_n:
+        rest = totals.iloc[top_n - 1 :].sum()
+        totals = totals.iloc[: top_n - 1]
+        # 类别类型的索引不能直接加入新标签
+        totals.index = totals.index.astype(object)
+        totals.loc["其他"] = rest
+
+    series = {}
+    for col in totals.columns:
+        values = totals[col]
+        total = values.sum()
+        entry = {"values": _numbers(values), "total": _number(total)}
+        # 含负数的度量占比没有意义
+        if total and (values >= 0).all():
+            entry["share_pct"] = _pct(values / total)
+        series[col] = entry
+
+    return {
+        "dimension": dimension,
+        "groups": groups,
+        "sort_by": order_by,
+        "labels": [str(label) for label in totals.index],
+        "series": series,
+    }
+
+
+def _period_freq(periods_of):
+    """选择周期数不超过 MAX_PERIODS 的最细粒度"""
+    for freq, name in PERIOD_FREQS:
+        periods = periods_of(freq)
+        if periods is not None and len(periods) <= MAX_PERIODS:
+            return freq, name, periods
+    return None
+
+
+def trend(df, column, measures):
+    """
+    按时间周期汇总度量，计算环比和同比
+
+    日期列按能容纳在 MAX_PERIODS 以内的最细粒度（日/月/季/年）分组，年份列按年分组；
+    没有数据的周期保留为空值，环比和同比均按相邻/同期周期计算
+
+    Args:
+        df (pd.DataFrame): 清洗后的数据
+        column (str): 日期列或年份列
+        measures (list): 求和的度量列，为空时按行数统计
+
+    Returns:
+        dict: 周期标签及各度量的合计、环比(%)、同比(%)；周期不足两个时返回 None
+    """
+    series = df[column]
+    valid = series.notna()
+    if pd.api.types.is_datetime64_any_dtype(series):
+        dates = series[valid]
+        if dates.empty:
+            return None
+
+        def periods_of(freq):
+            return pd.period_range(dates.min(), dates.max(), freq=freq)
+
+        selected = _period_freq(periods_of)
+        if selected is None:
+            return None
+        freq, freq_name, periods = selected
+        keys = dates.dt.to_period(freq)
+    else:
+        freq, freq_name = "Y", "year"
+        keys = series[valid].astype("int64")
+        periods = pd.RangeIndex(keys.min(), keys.max() + 1)
+        if len(periods) > MAX_PERIODS:
+            return None
+
+    if len(periods) < 2:
+        return None
+
+    if measures:
+        frame = df.loc[valid, measures].astype(np.float64)
+    else:
+        frame = pd.DataFrame(index=keys.index)
+    count = COUNT_LABEL not in frame.columns
+    if count:
+        frame[COUNT_LABEL] = 1
+    # min_count=1：没有数据的周期度量合计为空值，而不是0
+    totals = frame.groupby(keys).sum(min_count=1).reindex(periods)
+    if count:
+        totals[COUNT_LABEL] = totals[COUNT_LABEL].fillna(0)
+
+    result = {
+        "column": column,
+        "freq": freq_name,
+        "periods": [str(period) for period in periods],
+        "series": {},
+    }
+    for col in totals.columns:
+        values = totals[col]
+        entry = {
+            "values": _numbers(values),
+            "change_pct": _pct(values.pct_change(fill_method=None))[1:],
+        }
+        shift = YOY_SHIFTS.get(freq)
+        if freq == "Y":
+            entry["yoy_pct"] = entry.pop("change_pct")
+        elif shift and len(values) > shift:
+            entry["yoy_pct"] = _pct(values / values.shift(shift) - 1)[shift:]
+        result["series"][col] = entry
+    return result
+
+
+def correlations(df, measures):
+    """
+    数值列两两之间的 Pearson 相关系数
+
+    Returns:
+        dict: 列名、相关系数矩阵和 |r| 不低于 STRONG_CORRELATION 的强相关列对；不足两列时返回 None
+    """
+    columns = [
+        col
+        for col in measures[:MAX_CORRELATION_COLUMNS]
+        if df[col].nunique(dropna=True) > 1
+    ]
+    if len(columns) < 2:
+        return None
+    matrix = df[columns].astype(np.float64).corr()
+    values = matrix.to_numpy()
+    strong = []
+    for i, j in zip(*np.triu_indices(len(columns), k=1)):
+        r = values[i, j]
+        if not np.isnan(r) and abs(r) >= STRONG_CORRELATION:
+            strong.append([columns[i], columns[j], round(float(r), 3)])
+    return {
+        "columns": columns,
+        "matrix": [[_number(r, 3) for r in row] for row in values],
+        "strong": sorted(strong, key=lambda item: -abs(item[2])),
+    }
+
+
+def column_profile(series):
+    """单列概况：类型、非空数、唯一值数，以及数值范围、日期范围或高频取值"""
+    profile = {
+        "name": str(series.name),
+        "non_null": int(series.count()),
+        "unique": int(series.nunique(dropna=True)),
+    }
+    if pd.api.types.is_bool_dtype(series):
+        profile["type"] = "bool"
+        profile["true"] = int(series.sum())
+    elif pd.api.types.is_numeric_dtype(series):
+        profile["type"] = "number"
+        if profile["non_null"]:
+            values = series.astype(np.float64)
+            profile.update(
+                {
+                    "min": _number(values.min()),
+                    "max": _number(values.max()),
+                    "mean": _number(values.mean()),
+                    "median": _number(values.median()),
+                    "sum": _number(values.sum()),
+                }
+            )
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        profile["type"] = "date"
+        if profile["non_null"]:
+            profile["min"] = _date_text(series.min())
+            profile["max"] = _date_text(series.max())
+    else:
+        profile["type"] = "text"
+        counts = series.value_counts().head(PROFILE_TOP_VALUES)
+        profile["top"] = [[str(value), int(count)] for value, count in counts.items()]
+    return profile
+
+
+def compute_insights(df, token_budget, top_n=10, max_dimensions=3, max_measures=5):
+    """
+    计算预计算指标，按 分组占比 > 时间趋势 > 相关性 > 各列概况 的优先级放入 token 预算
+
+    Args:
+        df (pd.DataFrame): 清洗后的数据
+        token_budget (int): 指标 JSON 的 token 预算
+        top_n (int): 分组占比保留的分组数
+        max_dimensions (int): 最多使用的分组维度数量
+        max_measures (int): 最多使用的度量数量
+
+    Returns:
+        dict: 指标，没有可计算的指标时为空字典
+    """
+    if df.empty or token_budget <= 0:
+        return {}
+    dimensions, measures, dates, years = select_columns(df, max_dimensions, max_measures)
+
+    candidates = []
+    for dimension in dimensions:
+        candidates.append(
+            ("breakdowns", lambda d=dimension: breakdown(df, d, measures, top_n))
+        )
+    for column in dates + years:
+        candidates.append(("trends", lambda c=column: trend(df, c, measures)))
+    candidates.append(("correlation", lambda: correlations(df, measures)))
+    for col in df.columns:
+        candidates.append(("columns", lambda c=col: column_profile(df[c])))
+
+    insights = {"rows": len(df)}
+    used = estimate_tokens(format_insights(insights))
+    for section, compute in candidates:
+        item = compute()
+        if item is None:
+            continue
+        tokens = estimate_tokens(format_insights(item))
+        if used + tokens > token_budget:
+            # 概况按列依次加入，超出预算后其余列不再加入
+            if section == "columns":
+                break
+            continue
+        if section == "correlation":
+            insights[section] = item
+        else:
+            insights.setdefault(section, []).append(item)
+        used += tokens
+    return insights if len(insights) > 1 else {}
+
+
+def format_insights(insights):
+    """紧凑 JSON，不转义中文"""
+    return json.dumps(insights, ensure_ascii=False, separators=(",", ":"))
+
+
+def append_insights(data_text, insights, sampled_from=None):
+    """
+    将预计算指标附加在数据部分之后
+
+    Args:
+        data_text (str): 数据部分
+        insights (dict): compute_insights 的结果
+        sampled_from (int): 数据经过抽样时的原始行数（可选），说明改为基于抽样数据
+    """
+    if not insights:
+        return data_text
+    label = INSIGHTS_LABEL
+    if sampled_from:
+        label = INSIGHTS_SAMPLED_LABEL.format(rows=insights["rows"], source_rows=sampled_from)
+    return f"{data_text.rstrip()}\n\n{label}\n{format_insights(insights)}\n"
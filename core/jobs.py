@@ -0,0 +1,340 @@
+"""
+分析任务队列
+提交后立即返回任务ID，由后台有限数量的协程执行分析；任务状态持久化在 SQLite 中，
+服务重启后未完成的任务会重新排队。上游繁忙等暂时性错误按指数退避重新排队，
+已结束的任务超过保留时间后定期清理
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# 暂时性错误重试的最大退避时间（秒）
+MAX_RETRY_DELAY = 60
+
+
+class JobQueueFullError(Exception):
+    """排队中的任务已达上限"""
+
+
+class JobStore:
+    """基于 SQLite 的任务存储"""
+
+    def __init__(self, db_path: str):
+        """
+        初始化任务存储
+
+        Args:
+            db_path (str): SQLite 数据库文件路径
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # 队列协程通过 asyncio.to_thread 在其他线程中访问，连接由锁保护
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                params TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)"
+        )
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _query(self, sql: str, params=()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def create(self, params: Dict) -> str:
+        """新建排队中的任务，返回任务ID"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, status, params, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (job_id, STATUS_QUEUED, json.dumps(params, ensure_ascii=False), now, now),
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """查询任务，不存在时返回 None"""
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        job = dict(rows[0])
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def claim(self, job_id: str) -> bool:
+        """将排队中的任务标记为执行中；多个进程共享数据库时只有一个能领取成功"""
+        cursor = self._execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (STATUS_RUNNING, time.time(), job_id, STATUS_QUEUED),
+        )
+        return cursor.rowcount == 1
+
+    def finish(
+        self, job_id: str, result: Optional[Dict] = None, error: Optional[str] = None
+    ) -> None:
+        """记录任务结果"""
+        status = STATUS_FAILED if error is not None else STATUS_DONE
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? "
+            "WHERE id = ?",
+            (
+                status,
+                json.dumps(result, ensure_ascii=False) if result is not None else None,
+                error,
+                time.time(),
+                job_id,
+            ),
+        )
+
+    def requeue(self, job_id: str, message: Optional[str] = None) -> None:
+        """
+        将执行中的任务重新置为排队状态，用于本进程停止、任务被取消或暂时性错误重试时
+
+        Args:
+            job_id (str): 任务ID
+            message (Optional[str]): 查询任务时返回的说明，如重试原因
+        """
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+            "WHERE id = ? AND status = ?",
+            (STATUS_QUEUED, message, time.time(), job_id, STATUS_RUNNING),
+        )
+
+    def recover(self, stale_after: float) -> List[str]:
+        """
+        恢复未完成的任务
+
+        长时间未更新的执行中任务视为进程中断，重新置为排队状态
+
+        Args:
+            stale_after (float): 执行中任务超过该时长（秒）未更新视为中断
+
+        Returns:
+            List[str]: 按提交时间排序的排队中任务ID
+        """
+        self._execute(
+            "UPDATE jobs SET status = ?, updated_at = ? "
+            "WHERE status = ? AND updated_at < ?",
+            (STATUS_QUEUED, time.time(), STATUS_RUNNING, time.time() - stale_after),
+        )
+        rows = self._query(
+            "SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (STATUS_QUEUED,)
+        )
+        return [row["id"] for row in rows]
+
+    def prune(self, max_age: float) -> int:
+        """
+        删除结束超过保留时间的任务
+
+        Args:
+            max_age (float): 已完成或失败的任务保留时间（秒）
+
+        Returns:
+            int: 删除的任务数
+        """
+        cursor = self._execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (STATUS_DONE, STATUS_FAILED, time.time() - max_age),
+        )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class JobQueue:
+    """有限并发的后台任务队列"""
+
+    def __init__(
+        self,
+        store: JobStore,
+        handler: Callable[[Dict], Awaitable[Dict]],
+        concurrency: int,
+        max_queued: int,
+        stale_after: float,
+        retryable: Tuple[Type[BaseException], ...] = (),
+        max_retries: int = 0,
+        retry_backoff: float = 1.0,
+        max_age: float = 0,
+    ):
+        """
+        初始化任务队列
+
+        Args:
+            store (JobStore): 任务存储
+            handler (Callable): 执行任务的协程函数，接收任务参数并返回结果字典
+            concurrency (int): 同时执行的任务数
+            max_queued (int): 本进程最多排队的任务数
+            stale_after (float): 执行中任务超过该时长未更新视为中断
+            retryable (Tuple[Type[BaseException], ...]): 视为暂时性错误、需要退避后重试的异常类型
+            max_retries (int): 单个任务最多重试次数，超过后标记为失败
+            retry_backoff (float): 首次重试的等待时间（秒），之后每次翻倍，不超过 MAX_RETRY_DELAY
+            max_age (float): 已结束任务的保留时间（秒），为0时不清理
+        """
+        self.store = store
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.stale_after = stale_after
+        self.retryable = retryable
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_age = max_age
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # 本进程领取且尚未结束的任务
+        self._running: Set[str] = set()
+        # 任务已重试次数，以及等待退避结束后重新入队的定时器
+        self._attempts: Dict[str, int] = {}
+        self._retry_handles: Dict[str, asyncio.TimerHandle] = {}
+
+    async def start(self) -> None:
+        """启动后台协程，并将未完成的任务重新排队"""
+        self._queue = asyncio.Queue()
+        for job_id in await asyncio.to_thread(self.store.recover, self.stale_after):
+            self._queue.put_nowait(job_id)
+        if self._queue.qsize():
+            logger.info(f"恢复未完成任务 {self._queue.qsize()} 个")
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        """停止后台协程，本进程执行中的任务重新置为排队状态，下次启动时继续执行"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # 等待重试的任务在数据库中已是排队状态，下次启动时恢复
+        for handle in self._retry_handles.values():
+            handle.cancel()
+        self._retry_handles.clear()
+        for job_id in self._running:
+            await asyncio.to_thread(self.store.requeue, job_id)
+        self._running.clear()
+
+    async def submit(self, params: Dict) -> str:
+        """
+        提交任务
+
+        Args:
+            params (Dict): 任务参数
+
+        Returns:
+            str: 任务ID
+        """
+        if self._queue is None:
+            raise RuntimeError("任务队列尚未启动")
+        if self._queue.qsize() >= self.max_queued:
+            raise JobQueueFullError(f"排队任务已达上限 {self.max_queued}，请稍后重试")
+
+        job_id = await asyncio.to_thread(self.store.create, params)
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """查询任务，不存在时返回 None"""
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def run_gc(self, interval: float) -> None:
+        """后台定期删除结束超过保留时间的任务"""
+        if self.max_age <= 0:
+            return
+        while True:
+            try:
+                removed = await asyncio.to_thread(self.store.prune, self.max_age)
+                if removed:
+                    logger.info(f"清理过期任务 {removed} 个")
+            except sqlite3.Error as e:
+                logger.warning(f"任务清理失败: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def _retry_delay(self, attempt: int, error: BaseException) -> float:
+        """第 attempt 次重试前的等待时间；异常带有 retry_after 时不早于该时间"""
+        delay = min(self.retry_backoff * 2 ** (attempt - 1), MAX_RETRY_DELAY)
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            delay = max(delay, min(retry_after, MAX_RETRY_DELAY))
+        return delay
+
+    def _enqueue_later(self, job_id: str, delay: float) -> None:
+        def enqueue():
+            self._retry_handles.pop(job_id, None)
+            self._queue.put_nowait(job_id)
+
+        loop = asyncio.get_running_loop()
+        self._retry_handles[job_id] = loop.call_later(delay, enqueue)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                if not await asyncio.to_thread(self.store.claim, job_id):
+                    continue
+                self._running.add(job_id)
+                job = await asyncio.to_thread(self.store.get, job_id)
+                try:
+                    result = await self.handler(job["params"])
+                except asyncio.CancelledError:
+                    # 服务停止时任务被中断，重新排队以便下次启动时继续执行
+                    await asyncio.to_thread(self.store.requeue, job_id)
+                    raise
+                except self.retryable as e:
+                    attempt = self._attempts.get(job_id, 0) + 1
+                    if attempt > self.max_retries:
+                        logger.error(f"任务 {job_id} 重试 {self.max_retries} 次后仍失败: {str(e)}")
+                        self._attempts.pop(job_id, None)
+                        await asyncio.to_thread(self.store.finish, job_id, error=str(e))
+                    else:
+                        # 上游繁忙等暂时性错误不标记失败，退避后重新排队
+                        delay = self._retry_delay(attempt, e)
+                        logger.warning(
+                            f"任务 {job_id} 暂时无法执行，{delay:g} 秒后第 {attempt} 次重试: {str(e)}"
+                        )
+                        self._attempts[job_id] = attempt
+                        await asyncio.to_thread(
+                            self.store.requeue, job_id, f"{str(e)}，{delay:g} 秒后重试"
+                        )
+                        self._enqueue_later(job_id, delay)
+                except Exception as e:
+                    logger.error(f"任务 {job_id} 执行失败: {str(e)}")
+                    self._attempts.pop(job_id, None)
+                    await asyncio.to_thread(self.store.finish, job_id, error=str(e))
+                else:
+                    self._attempts.pop(job_id, None)
+                    await asyncio.to_thread(self.store.finish, job_id, result=result)
+                self._running.discard(job_id)
+            finally:
+                self._queue.task_done()
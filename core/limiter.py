@@ -0,0 +1,174 @@
+"""
+上游调用限流
+限制同时发往星云接口的请求数（全局与单个用户），并用令牌桶控制请求速率；
+排队请求过多或等待超时时立即拒绝，由接口层返回 503
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from core.metrics import UPSTREAM_ACTIVE, UPSTREAM_REJECTED, UPSTREAM_WAITING
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamBusyError(Exception):
+    """上游调用排队已满、等待超时或被持续限流"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """异步令牌桶"""
+
+    def __init__(self, rate: float, burst: int):
+        """
+        初始化令牌桶
+
+        Args:
+            rate (float): 每秒补充的令牌数
+            burst (int): 令牌桶容量，即允许的突发请求数
+        """
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """取得一个令牌，令牌不足时等待"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class UpstreamLimiter:
+    """全局与单用户并发限制 + 速率限制"""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        per_uid_concurrency: int,
+        max_waiting: int,
+        queue_timeout: float,
+        rate: float = 0,
+        burst: int = 1,
+    ):
+        """
+        初始化限流器
+
+        Args:
+            max_concurrency (int): 全局最大并发请求数
+            per_uid_concurrency (int): 单个用户最大并发请求数，为0时不限制
+            max_waiting (int): 最多排队等待的请求数，超出时立即拒绝
+            queue_timeout (float): 排队等待的最长时间（秒）
+            rate (float): 每秒最多发起的请求数（含重试），为0时不限速
+            burst (int): 速率限制允许的突发请求数
+        """
+        self.max_concurrency = max_concurrency
+        self.per_uid_concurrency = per_uid_concurrency
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self._global: Optional[asyncio.Semaphore] = None
+        self._per_uid: Dict[str, list] = {}
+        self.active = 0
+        self.waiting = 0
+
+    def _uid_semaphore(self, uid: str) -> asyncio.Semaphore:
+        # [信号量, 引用数]，没有请求使用时删除，避免按用户无限增长
+        entry = self._per_uid.setdefault(
+            uid, [asyncio.Semaphore(self.per_uid_concurrency), 0]
+        )
+        entry[1] += 1
+        return entry[0]
+
+    def _release_uid(self, uid: str) -> None:
+        entry = self._per_uid[uid]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._per_uid[uid]
+
+    @asynccontextmanager
+    async def slot(self, uid: Optional[str] = None):
+        """
+        占用一个上游调用名额
+
+        Args:
+            uid (Optional[str]): 用户ID，用于单用户并发限制
+
+        Raises:
+            UpstreamBusyError: 排队已满或等待超时
+        """
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.max_concurrency)
+        if self.waiting >= self.max_waiting:
+            UPSTREAM_REJECTED.inc(reason="queue_full")
+            raise UpstreamBusyError(
+                f"星云接口排队已满（上限 {self.max_waiting}），请稍后重试",
+                retry_after=1,
+            )
+
+        self.waiting += 1
+        UPSTREAM_WAITING.set(self.waiting)
+        use_uid = uid is not None and self.per_uid_concurrency > 0
+        uid_semaphore = self._uid_semaphore(uid) if use_uid else None
+        uid_acquired = global_acquired = False
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                if uid_semaphore is not None:
+                    await uid_semaphore.acquire()
+                    uid_acquired = True
+                await self._global.acquire()
+                global_acquired = True
+        except BaseException as e:
+            self._release(uid, uid_semaphore, uid_acquired, global_acquired)
+            if isinstance(e, TimeoutError):
+                UPSTREAM_REJECTED.inc(reason="timeout")
+                raise UpstreamBusyError(
+                    f"等待星云接口超时（{self.queue_timeout}秒），请稍后重试",
+                    retry_after=self.queue_timeout,
+                )
+            raise
+        finally:
+            self.waiting -= 1
+            UPSTREAM_WAITING.set(self.waiting)
+
+        self.active += 1
+        UPSTREAM_ACTIVE.set(self.active)
+        try:
+            yield
+        finally:
+            self.active -= 1
+            UPSTREAM_ACTIVE.set(self.active)
+            self._release(uid, uid_semaphore, True, True)
+
+    def _release(self, uid, uid_semaphore, uid_acquired, global_acquired) -> None:
+        if global_acquired:
+            self._global.release()
+        if uid_semaphore is not None:
+            if uid_acquired:
+                uid_semaphore.release()
+            self._release_uid(uid)
+
+    async def throttle(self) -> None:
+        """发起每次请求（含重试）前调用，按速率限制等待"""
+        if self.bucket is not None:
+            await self.bucket.acquire()
+
+    def stats(self) -> Dict:
+        """返回当前并发与排队数"""
+        return {"active": self.active, "waiting": self.waiting}
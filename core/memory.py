@@ -0,0 +1,212 @@
+"""
+解析内存控制
+- 整数列无损向下转换（int64 -> int8/16/32）；浮点列保持 float64，避免求和、均值等聚合在 float32 下累积误差
+- 低基数文本列转换为 category
+- 可选将 object 文本列转换为 Arrow 字符串类型
+- 单次请求的 DataFrame 内存上限：解析前按工作表行列数预估，超出时拒绝或按间隔抽取行；
+  解析后再按实际占用检查一次，超出时拒绝或随机抽样
+"""
+
+import math
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:  # pyarrow 为可选依赖
+    pyarrow = None
+
+POLICY_REJECT = "reject"
+POLICY_SAMPLE = "sample"
+
+# 行数过少时转换为 category 收益不大
+CATEGORY_MIN_ROWS = 1000
+
+# 解析前预估内存时每个单元格的字节数，与解析得到的 DataFrame 的深度内存占用相当（实测约 34 字节）
+ESTIMATED_CELL_BYTES = 40
+
+
+class IngestTooLargeError(Exception):
+    """解析后的数据超过单次请求的内存上限"""
+
+
+def frame_memory_bytes(df):
+    """DataFrame 占用的内存（含字符串对象）"""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+class ParseLimit:
+    """
+    解析前的内存上限检查
+
+    读取引擎在取得工作表行列数之后、创建 Python 对象之前调用 row_step，
+    超出上限时拒绝，或只保留表头区域和之后每隔若干行中的一行，避免解析过程中的内存峰值超限
+    """
+
+    def __init__(self, max_bytes, policy=POLICY_SAMPLE, keep_rows=0):
+        """
+        Args:
+            max_bytes (int): 内存上限（字节），为0时不限制
+            policy (str): 超出时的处理方式，reject 拒绝，sample 按间隔抽取行
+            keep_rows (int): 始终保留的开头行数（表头识别区域）
+        """
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.keep_rows = keep_rows
+        # 发生抽样时记录工作表的行数（含表头），以及由 read_data_file 换算的数据行数
+        self.sheet_rows = None
+        self.sampled_from = None
+
+    def exceeds(self, rows, columns):
+        """按行列数预估的内存是否超出上限"""
+        return self.max_bytes > 0 and rows * columns * ESTIMATED_CELL_BYTES > self.max_bytes
+
+    def _describe(self, rows, columns):
+        estimated_mb = rows * columns * ESTIMATED_CELL_BYTES / 1024 / 1024
+        return (
+            f"工作表共 {rows} 行 x {columns} 列，预计解析后占用 {estimated_mb:.1f} MB，"
+            f"超过{'单次请求' if self.policy == POLICY_REJECT else ''}上限 "
+            f"{self.max_bytes / 1024 / 1024:.1f} MB"
+        )
+
+    def reject_if_needed(self, rows, columns):
+        """处理方式为 reject 时抛出 IngestTooLargeError"""
+        if self.policy == POLICY_REJECT:
+            raise IngestTooLargeError(self._describe(rows, columns))
+
+    def record_sampling(self, rows, columns, step):
+        """记录发生了抽样"""
+        self.sheet_rows = rows
+        print(f"{self._describe(rows, columns)}，每 {step} 行抽取 1 行")
+
+    def row_step(self, rows, columns):
+        """
+        根据工作表行列数决定抽取行的间隔
+
+        Args:
+            rows (int): 工作表行数（含表头）
+            columns (int): 工作表列数
+
+        Returns:
+            int: 抽取间隔，1 表示读取全部行
+
+        Raises:
+            IngestTooLargeError: 超出上限且处理方式为 reject
+        """
+        if not self.exceeds(rows, columns):
+            return 1
+        self.reject_if_needed(rows, columns)
+        step = math.ceil(rows * columns * ESTIMATED_CELL_BYTES / self.max_bytes)
+        self.record_sampling(rows, columns, step)
+        return step
+
+    def keeps(self, index, step):
+        """第 index 行（从0开始）是否保留"""
+        return index < self.keep_rows or (index - self.keep_rows) % step == 0
+
+
+def enforce_memory_limit(df, max_bytes, policy=POLICY_SAMPLE, seed=0):
+    """
+    检查单次请求的数据内存上限
+
+    解析前已由 ParseLimit 按行列数预估并控制，这里按解析结果的实际占用再检查一次
+
+    Args:
+        df (pd.DataFrame): 读取得到的数据
+        max_bytes (int): 内存上限（字节），为0时不限制
+        policy (str): 超出时的处理方式，reject 拒绝，sample 按比例随机抽样
+        seed (int): 抽样随机种子，保证同一文件结果一致
+
+    Returns:
+        tuple: (数据, 抽样前行数；未抽样时为 None)
+
+    Raises:
+        IngestTooLargeError: 超出上限且处理方式为 reject
+    """
+    if max_bytes <= 0:
+        return df, None
+    usage = frame_memory_bytes(df)
+    if usage <= max_bytes:
+        return df, None
+
+    usage_mb = usage / 1024 / 1024
+    limit_mb = max_bytes / 1024 / 1024
+    if policy == POLICY_REJECT:
+        raise IngestTooLargeError(
+            f"数据解析后占用 {usage_mb:.1f} MB，超过单次请求上限 {limit_mb:.1f} MB"
+        )
+
+    n_rows = max(int(len(df) * max_bytes / usage), 1)
+    print(f"数据解析后占用 {usage_mb:.1f} MB，超过上限 {limit_mb:.1f} MB，随机抽样 {n_rows} 行")
+    return df.sample(n=n_rows, random_state=seed).sort_index(), len(df)
+
+
+def downcast_numeric(df):
+    """
+    整数列无损向下转换为能容纳取值范围的最小整数类型，原地修改并返回
+
+    浮点列不转换：即使每个值都能被 float32 精确表示，后续的求和、均值和分组汇总
+    也会在 float32 下计算并累积误差
+    """
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast="integer")
+    return df
+
+
+def categorize_strings(df, max_ratio):
+    """
+    将唯一值占比不超过 max_ratio 的文本列转换为 category，原地修改并返回
+
+    Args:
+        df (pd.DataFrame): 数据
+        max_ratio (float): 唯一值数量 / 非空行数 的上限，为0时不转换
+    """
+    if max_ratio <= 0 or len(df) < CATEGORY_MIN_ROWS:
+        return df
+    for col in df.columns:
+        series = df[col]
+        if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+            continue
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        # 混合类型的列保持原样，避免类别中出现不可比较的取值
+        if pd.api.types.infer_dtype(series, skipna=True) != "string":
+            continue
+        non_null = series.count()
+        if non_null and series.nunique(dropna=True) <= max_ratio * non_null:
+            df[col] = series.astype("category")
+    return df
+
+
+def to_arrow_strings(df):
+    """将 object 类型的纯文本列转换为 Arrow 字符串类型，原地修改并返回；未安装 pyarrow 时不处理"""
+    if pyarrow is None:
+        return df
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) == "string":
+            df[col] = series.astype("string[pyarrow]")
+    return df
+
+
+def optimize_dtypes(df, category_max_ratio, arrow_strings=False):
+    """
+    降低清洗后数据的内存占用，原地修改并返回
+
+    Args:
+        df (pd.DataFrame): 清洗后的数据
+        category_max_ratio (float): 文本列转换为 category 的唯一值占比上限
+        arrow_strings (bool): 是否将其余 object 文本列转换为 Arrow 字符串类型
+
+    Returns:
+        pd.DataFrame: 优化后的数据
+    """
+    downcast_numeric(df)
+    categorize_strings(df, category_max_ratio)
+    if arrow_strings:
+        to_arrow_strings(df)
+    return df
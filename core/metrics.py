@@ -0,0 +1,286 @@
+"""
+性能指标
+提供计数器、直方图和阶段耗时统计，以 Prometheus 文本格式导出，
+并可将单次请求各阶段耗时写入 Server-Timing 响应头
+
+指标按进程统计，多进程部署时需由采集端按实例汇总
+"""
+
+import asyncio
+import bisect
+import contextvars
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 默认耗时分桶（秒），覆盖从毫秒级解析到数分钟的大模型调用
+DEFAULT_TIME_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600
+)
+SIZE_BUCKETS = tuple(10**i for i in range(2, 10))
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    """可设置任意值的仪表"""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_TIME_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各分桶计数, 总和, 总数]
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """导出 Prometheus 文本格式"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.register(
+    Counter("http_requests_total", "HTTP请求数", ["route", "method", "status"])
+)
+HTTP_LATENCY = registry.register(
+    Histogram("http_request_duration_seconds", "HTTP请求耗时", ["route"])
+)
+HTTP_BYTES_IN = registry.register(
+    Counter("http_request_bytes_total", "HTTP请求体字节数", ["route"])
+)
+HTTP_BYTES_OUT = registry.register(
+    Counter("http_response_bytes_total", "非流式HTTP响应体字节数", ["route"])
+)
+STAGE_LATENCY = registry.register(
+    Histogram("analysis_stage_duration_seconds", "分析流程各阶段耗时", ["stage"])
+)
+CLEAN_COLUMN_LATENCY = registry.register(
+    Histogram(
+        "clean_column_duration_seconds",
+        "单列数据清洗耗时",
+        buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    )
+)
+DOWNLOAD_BYTES = registry.register(
+    Histogram("download_bytes", "按URL下载的文件大小", buckets=SIZE_BUCKETS)
+)
+INPUT_ROWS = registry.register(
+    Histogram("input_rows", "清洗后的数据行数", buckets=SIZE_BUCKETS)
+)
+INPUT_COLUMNS = registry.register(
+    Histogram("input_columns", "清洗后的数据列数", buckets=(5, 10, 20, 50, 100, 200, 500))
+)
+PROMPT_TOKENS = registry.register(
+    Histogram("prompt_tokens", "估算的提示词token数", buckets=SIZE_BUCKETS)
+)
+REPORT_BYTES = registry.register(
+    Histogram("report_bytes", "生成的报告大小", buckets=SIZE_BUCKETS)
+)
+LLM_TOKENS = registry.register(
+    Counter("llm_tokens_total", "星云接口返回的token用量", ["type"])
+)
+UPSTREAM_ACTIVE = registry.register(Gauge("upstream_active_requests", "进行中的星云接口请求数"))
+UPSTREAM_WAITING = registry.register(Gauge("upstream_waiting_requests", "排队等待的星云接口请求数"))
+UPSTREAM_REJECTED = registry.register(
+    Counter("upstream_rejected_total", "因排队已满或等待超时被拒绝的星云接口请求数", ["reason"])
+)
+UPSTREAM_RETRIES = registry.register(
+    Counter("upstream_retries_total", "星云接口请求重试次数", ["reason"])
+)
+COALESCED_REQUESTS = registry.register(
+    Counter("coalesced_requests_total", "合并到进行中相同请求的请求数", ["name"])
+)
+FRAME_CACHE_REQUESTS = registry.register(
+    Counter("frame_cache_requests_total", "解析结果缓存查询次数", ["result"])
+)
+ANALYSIS_MODE = registry.register(
+    Counter("analysis_mode_total", "按全量/增量/模板模式统计的分析次数", ["mode"])
+)
+EVENT_LOOP_LAG = registry.register(
+    Histogram(
+        "event_loop_lag_seconds",
+        "事件循环调度延迟",
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    )
+)
+PROCESS_RSS = registry.register(Gauge("process_resident_memory_bytes", "进程常驻内存"))
+REPORT_CACHE_EVENTS = registry.register(
+    Gauge("report_cache_events", "报告缓存命中统计（进程累计）", ["result"])
+)
+REPORT_STORE_FILES = registry.register(Gauge("report_store_files", "报告存储中的报告数"))
+REPORT_STORE_BYTES = registry.register(Gauge("report_store_bytes", "报告存储占用的磁盘空间（含压缩副本）"))
+REPORT_GC_REMOVED = registry.register(
+    Counter("report_gc_removed_total", "后台清理删除的报告数", ["reason"])
+)
+
+
+def current_rss_bytes() -> int:
+    """读取当前进程常驻内存；非 Linux 平台退化为历史峰值"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def monitor_event_loop(interval: float = 0.5) -> None:
+    """周期性测量事件循环的调度延迟，需作为后台任务运行"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(loop.time() - started - interval, 0.0))
+
+
+# 当前请求的阶段耗时，用于生成 Server-Timing 响应头
+_request_spans: contextvars.ContextVar[Optional[List]] = contextvars.ContextVar(
+    "request_spans", default=None
+)
+
+
+def start_request_spans() -> None:
+    """在请求开始时调用，开启当前请求的阶段耗时记录"""
+    _request_spans.set([])
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """记录一个阶段的耗时"""
+    STAGE_LATENCY.observe(seconds, stage=stage)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+@contextmanager
+def timed_stage(stage: str):
+    """统计代码块耗时的上下文管理器"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def server_timing_header() -> Optional[str]:
+    """生成当前请求的 Server-Timing 响应头，无记录时返回 None"""
+    spans = _request_spans.get()
+    if not spans:
+        return None
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in spans)
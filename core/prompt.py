@@ -4,7 +4,7 @@ DEFAULT_ANALYSIS_PROMPT = """## 任务
 2. 自动推荐多种适合用来可视化本次数据的图表类型，并简要说明推荐理由；
 3. 基于数据内容和结构，循序渐进地生成多种图表类型进行分析展示：
    * 初级图表：直接展示原始数据，如柱状图、折线图等；
-   * 中级图表：基于数据进行合理的二次计算（如占比、同比、增幅等），并用堆叠图、面积图、条形图等形式展现；
+   * 中级图表：基于数据进行合理的二次计算（如占比、同比、增幅等），并用堆叠图、面积图、条形图等形式展现；数据之后附有本地预计算指标时，直接使用其中的数值，不要重新计算；
    * 高级图表：体现宏观结构或综合分析，例如雷达图、热力图、环形图等；
 4. 所有二次计算得到的数据，必须在图表说明中高亮指出，并简要解释其计算逻辑；
 5. 如遇表头不清、数据有歧义，请合理假设，并在结果中明确提示。如需要额外业务背景信息才能判断，请直接提示用户补充。
@@ -26,3 +26,18 @@ DEFAULT_ANALYSIS_PROMPT = """## 任务
 ## 输出格式
 将上述所有内容整合为一个 HTML 网页输出，所有图表都必须用代码生成，不得使用图片。
 """
+
+NARRATIVE_PROMPT = """## 任务
+你是一个面向公司资金财务人员的智能数据分析助手。报告的页面、图表和数据表格已由程序根据数据自动生成，
+你只需撰写报告中的文字解读：
+1. 概括数据的主要内容，识别主要的变量、指标和数据维度；
+2. 结合预计算指标总结关键发现，涉及占比、环比、同比、相关系数、排名等数值时直接引用，不要重新计算，关键数值用 **加粗** 标出；
+3. 为下方列出的每个图表写一到两句解读，说明图表反映的情况；
+4. 如遇表头不清、数据有歧义，请合理假设并在建议中明确提示；如需要额外业务背景信息才能判断，请提示用户补充。
+## 场景说明
+* 不预设数据场景，既可能是财务数据，也可能是运营、销售、市场等其他场景
+* 所有分析均必须基于表格中已有数字进行，不得擅自引入外部信息
+## 输出格式
+只输出一个JSON对象，不要输出HTML、代码块标记或其他内容，格式如下：
+{"title": "报告标题", "summary": "数据概要（2-4句）", "findings": ["关键发现", ...], "charts": {"图表ID": "图表解读", ...}, "suggestions": ["建议或需要用户补充的信息", ...]}
+"""
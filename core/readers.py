@@ -0,0 +1,296 @@
+"""
+Excel读取引擎
+根据文件类型和大小选择最快的可用引擎：
+- calamine：Rust实现，速度最快，同时支持 .xlsx 和 .xls（需安装 python-calamine）
+- openpyxl_stream：openpyxl 只读 + values_only 流式读取，内存峰值可控
+- openpyxl：pandas 默认的 openpyxl 读取方式
+- xlrd：读取旧版 .xls 文件
+"""
+
+import datetime
+import importlib.util
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ENGINE_AUTO = "auto"
+ENGINE_CALAMINE = "calamine"
+ENGINE_OPENPYXL = "openpyxl"
+ENGINE_OPENPYXL_STREAM = "openpyxl_stream"
+ENGINE_XLRD = "xlrd"
+
+ENGINES = [ENGINE_CALAMINE, ENGINE_OPENPYXL, ENGINE_OPENPYXL_STREAM, ENGINE_XLRD]
+
+# 各引擎依赖的模块
+ENGINE_MODULES = {
+    ENGINE_CALAMINE: "python_calamine",
+    ENGINE_OPENPYXL: "openpyxl",
+    ENGINE_OPENPYXL_STREAM: "openpyxl",
+    ENGINE_XLRD: "xlrd",
+}
+
+# 各引擎支持的文件类型
+ENGINE_EXTENSIONS = {
+    ENGINE_CALAMINE: {".xlsx", ".xls"},
+    ENGINE_OPENPYXL: {".xlsx"},
+    ENGINE_OPENPYXL_STREAM: {".xlsx"},
+    ENGINE_XLRD: {".xls"},
+}
+
+
+def engine_available(engine):
+    """判断引擎依赖是否已安装"""
+    return importlib.util.find_spec(ENGINE_MODULES[engine]) is not None
+
+
+def available_engines(file_extension):
+    """返回支持该文件类型且已安装的引擎列表"""
+    return [
+        engine
+        for engine in ENGINES
+        if file_extension in ENGINE_EXTENSIONS[engine] and engine_available(engine)
+    ]
+
+
+def select_engine(file_extension, file_size, preferred=ENGINE_AUTO, stream_threshold=0):
+    """
+    选择读取引擎
+
+    Args:
+        file_extension (str): 文件扩展名，如 .xlsx
+        file_size (int): 文件大小（字节）
+        preferred (str): 指定引擎，auto 表示自动选择
+        stream_threshold (int): 无 calamine 时，超过该大小的 .xlsx 使用流式读取
+
+    Returns:
+        str: 引擎名称
+    """
+    if preferred != ENGINE_AUTO:
+        if preferred not in ENGINES:
+            raise ValueError(f"未知的读取引擎: {preferred}")
+        if file_extension not in ENGINE_EXTENSIONS[preferred]:
+            raise ValueError(f"引擎 {preferred} 不支持 {file_extension} 文件")
+        return preferred
+
+    if engine_available(ENGINE_CALAMINE):
+        return ENGINE_CALAMINE
+    if file_extension == ".xls":
+        return ENGINE_XLRD
+    if file_size >= stream_threshold:
+        return ENGINE_OPENPYXL_STREAM
+    return ENGINE_OPENPYXL
+
+
+def _sampled_rows(rows, limit, step):
+    """按 limit 保留开头的表头区域，之后每 step 行保留一行"""
+    if step == 1:
+        return rows
+    return (row for index, row in enumerate(rows) if limit.keeps(index, step))
+
+
+def _openpyxl_worksheet(workbook, sheet_name):
+    if isinstance(sheet_name, int):
+        return workbook.worksheets[sheet_name]
+    return workbook[sheet_name]
+
+
+def _openpyxl_dimensions(worksheet):
+    """工作表 dimension 记录的行列数，文件未记录时为 None"""
+    if not worksheet.max_row or not worksheet.max_column:
+        return None
+    return worksheet.max_row, worksheet.max_column
+
+
+def _bounded_rows(rows, limit):
+    """
+    无法预先获取行列数时边读取边检查内存上限：超出时拒绝，
+    或将抽取间隔加倍并丢弃已读取数据行中的一半，内存占用始终不超过上限
+    """
+    head, body, step = [], [], 1
+    total = columns = 0
+    for index, row in enumerate(rows):
+        total = index + 1
+        columns = max(columns, len(row))
+        if index < limit.keep_rows:
+            head.append(row)
+            continue
+        if (index - limit.keep_rows) % step:
+            continue
+        body.append(row)
+        if limit.exceeds(len(head) + len(body), columns):
+            limit.reject_if_needed(total, columns)
+            step *= 2
+            body = body[::2]
+    if step > 1:
+        limit.record_sampling(total, columns, step)
+    return head + body
+
+
+def _read_openpyxl_stream(source, sheet_name=0, limit=None):
+    """
+    使用 openpyxl 只读模式逐行读取工作表的原始单元格，不把首行作为表头；
+    传入 limit（core.memory.ParseLimit）时先按工作表行列数检查内存上限
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        worksheet = _openpyxl_worksheet(workbook, sheet_name)
+        rows = worksheet.iter_rows(values_only=True)
+        if limit is not None:
+            dimensions = _openpyxl_dimensions(worksheet)
+            if dimensions is None:
+                rows = _bounded_rows(rows, limit)
+            else:
+                rows = _sampled_rows(rows, limit, limit.row_step(*dimensions))
+        df = pd.DataFrame.from_records(list(rows))
+    finally:
+        workbook.close()
+
+    # 只读模式下尾部格式化过的空行也会被读出，与 pandas 一致将其去掉
+    non_empty = df.notna().any(axis=1).to_numpy().nonzero()[0]
+    last_row = non_empty[-1] + 1 if len(non_empty) else 0
+    return df.iloc[:last_row]
+
+
+_cell_type = np.frompyfunc(type, 1, 1)
+
+
+def _convert_calamine_cells(grid):
+    """
+    与 pandas 的 calamine 读取方式一致：整数值的浮点数转为 int，日期转为 datetime，空字符串转为 None
+
+    按单元格类型整体筛选后批量转换，只对需要转换的单元格创建新对象
+
+    Args:
+        grid (np.ndarray): 二维 object 数组，原地修改
+    """
+    cells = grid.reshape(-1)
+    types = _cell_type(cells)
+
+    floats = np.flatnonzero(types == float)
+    if len(floats):
+        values = cells[floats].astype(np.float64)
+        integral = np.isfinite(values) & (values == np.trunc(values))
+        # 超出 int64 范围的整数值较少见，逐个转换
+        small = integral & (np.abs(values) < 2**63)
+        large = integral & ~small
+        cells[floats[small]] = values[small].astype(np.int64).tolist()
+        cells[floats[large]] = [int(value) for value in values[large]]
+
+    dates = np.flatnonzero(types == datetime.date)
+    if len(dates):
+        cells[dates] = np.fromiter(
+            map(datetime.datetime.fromordinal, map(datetime.date.toordinal, cells[dates])),
+            dtype=object,
+            count=len(dates),
+        )
+
+    strings = np.flatnonzero(types == str)
+    cells[strings[cells[strings] == ""]] = None
+
+
+def _read_calamine_raw(source, sheet_name=0, limit=None):
+    """
+    使用 calamine 读取工作表的全部单元格及合并单元格区域，工作表只解析一次；
+    传入 limit 时在创建 Python 对象之前按工作表行列数检查内存上限
+    """
+    from python_calamine import CalamineWorkbook
+
+    workbook = CalamineWorkbook.from_object(source)
+    try:
+        if isinstance(sheet_name, int):
+            worksheet = workbook.get_sheet_by_index(sheet_name)
+        else:
+            worksheet = workbook.get_sheet_by_name(sheet_name)
+        merged = worksheet.merged_cell_ranges
+        step = 1
+        if limit is not None and worksheet.end is not None:
+            # 与 skip_empty_area=False 一致，从 A1 起算行列数
+            step = limit.row_step(worksheet.end[0] + 1, worksheet.end[1] + 1)
+        if step == 1:
+            rows = worksheet.to_python(skip_empty_area=False)
+        else:
+            # iter_rows 从第一行开始，但不含数据区域左侧的空列，补齐后与 to_python 对齐
+            padding = [""] * worksheet.start[1]
+            rows = [
+                padding + row
+                for row in _sampled_rows(worksheet.iter_rows(), limit, step)
+            ]
+    finally:
+        workbook.close()
+
+    if not rows:
+        return pd.DataFrame(), list(merged or [])
+    grid = np.array(rows, dtype=object)
+    _convert_calamine_cells(grid)
+    return pd.DataFrame(grid).infer_objects(), list(merged or [])
+
+
+def read_sheet_raw(source, engine, sheet_name=0, limit=None):
+    """
+    读取工作表的原始单元格，不指定表头行，供表头识别使用
+
+    传入 limit（core.memory.ParseLimit）时，在解析单元格之前按工作表行列数预估内存，
+    超出上限时拒绝或按间隔抽取行；xlrd 引擎无法预先获取行列数，不做预估
+
+    Args:
+        source: 文件路径或文件对象
+        engine (str): 引擎名称
+        sheet_name (int | str): 工作表序号或名称
+        limit (ParseLimit): 解析前的内存上限检查（可选）
+
+    Returns:
+        tuple: (列名为序号、所有列为 object 类型的 DataFrame,
+            合并单元格区域列表 [((首行, 首列), (末行, 末列)), ...]；引擎无法提供时为 None)
+    """
+    if engine == ENGINE_CALAMINE:
+        return _read_calamine_raw(source, sheet_name, limit)
+    if engine == ENGINE_OPENPYXL_STREAM:
+        return _read_openpyxl_stream(source, sheet_name, limit), None
+
+    skiprows = None
+    if engine == ENGINE_OPENPYXL and limit is not None:
+        from openpyxl import load_workbook
+
+        # 只读模式只解析工作簿目录和 dimension，不读取单元格
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            dimensions = _openpyxl_dimensions(_openpyxl_worksheet(workbook, sheet_name))
+        finally:
+            workbook.close()
+        if hasattr(source, "seek"):
+            source.seek(0)
+        if dimensions is None:
+            # 未记录 dimension 时改为流式读取，边读取边检查
+            return _read_openpyxl_stream(source, sheet_name, limit), None
+        step = limit.row_step(*dimensions)
+        if step > 1:
+
+            def skiprows(index):
+                return not limit.keeps(index, step)
+
+    df = pd.read_excel(
+        source, engine=engine, sheet_name=sheet_name, header=None, skiprows=skiprows
+    )
+    return df.astype(object), None
+
+
+def sheet_names(source, engine):
+    """
+    列出工作簿中的工作表名称，不解析工作表内容
+
+    Args:
+        source: 文件路径或文件对象
+        engine (str): 引擎名称
+
+    Returns:
+        List[str]: 工作表名称
+    """
+    if engine == ENGINE_OPENPYXL_STREAM:
+        engine = ENGINE_OPENPYXL
+    with pd.ExcelFile(source, engine=engine) as workbook:
+        return [str(name) for name in workbook.sheet_names]
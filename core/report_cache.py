@@ -0,0 +1,165 @@
+"""
+报告缓存
+按 清洗后数据 + 分析提示词 + 用户问题 的内容哈希缓存已生成的HTML报告，
+相同的分析请求直接复用结果，不再调用大模型
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 未超出大小上限时，至少间隔该时间（秒）扫描一次缓存目录以清理过期条目
+EVICT_INTERVAL = 600
+
+
+class ReportCache:
+    """基于内容哈希的HTML报告缓存，支持按总大小和存活时间淘汰"""
+
+    def __init__(self, cache_dir: str, max_bytes: int, max_age: float):
+        """
+        初始化报告缓存
+
+        Args:
+            cache_dir (str): 缓存目录
+            max_bytes (int): 缓存总大小上限（字节），超出时按最近访问时间淘汰
+            max_age (float): 缓存条目最长存活时间（秒）
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        # 缓存目录的估算总大小，首次写入时扫描目录得到，之后随写入累加，淘汰时重新校准
+        self._total_bytes: Optional[int] = None
+        self._last_evict = 0.0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(
+        data_text: str, analysis_prompt: str, user_content: Optional[str] = None
+    ) -> str:
+        """
+        计算缓存键
+
+        Args:
+            data_text (str): 发送给大模型的数据内容（CSV或数据摘要）
+            analysis_prompt (str): 实际使用的分析提示词
+            user_content (Optional[str]): 用户问题
+
+        Returns:
+            str: sha256 十六进制摘要
+        """
+        digest = hashlib.sha256()
+        for part in (data_text, analysis_prompt, user_content or ""):
+            encoded = part.encode("utf-8")
+            # 写入长度前缀，避免不同字段拼接后产生相同的字节序列
+            digest.update(len(encoded).to_bytes(8, "big"))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.html")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        查找缓存
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            Optional[str]: 命中时返回缓存文件路径，否则返回 None
+        """
+        path = self._entry_path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        now = time.time()
+        if now - stat.st_mtime > self.max_age:
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        # mtime 记录写入时间用于过期判断，atime 记录最近访问时间用于淘汰
+        os.utime(path, (now, stat.st_mtime))
+        self.hits += 1
+        return path
+
+    def put(self, key: str, report_path: str) -> None:
+        """
+        将已生成的报告写入缓存
+
+        只有估算总大小超限或距上次扫描超过 EVICT_INTERVAL 时才扫描目录淘汰，
+        避免每次写入都遍历整个缓存目录
+
+        Args:
+            key (str): 缓存键
+            report_path (str): 报告文件路径
+        """
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            shutil.copyfile(report_path, tmp_path)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"写入报告缓存失败: {str(e)}")
+            self._remove(tmp_path)
+            return
+
+        if self._total_bytes is not None:
+            self._total_bytes += size
+        if (
+            self._total_bytes is None
+            or self._total_bytes > self.max_bytes
+            or time.time() - self._last_evict > EVICT_INTERVAL
+        ):
+            self.evict()
+
+    def evict(self) -> None:
+        """删除过期条目，并在总大小超限时按最近访问时间从旧到新淘汰"""
+        now = time.time()
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".html"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    self._remove(entry.path)
+                    continue
+                entries.append((stat.st_atime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+        self._total_bytes = total
+        self._last_evict = now
+
+    def stats(self) -> Dict:
+        """返回缓存命中统计"""
+        return {"hits": self.hits, "misses": self.misses}
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,437 @@
+"""
+模板报告渲染
+根据本地预计算指标生成 ECharts 图表配置和数据表格，大模型只需输出 JSON 格式的文字解读，
+再套用 HTML 模板组装成完整报告，避免模型逐 token 输出页面样式、脚本和图表代码
+"""
+
+import html
+import json
+import logging
+import os
+import re
+from string import Template
+
+from core.insights import COUNT_LABEL
+
+logger = logging.getLogger(__name__)
+
+REPORT_MODE_LLM = "llm"
+REPORT_MODE_TEMPLATE = "template"
+REPORT_MODES = [REPORT_MODE_LLM, REPORT_MODE_TEMPLATE]
+
+DEFAULT_TITLE = "数据分析报告"
+
+TEMPLATE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "templates", "report.html"
+)
+
+with open(TEMPLATE_PATH, "r", encoding="utf-8") as f:
+    REPORT_TEMPLATE = Template(f.read())
+
+# 趋势图最多绘制的度量数
+TREND_MAX_SERIES = 3
+
+# 分组数超过该值时横轴标签倾斜显示
+ROTATE_LABELS_OVER = 6
+
+FREQ_LABELS = {"day": "日", "month": "月", "quarter": "季度", "year": "年"}
+
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+
+
+def _pad(values, length):
+    """在前面补空值，使环比/同比序列与周期标签对齐"""
+    return [None] * (length - len(values)) + list(values)
+
+
+def _category_axis(labels):
+    axis = {"type": "category", "data": labels}
+    if len(labels) > ROTATE_LABELS_OVER:
+        axis["axisLabel"] = {"interval": 0, "rotate": 30}
+    return axis
+
+
+def _chart(next_id, title, option):
+    return {"id": next_id(), "title": title, "option": option}
+
+
+def _base_option():
+    return {
+        "tooltip": {"trigger": "axis"},
+        "grid": {"left": 16, "right": 24, "top": 40, "bottom": 16, "containLabel": True},
+    }
+
+
+def _breakdown_charts(item, next_id):
+    """分组汇总：主度量柱状图，以及可计算占比时的环形图"""
+    dimension = item["dimension"]
+    measure = item["sort_by"]
+    entry = item["series"][measure]
+    charts = []
+
+    option = _base_option()
+    option.update(
+        {
+            "xAxis": _category_axis(item["labels"]),
+            "yAxis": {"type": "value"},
+            "series": [
+                {
+                    "name": measure,
+                    "type": "bar",
+                    "data": entry["values"],
+                    "label": {
+                        "show": len(item["labels"]) <= ROTATE_LABELS_OVER,
+                        "position": "top",
+                    },
+                }
+            ],
+        }
+    )
+    charts.append(_chart(next_id, f"{measure}（按{dimension}）", option))
+
+    if "share_pct" in entry:
+        data = [
+            {"name": label, "value": value}
+            for label, value in zip(item["labels"], entry["values"])
+        ]
+        option = {
+            "tooltip": {"trigger": "item", "formatter": "{b}: {c} ({d}%)"},
+            "legend": {"type": "scroll", "bottom": 0},
+            "series": [
+                {
+                    "name": measure,
+                    "type": "pie",
+                    "radius": ["40%", "68%"],
+                    "center": ["50%", "45%"],
+                    "data": data,
+                    "label": {"formatter": "{b}\n{d}%"},
+                }
+            ],
+        }
+        charts.append(_chart(next_id, f"{measure}占比（按{dimension}）", option))
+    return charts
+
+
+def _breakdown_table(item):
+    columns = [item["dimension"]]
+    for name, entry in item["series"].items():
+        columns.append(name)
+        if "share_pct" in entry:
+            columns.append(f"{name}占比(%)")
+
+    rows = []
+    for index, label in enumerate(item["labels"]):
+        row = [label]
+        for entry in item["series"].values():
+            row.append(entry["values"][index])
+            if "share_pct" in entry:
+                row.append(entry["share_pct"][index])
+        rows.append(row)
+
+    title = f"按「{item['dimension']}」分组汇总"
+    if item["groups"] > len(item["labels"]):
+        title += f"（共 {item['groups']} 组，其余合并为「其他」）"
+    return {"title": title, "columns": columns, "rows": rows}
+
+
+def _trend_charts(item, next_id):
+    """时间趋势：度量折线图，以及主度量的环比/同比柱状图"""
+    periods = item["periods"]
+    freq = FREQ_LABELS.get(item["freq"], item["freq"])
+    names = [name for name in item["series"] if name != COUNT_LABEL] or [COUNT_LABEL]
+    names = names[:TREND_MAX_SERIES]
+    charts = []
+
+    option = _base_option()
+    option.update(
+        {
+            "legend": {"top": 0},
+            "xAxis": _category_axis(periods),
+            "yAxis": {"type": "value"},
+            "series": [
+                {
+                    "name": name,
+                    "type": "line",
+                    "smooth": True,
+                    "data": item["series"][name]["values"],
+                }
+                for name in names
+            ],
+        }
+    )
+    title = f"{'、'.join(names)}趋势（按{freq}，{item['column']}）"
+    charts.append(_chart(next_id, title, option))
+
+    primary = item["series"][names[0]]
+    changes = [
+        (label, primary[key])
+        for key, label in (("change_pct", "环比"), ("yoy_pct", "同比"))
+        if primary.get(key)
+    ]
+    if changes:
+        option = _base_option()
+        option.update(
+            {
+                "legend": {"top": 0},
+                "xAxis": _category_axis(periods),
+                "yAxis": {"type": "value", "axisLabel": {"formatter": "{value}%"}},
+                "series": [
+                    {"name": label, "type": "bar", "data": _pad(values, len(periods))}
+                    for label, values in changes
+                ],
+            }
+        )
+        title = f"{names[0]}{'/'.join(label for label, _ in changes)}（%）"
+        charts.append(_chart(next_id, title, option))
+    return charts
+
+
+def _correlation_chart(item, next_id):
+    columns = item["columns"]
+    data = [
+        [j, i, value]
+        for i, row in enumerate(item["matrix"])
+        for j, value in enumerate(row)
+        if value is not None
+    ]
+    option = {
+        "tooltip": {"position": "top"},
+        "grid": {"left": 16, "right": 24, "top": 16, "bottom": 64, "containLabel": True},
+        "xAxis": _category_axis(columns),
+        "yAxis": {"type": "category", "data": columns},
+        "visualMap": {
+            "min": -1,
+            "max": 1,
+            "calculable": True,
+            "orient": "horizontal",
+            "left": "center",
+            "bottom": 0,
+            "inRange": {"color": ["#3b6fb6", "#f7f7f7", "#c8453b"]},
+        },
+        "series": [
+            {"type": "heatmap", "data": data, "label": {"show": len(columns) <= 8}}
+        ],
+    }
+    return _chart(next_id, "数值列相关系数", option)
+
+
+def _profile_table(profiles):
+    columns = ["字段", "类型", "非空数", "唯一值数", "最小值", "最大值", "均值", "高频取值"]
+    rows = []
+    for profile in profiles:
+        top = "，".join(f"{value}({count})" for value, count in profile.get("top", []))
+        rows.append(
+            [
+                profile["name"],
+                profile["type"],
+                profile["non_null"],
+                profile["unique"],
+                profile.get("min"),
+                profile.get("max"),
+                profile.get("mean"),
+                top,
+            ]
+        )
+    return {"title": "字段概况", "columns": columns, "rows": rows}
+
+
+def build_sections(sheet_insights):
+    """
+    根据各工作表的预计算指标生成图表配置和数据表格
+
+    Args:
+        sheet_insights (list): (工作表名称, 预计算指标) 列表，单工作表时名称为 None
+
+    Returns:
+        list: 报告分节 {"title", "charts": [{"id", "title", "option"}], "tables": [...]}，
+        图表ID在整份报告内唯一
+    """
+    counter = 0
+
+    def next_id():
+        nonlocal counter
+        counter += 1
+        return f"chart-{counter}"
+
+    sections = []
+    for name, insights in sheet_insights:
+        charts, tables = [], []
+        for item in insights.get("breakdowns", []):
+            charts.extend(_breakdown_charts(item, next_id))
+            tables.append(_breakdown_table(item))
+        for item in insights.get("trends", []):
+            charts.extend(_trend_charts(item, next_id))
+        if insights.get("correlation"):
+            charts.append(_correlation_chart(insights["correlation"], next_id))
+        if insights.get("columns"):
+            tables.append(_profile_table(insights["columns"]))
+        sections.append(
+            {
+                "title": f"工作表：{name}" if name is not None else None,
+                "charts": charts,
+                "tables": tables,
+            }
+        )
+    return sections
+
+
+def list_charts(sections):
+    """报告中的全部图表，按出现顺序"""
+    return [chart for section in sections for chart in section["charts"]]
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return "\n".join(_text(item) for item in value)
+    return str(value).strip()
+
+
+def _texts(value):
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    return [text for text in (_text(item) for item in value) if text]
+
+
+def parse_narrative(text):
+    """
+    解析模型输出的文字解读 JSON
+
+    允许 JSON 前后有说明文字或代码块标记；无法解析时整段输出作为总结，报告仍可生成
+
+    Args:
+        text (str): 模型输出
+
+    Returns:
+        dict: title, summary, findings, charts（图表ID -> 解读）, suggestions
+    """
+    data = None
+    start, end = text.find("{"), text.rfind("}")
+    if start >= 0 and end > start:
+        try:
+            data = json.loads(text[start : end + 1])
+        except json.JSONDecodeError:
+            data = None
+
+    if not isinstance(data, dict):
+        logger.warning("无法解析模型输出的文字解读JSON，使用原始输出作为总结")
+        summary = re.sub(r"^```\w*|```$", "", text.strip()).strip()
+        return {
+            "title": DEFAULT_TITLE,
+            "summary": summary,
+            "findings": [],
+            "charts": {},
+            "suggestions": [],
+        }
+
+    captions = data.get("charts")
+    return {
+        "title": _text(data.get("title")) or DEFAULT_TITLE,
+        "summary": _text(data.get("summary")),
+        "findings": _texts(data.get("findings")),
+        "charts": (
+            {str(key): _text(value) for key, value in captions.items()}
+            if isinstance(captions, dict)
+            else {}
+        ),
+        "suggestions": _texts(data.get("suggestions")),
+    }
+
+
+def _rich_text(text):
+    """转义HTML，保留 **加粗** 标记和换行"""
+    escaped = _BOLD.sub(r"<strong>\1</strong>", html.escape(text))
+    return escaped.replace("\n", "<br>")
+
+
+def _list_html(items):
+    return "<ul>" + "".join(f"<li>{_rich_text(item)}</li>" for item in items) + "</ul>"
+
+
+def _cell_html(value):
+    if value is None:
+        return "<td></td>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<td class="num">{value:,}</td>'
+    return f"<td>{html.escape(str(value))}</td>"
+
+
+def _table_html(table):
+    head = "".join(f"<th>{html.escape(str(col))}</th>" for col in table["columns"])
+    body = "".join(
+        "<tr>" + "".join(_cell_html(value) for value in row) + "</tr>"
+        for row in table["rows"]
+    )
+    return (
+        f'<div class="card"><h3>{html.escape(table["title"])}</h3>'
+        f'<div class="table-wrap"><table><thead><tr>{head}</tr></thead>'
+        f"<tbody>{body}</tbody></table></div></div>"
+    )
+
+
+def _chart_html(chart, caption):
+    caption_html = f'<p class="caption">{_rich_text(caption)}</p>' if caption else ""
+    return (
+        f'<div class="card"><h3>{html.escape(chart["title"])}</h3>'
+        f'<div class="chart" id="{chart["id"]}"></div>{caption_html}</div>'
+    )
+
+
+def _card_section(title, content):
+    return f'<h2>{title}</h2><div class="card">{content}</div>'
+
+
+def render_report(sections, narrative, echarts_url, subtitle=""):
+    """
+    组装完整的HTML报告
+
+    Args:
+        sections (list): build_sections 的返回值
+        narrative (dict): parse_narrative 的返回值
+        echarts_url (str): ECharts 脚本地址
+        subtitle (str): 标题下方的说明文字
+
+    Returns:
+        str: HTML报告
+    """
+    parts = []
+    if narrative["summary"]:
+        parts.append(_card_section("数据概要", _rich_text(narrative["summary"])))
+    if narrative["findings"]:
+        parts.append(_card_section("主要发现", _list_html(narrative["findings"])))
+
+    for section in sections:
+        if section["title"]:
+            parts.append(f"<h2>{html.escape(section['title'])}</h2>")
+        if section["charts"]:
+            if not section["title"]:
+                parts.append("<h2>图表分析</h2>")
+            cards = "".join(
+                _chart_html(chart, narrative["charts"].get(chart["id"]))
+                for chart in section["charts"]
+            )
+            parts.append(f'<div class="grid">{cards}</div>')
+        if section["tables"]:
+            if not section["title"]:
+                parts.append("<h2>数据明细</h2>")
+            parts.extend(_table_html(table) for table in section["tables"])
+
+    if narrative["suggestions"]:
+        parts.append(_card_section("建议与提示", _list_html(narrative["suggestions"])))
+
+    specs = [
+        {"id": chart["id"], "option": chart["option"]} for chart in list_charts(sections)
+    ]
+    charts_json = json.dumps(specs, ensure_ascii=False, separators=(",", ":"))
+    # 避免数据中的 </script> 提前结束脚本块
+    charts_json = charts_json.replace("</", "<\\/")
+    return REPORT_TEMPLATE.substitute(
+        title=html.escape(narrative["title"]),
+        subtitle=html.escape(subtitle),
+        echarts_url=html.escape(echarts_url, quote=True),
+        body="\n".join(parts),
+        charts_json=charts_json,
+    )
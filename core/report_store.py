@@ -0,0 +1,260 @@
+"""
+报告存储
+每份报告使用唯一文件名，按文件名中的随机ID分两级子目录存放，避免单个目录无限增长；
+SQLite 索引记录报告的用户、源文件哈希、大小、创建时间和最近访问时间，
+下载时按索引定位文件，后台定期按存活时间和总大小清理
+
+升级前直接存放在报告目录下的报告在首次清理时加入索引，原下载链接继续有效
+"""
+
+import asyncio
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from core.compression import ENCODINGS
+from core.metrics import REPORT_GC_REMOVED
+
+logger = logging.getLogger(__name__)
+
+REPORT_PREFIX = "ai_analysis_report_"
+
+# 报告文件及其预压缩副本的后缀
+FILE_SUFFIXES = [""] + [suffix for _, suffix in ENCODINGS]
+
+# 下载时最近访问时间的最小更新间隔（秒），避免每次下载都写数据库
+TOUCH_INTERVAL = 60
+
+
+class ReportStore:
+    """分目录存放的HTML报告及其 SQLite 索引"""
+
+    def __init__(self, root: str, db_path: str, max_age: float, max_bytes: int):
+        """
+        初始化报告存储
+
+        Args:
+            root (str): 报告根目录
+            db_path (str): 索引数据库文件路径
+            max_age (float): 报告最近一次访问后的保留时间（秒），为0时不按时间清理
+            max_bytes (int): 报告总大小上限（字节），超出时按最近访问时间淘汰，为0时不限制
+        """
+        self.root = root
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._legacy_imported = False
+        os.makedirs(root, exist_ok=True)
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # 同步分析接口和后台清理会在其他线程中访问，连接由锁保护
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS reports (
+                filename TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                uid TEXT,
+                source_hash TEXT,
+                size INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_reports_accessed ON reports (accessed_at)"
+        )
+
+    def _execute(self, sql: str, params=()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def new_report(self, uid: Optional[str] = None) -> str:
+        """
+        分配新报告的保存路径并写入索引
+
+        文件名为 时间戳 + 随机ID，同一秒内生成的报告也不会互相覆盖
+
+        Args:
+            uid (Optional[str]): 用户ID
+
+        Returns:
+            str: 报告文件的绝对路径
+        """
+        report_id = uuid.uuid4().hex
+        now = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        filename = f"{REPORT_PREFIX}{now}_{report_id[:12]}.html"
+        relative_path = os.path.join(report_id[:2], report_id[2:4], filename)
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        created_at = time.time()
+        self._execute(
+            "INSERT INTO reports (filename, path, uid, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (filename, relative_path, uid, created_at, created_at),
+        )
+        return path
+
+    def complete(self, path: str, source_hash: Optional[str] = None) -> None:
+        """
+        报告及其压缩副本写入完成后记录源文件哈希和占用空间
+
+        Args:
+            path (str): new_report 返回的报告路径
+            source_hash (Optional[str]): 分析的源文件内容哈希
+        """
+        self._execute(
+            "UPDATE reports SET source_hash = ?, size = ? WHERE filename = ?",
+            (source_hash, self._files_size(path), os.path.basename(path)),
+        )
+
+    def discard(self, path: str) -> None:
+        """删除未完成的报告文件及其索引记录，用于生成失败时"""
+        row = {"filename": os.path.basename(path), "path": os.path.relpath(path, self.root)}
+        self._remove([row])
+
+    def resolve(self, filename: str) -> Optional[str]:
+        """
+        按文件名查找报告，并更新最近访问时间
+
+        Args:
+            filename (str): 报告文件名
+
+        Returns:
+            Optional[str]: 报告文件的绝对路径，不存在时返回 None
+        """
+        rows = self._execute(
+            "SELECT path, accessed_at FROM reports WHERE filename = ?", (filename,)
+        )
+        if not rows:
+            # 尚未加入索引的旧报告直接存放在根目录下
+            if os.path.basename(filename) != filename or filename.startswith("."):
+                return None
+            path = os.path.join(self.root, filename)
+            return path if os.path.isfile(path) else None
+
+        row = rows[0]
+        now = time.time()
+        if now - row["accessed_at"] > TOUCH_INTERVAL:
+            self._execute(
+                "UPDATE reports SET accessed_at = ? WHERE filename = ?", (now, filename)
+            )
+        return os.path.join(self.root, row["path"])
+
+    def import_legacy(self) -> int:
+        """将根目录下的旧报告加入索引，返回新加入的报告数"""
+        rows = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not (entry.is_file() and entry.name.endswith(".html")):
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                rows.append(
+                    (entry.name, entry.name, self._files_size(entry.path), mtime, mtime)
+                )
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO reports "
+                "(filename, path, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            return self._conn.total_changes - before
+
+    def gc(self) -> Dict[str, int]:
+        """
+        清理报告：先删除超过保留时间未访问的报告，总大小仍超限时按最近访问时间从旧到新淘汰
+
+        Returns:
+            Dict[str, int]: 按原因统计的删除数
+        """
+        if not self._legacy_imported:
+            imported = self.import_legacy()
+            self._legacy_imported = True
+            if imported:
+                logger.info(f"已将 {imported} 份旧报告加入索引")
+
+        removed = {"ttl": 0, "quota": 0}
+        if self.max_age > 0:
+            rows = self._execute(
+                "SELECT filename, path FROM reports WHERE accessed_at < ?",
+                (time.time() - self.max_age,),
+            )
+            removed["ttl"] = self._remove(rows)
+
+        if self.max_bytes > 0:
+            total = self.stats()["bytes"]
+            if total > self.max_bytes:
+                victims = []
+                rows = self._execute(
+                    "SELECT filename, path, size FROM reports ORDER BY accessed_at"
+                )
+                for row in rows:
+                    if total <= self.max_bytes:
+                        break
+                    victims.append(row)
+                    total -= row["size"]
+                removed["quota"] = self._remove(victims)
+
+        for reason, count in removed.items():
+            if count:
+                REPORT_GC_REMOVED.inc(count, reason=reason)
+        return removed
+
+    async def run_gc(self, interval: float) -> None:
+        """后台定期清理报告，在线程中执行避免阻塞事件循环"""
+        while True:
+            try:
+                removed = await asyncio.to_thread(self.gc)
+                if any(removed.values()):
+                    logger.info(f"报告清理完成: {removed}")
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"报告清理失败: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict[str, int]:
+        """返回报告数和占用空间"""
+        row = self._execute(
+            "SELECT COUNT(*) AS files, COALESCE(SUM(size), 0) AS bytes FROM reports"
+        )[0]
+        return {"files": row["files"], "bytes": row["bytes"]}
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _remove(self, rows: List[sqlite3.Row]) -> int:
+        for row in rows:
+            path = os.path.join(self.root, row["path"])
+            for suffix in FILE_SUFFIXES:
+                try:
+                    os.unlink(path + suffix)
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM reports WHERE filename = ?",
+                [(row["filename"],) for row in rows],
+            )
+        return len(rows)
+
+    @staticmethod
+    def _files_size(path: str) -> int:
+        """报告及其压缩副本的总大小"""
+        total = 0
+        for suffix in FILE_SUFFIXES:
+            try:
+                total += os.path.getsize(path + suffix)
+            except FileNotFoundError:
+                pass
+        return total
@@ -0,0 +1,184 @@
+"""
+提示词数据序列化
+将清洗后的数据转换为发送给大模型的文本，不同格式在可读性和 token 数之间取舍：
+- csv：pandas 默认CSV，浮点数保留完整精度，日期带 00:00:00
+- csv_compact：浮点数限制有效数字、整数值去掉 .0，日期列去掉全为零的时间部分
+- dict：在 csv_compact 基础上，重复出现的文本列用编号代替，编号对照放在数据之前
+- markdown：Markdown 表格
+- tsv：制表符分隔，值中的逗号无需加引号
+"""
+
+import numpy as np
+import pandas as pd
+
+FORMAT_CSV = "csv"
+FORMAT_CSV_COMPACT = "csv_compact"
+FORMAT_DICT = "dict"
+FORMAT_MARKDOWN = "markdown"
+FORMAT_TSV = "tsv"
+
+DATA_FORMATS = [FORMAT_CSV, FORMAT_CSV_COMPACT, FORMAT_DICT, FORMAT_MARKDOWN, FORMAT_TSV]
+
+FORMAT_LABELS = {
+    FORMAT_CSV: "以下是Excel文件的数据内容（CSV格式）：",
+    FORMAT_CSV_COMPACT: "以下是Excel文件的数据内容（CSV格式）：",
+    FORMAT_DICT: (
+        "以下是Excel文件的数据内容（CSV格式）。如数据前有「编码对照」，"
+        "对应列中的编号按对照表示原值："
+    ),
+    FORMAT_MARKDOWN: "以下是Excel文件的数据内容（Markdown表格）：",
+    FORMAT_TSV: "以下是Excel文件的数据内容（TSV格式，制表符分隔）：",
+}
+
+# 编码的文本列最多包含的不同取值数
+DICT_MAX_UNIQUE = 50
+
+# 取值平均长度不足该字符数的列编码后节省有限，不编码
+DICT_MIN_LENGTH = 3
+
+
+def _format_float(series, float_digits):
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    finite = values[np.isfinite(values)]
+    # 全部为整数值时按整数输出，去掉 .0
+    if len(finite) and (finite == np.round(finite)).all() and np.abs(finite).max() < 2**53:
+        return series.astype("Int64")
+    return series.map(lambda value: f"{value:.{float_digits}g}", na_action="ignore")
+
+
+def _format_datetime(series):
+    values = series.dropna()
+    if values.empty:
+        return series
+    if (values == values.dt.normalize()).all():
+        fmt = "%Y-%m-%d"
+    elif (values.dt.second == 0).all() and (values.dt.microsecond == 0).all():
+        fmt = "%Y-%m-%d %H:%M"
+    else:
+        fmt = "%Y-%m-%d %H:%M:%S"
+    return series.dt.strftime(fmt)
+
+
+def compact_frame(df, float_digits):
+    """
+    浮点数限制有效数字、日期去掉多余的时间部分，返回新的数据框
+
+    Args:
+        df (pd.DataFrame): 清洗后的数据
+        float_digits (int): 浮点数保留的有效数字位数
+
+    Returns:
+        pd.DataFrame: 转换后的数据
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_float_dtype(series):
+            series = _format_float(series, float_digits)
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            series = _format_datetime(series)
+        columns[col] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+def _text_codes(series):
+    """
+    文本列的编号与取值，category 列直接使用其类别和编号，不重新计算
+
+    Returns:
+        tuple: (从0开始的编号数组，空值为 -1, 排序后的取值)；不是文本列时返回 None
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.cat.remove_unused_categories()
+        categories = series.cat.categories
+        if categories.empty or pd.api.types.infer_dtype(categories, skipna=True) != "string":
+            return None
+        if not categories.is_monotonic_increasing:
+            series = series.cat.reorder_categories(categories.sort_values())
+            categories = series.cat.categories
+        return series.cat.codes.to_numpy(), categories
+
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return None
+    non_null = series.dropna()
+    if non_null.empty or pd.api.types.infer_dtype(non_null, skipna=True) != "string":
+        return None
+    return pd.factorize(series, sort=True)
+
+
+def dictionary_encode(df):
+    """
+    将取值较少且较长的文本列（含 category 列）替换为从1开始的编号
+
+    Returns:
+        tuple: (编码后的数据, 编码对照文本；没有编码的列时为空字符串)
+    """
+    encoded = {}
+    legend = []
+    for col in df.columns:
+        series = df[col]
+        text_codes = _text_codes(series)
+        if text_codes is None:
+            encoded[col] = series
+            continue
+        codes, categories = text_codes
+        present = codes[codes >= 0]
+        lengths = pd.Index(categories).str.len().to_numpy()
+        if (
+            len(categories) > DICT_MAX_UNIQUE
+            or len(categories) * 2 > len(present)
+            or lengths[present].mean() < DICT_MIN_LENGTH
+        ):
+            encoded[col] = series
+            continue
+
+        encoded[col] = pd.Series(codes + 1, index=series.index).where(codes >= 0).astype("Int64")
+        pairs = "|".join(f"{i + 1}={value}" for i, value in enumerate(categories))
+        legend.append(f"{col}: {pairs}")
+
+    return pd.DataFrame(encoded, index=df.index), "\n".join(legend)
+
+
+def _to_markdown(df):
+    def cell(series):
+        return series.astype(object).where(series.notna(), "").astype(str).str.replace(
+            "|", "\\|", regex=False
+        ).str.replace("\n", " ", regex=False)
+
+    header = "| " + " | ".join(str(col).replace("|", "\\|") for col in df.columns) + " |"
+    divider = "|" + "---|" * len(df.columns)
+    if df.empty:
+        return f"{header}\n{divider}\n"
+    cells = [cell(df[col]) for col in df.columns]
+    rows = cells[0].str.cat(cells[1:], sep=" | ") if len(cells) > 1 else cells[0]
+    return "\n".join([header, divider, *("| " + rows + " |")]) + "\n"
+
+
+def serialize_frame(df, data_format=FORMAT_CSV, float_digits=15):
+    """
+    按指定格式序列化数据
+
+    Args:
+        df (pd.DataFrame): 清洗后的数据
+        data_format (str): 格式名称，见 DATA_FORMATS
+        float_digits (int): 紧凑格式中浮点数保留的有效数字位数
+
+    Returns:
+        str: 数据文本
+    """
+    if data_format == FORMAT_CSV:
+        return df.to_csv(index=False)
+    if data_format not in DATA_FORMATS:
+        raise ValueError(f"未知的数据格式: {data_format}")
+
+    compact = compact_frame(df, float_digits)
+    if data_format == FORMAT_CSV_COMPACT:
+        return compact.to_csv(index=False)
+    if data_format == FORMAT_TSV:
+        return compact.to_csv(index=False, sep="\t")
+    if data_format == FORMAT_MARKDOWN:
+        return _to_markdown(compact)
+
+    encoded, legend = dictionary_encode(compact)
+    text = encoded.to_csv(index=False)
+    return f"编码对照：\n{legend}\n\n数据：\n{text}" if legend else text
@@ -0,0 +1,80 @@
+"""
+请求合并
+相同的分析请求同时到达时只执行一次，其余请求等待同一结果
+
+合并范围为单个进程，多 worker 部署时各进程分别合并
+"""
+
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+from core.metrics import COALESCED_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """按键合并并发执行的协程"""
+
+    def __init__(self, name: str):
+        """
+        初始化
+
+        Args:
+            name (str): 名称，用于指标标签
+        """
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def make_key(*parts: Optional[str]) -> str:
+        """
+        由多个字段计算合并键
+
+        Returns:
+            str: sha256 十六进制摘要
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            encoded = (part or "").encode("utf-8")
+            # 写入长度前缀，避免不同字段拼接后产生相同的字节序列
+            digest.update(len(encoded).to_bytes(8, "big"))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    async def do(self, key: str, func: Callable[..., Awaitable], *args):
+        """
+        执行协程函数，同一键已有执行中的任务时等待其结果
+
+        任务在独立的 Task 中运行，发起请求的客户端断开不会影响其他等待者
+
+        Args:
+            key (str): 合并键
+            func (Callable): 协程函数
+            *args: 函数参数
+
+        Returns:
+            协程返回值，所有等待者得到同一结果或同一异常
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(func(*args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            COALESCED_REQUESTS.inc(name=self.name)
+            logger.info(f"合并相同的进行中请求: {key[:12]}")
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有等待者都已取消时，避免出现未读取异常的警告
+        if not task.cancelled():
+            task.exception()
+
+    def inflight(self) -> int:
+        """返回执行中的任务数"""
+        return len(self._inflight)
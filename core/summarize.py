@@ -0,0 +1,250 @@
+"""
+数据摘要
+数据量超出提示词 token 预算时，生成包含表结构、统计信息、高频类别、分组汇总和
+分层抽样行的紧凑摘要，保证提示词大小不随文件大小增长
+"""
+
+import numpy as np
+import pandas as pd
+
+from core.serializers import FORMAT_CSV, FORMAT_LABELS, serialize_frame
+from core.tokens import estimate_tokens
+
+CSV_DATA_LABEL = FORMAT_LABELS[FORMAT_CSV]
+SUMMARY_DATA_LABEL = (
+    "数据量较大，以下是Excel文件的数据摘要（表结构、统计信息、高频类别、分组汇总及抽样行），"
+    "请基于摘要进行分析："
+)
+MULTI_SHEET_DATA_LABEL = "以下是Excel文件中多个工作表的数据内容，按工作表分别列出："
+
+# 估算完整数据大小时抽样的行数
+ESTIMATE_SAMPLE_ROWS = 200
+
+# 作为分组维度的列的唯一值数量范围
+GROUP_MIN_UNIQUE = 2
+GROUP_MAX_UNIQUE = 30
+
+
+def estimate_data_tokens(df, data_format=FORMAT_CSV, float_digits=15):
+    """根据前若干行估算整表序列化后的 token 数，避免序列化整个大表"""
+    if df.empty:
+        return estimate_tokens(serialize_frame(df, data_format, float_digits))
+    head = df.head(ESTIMATE_SAMPLE_ROWS)
+    head_tokens = estimate_tokens(serialize_frame(head, data_format, float_digits))
+    return int(head_tokens * len(df) / len(head))
+
+
+def _categorical_columns(df):
+    return [
+        col
+        for col in df.columns
+        if not pd.api.types.is_numeric_dtype(df[col])
+        and not pd.api.types.is_datetime64_any_dtype(df[col])
+    ]
+
+
+def _group_columns(df, limit):
+    """挑选适合作为分组维度的低基数类别列"""
+    candidates = []
+    for col in _categorical_columns(df):
+        unique = df[col].nunique(dropna=True)
+        if GROUP_MIN_UNIQUE <= unique <= GROUP_MAX_UNIQUE:
+            candidates.append((unique, col))
+    return [col for _, col in sorted(candidates)[:limit]]
+
+
+def _allocate_rows(sizes, n_rows):
+    """
+    将 n_rows 行平均分配给各分组，行数不足的分组用不完的名额分给其余分组
+
+    Args:
+        sizes (np.ndarray): 各分组的行数
+        n_rows (int): 总行数
+
+    Returns:
+        np.ndarray: 各分组抽取的行数，合计不超过 n_rows
+    """
+    quotas = np.zeros(len(sizes), dtype=np.int64)
+    remaining = n_rows
+    # 从小到大分配，小分组用不完的名额留给后面的大分组
+    order = np.argsort(sizes, kind="stable")
+    for i, group in enumerate(order):
+        share = -(-remaining // (len(order) - i))
+        quotas[group] = min(sizes[group], share)
+        remaining -= quotas[group]
+    return quotas
+
+
+def _stratified_sample(df, n_rows, by):
+    """按分组列分层抽样，各分组分到的行数尽量相同，行数不少于分组数时每个分组至少保留一行"""
+    if n_rows >= len(df):
+        return df
+    if by is None:
+        return df.sample(n=n_rows, random_state=0).sort_index()
+
+    shuffled = df.sample(frac=1, random_state=0)
+    grouped = shuffled.groupby(by, dropna=False, sort=False)
+    ids = grouped.ngroup().to_numpy()
+    quotas = _allocate_rows(np.bincount(ids), n_rows)
+    keep = grouped.cumcount().to_numpy() < quotas[ids]
+    return shuffled[keep].sort_index()
+
+
+def _fit_csv_lines(frame, token_budget, unit):
+    """
+    将表格转换为 CSV，超出 token 预算时只保留预算内的行，并注明省略的数量
+
+    Args:
+        frame (pd.DataFrame): 表格
+        token_budget (int): token 预算
+        unit (str): 省略说明中的计量单位，如「列」
+
+    Returns:
+        str: CSV 文本，至少包含表头
+    """
+    lines = frame.to_csv(index=False).splitlines()
+    if estimate_tokens("\n".join(lines)) <= token_budget:
+        return "\n".join(lines)
+
+    total = len(lines) - 1
+
+    def truncated(kept):
+        note = f"……其余 {total - kept} {unit}因篇幅省略（共 {total} {unit}）"
+        return "\n".join(lines[: kept + 1] + [note])
+
+    # 二分查找预算内能保留的最多行数，token 数按整段文本估算
+    low, high = 0, total
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(truncated(middle)) <= token_budget:
+            low = middle
+        else:
+            high = middle - 1
+    return truncated(low)
+
+
+def summarize_dataframe(df, token_budget, top_k=10, max_group_columns=3):
+    """
+    生成受 token 预算约束的数据摘要
+
+    Args:
+        df (pd.DataFrame): 清洗后的数据
+        token_budget (int): 摘要的 token 预算
+        top_k (int): 类别列展示的高频取值数量
+        max_group_columns (int): 最多使用的分组维度数量
+
+    Returns:
+        str: 数据摘要文本
+    """
+    sections = []
+    used = 0
+
+    def add_section(title, body, required=False):
+        nonlocal used
+        text = f"### {title}\n{body.strip()}\n"
+        tokens = estimate_tokens(text)
+        if not required and used + tokens > token_budget:
+            return False
+        sections.append(text)
+        used += tokens
+        return True
+
+    # 1. 概览与表结构
+    add_section("数据概览", f"共 {len(df)} 行，{len(df.columns)} 列", required=True)
+    schema = pd.DataFrame(
+        {
+            "列名": df.columns,
+            "类型": [str(dtype) for dtype in df.dtypes],
+            "非空数": df.notna().sum().to_numpy(),
+            "唯一值数": df.nunique(dropna=True).to_numpy(),
+        }
+    )
+    # 列数很多时表结构本身也可能超出预算，只列出预算内的列
+    schema_budget = token_budget - used - estimate_tokens("### 字段结构\n")
+    add_section("字段结构", _fit_csv_lines(schema, schema_budget, "列"), required=True)
+
+    # 2. 数值列统计
+    numeric_cols = list(df.select_dtypes(include="number").columns)
+    if numeric_cols:
+        stats = df[numeric_cols].describe().T
+        stats["sum"] = df[numeric_cols].sum()
+        add_section("数值列统计", stats.to_csv(float_format="%.6g"))
+
+    # 3. 日期范围
+    date_cols = list(df.select_dtypes(include="datetime").columns)
+    if date_cols:
+        lines = [f"{col}: {df[col].min()} ~ {df[col].max()}" for col in date_cols]
+        add_section("日期范围", "\n".join(lines))
+
+    # 4. 类别列高频取值
+    lines = []
+    for col in _categorical_columns(df):
+        counts = df[col].value_counts().head(top_k)
+        values = "，".join(f"{value}({count})" for value, count in counts.items())
+        lines.append(f"{col}: {values}")
+    if lines:
+        add_section(f"类别列高频取值（前{top_k}）", "\n".join(lines))
+
+    # 5. 分组汇总
+    group_cols = _group_columns(df, max_group_columns)
+    for col in group_cols:
+        if not numeric_cols:
+            break
+        grouped = df.groupby(col, dropna=False)[numeric_cols].sum()
+        grouped.insert(0, "行数", df.groupby(col, dropna=False).size())
+        if not add_section(f"按「{col}」分组汇总（求和）", grouped.to_csv(float_format="%.6g")):
+            break
+
+    # 6. 用剩余预算填充分层抽样行
+    remaining = token_budget - used
+    header_tokens = estimate_tokens(df.head(0).to_csv(index=False))
+    probe = df.head(ESTIMATE_SAMPLE_ROWS).to_csv(index=False, header=False)
+    per_row = max(estimate_tokens(probe) / max(min(len(df), ESTIMATE_SAMPLE_ROWS), 1), 1)
+    n_rows = int((remaining - header_tokens - 20) / per_row)
+    if n_rows > 0:
+        sample = _stratified_sample(df, n_rows, group_cols[0] if group_cols else None)
+        add_section(
+            f"抽样数据（{len(sample)} 行，CSV格式）",
+            sample.to_csv(index=False),
+            required=True,
+        )
+
+    return "\n".join(sections)
+
+
+def build_data_section(df, token_budget, data_format=FORMAT_CSV, float_digits=15):
+    """
+    构建提示词中的数据部分：预算内发送完整数据，超出预算时发送摘要
+
+    Args:
+        df (pd.DataFrame): 清洗后的数据
+        token_budget (int): 数据部分的 token 预算
+        data_format (str): 完整数据的序列化格式，见 core.serializers.DATA_FORMATS
+        float_digits (int): 紧凑格式中浮点数保留的有效数字位数
+
+    Returns:
+        tuple: (数据文本, 数据说明)
+    """
+    if estimate_data_tokens(df, data_format, float_digits) <= token_budget:
+        return serialize_frame(df, data_format, float_digits), FORMAT_LABELS[data_format]
+
+    print(f"数据超出提示词预算（{token_budget} tokens），改为发送数据摘要")
+    return summarize_dataframe(df, token_budget), SUMMARY_DATA_LABEL
+
+
+def combine_sheet_sections(sections):
+    """
+    合并多个工作表的数据部分
+
+    Args:
+        sections (List[tuple]): (工作表名称, 数据文本, 数据说明) 列表
+
+    Returns:
+        str: 合并后的数据文本
+    """
+    parts = []
+    for name, data_text, data_label in sections:
+        if not data_text.strip():
+            data_text = "（空工作表）"
+        parts.append(f"### 工作表：{name}\n{data_label}\n{data_text}")
+    return "\n\n".join(parts)
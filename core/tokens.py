@@ -0,0 +1,53 @@
+"""
+Token 数量估算
+优先使用 tiktoken 精确计数；未安装或编码文件无法加载时（如离线环境）退化为启发式估算
+"""
+
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER_ENCODING = "cl100k_base"
+
+# 中日韩字符及全角符号，启发式估算时按每字符一个 token 计
+_WIDE_CHARS = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """懒加载 tiktoken 编码，加载失败后不再重试"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            logger.warning(f"tiktoken 不可用，使用启发式估算 token 数: {str(e)}")
+            _encoding = None
+    return _encoding
+
+
+def estimate_tokens(text):
+    """
+    估算文本的 token 数
+
+    Args:
+        text (str): 文本
+
+    Returns:
+        int: token 数
+    """
+    if not text:
+        return 0
+
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    wide = len(_WIDE_CHARS.findall(text))
+    return wide + (len(text) - wide + 3) // 4
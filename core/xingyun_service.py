@@ -5,15 +5,27 @@
 """
 
 import requests
+import httpx
+import asyncio
 import json
 import os
+import random
+from contextlib import nullcontext
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from typing import Dict, List, Optional
-from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import logging
+import sys
+
+# 添加项目根目录到Python路径，便于直接运行本模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.limiter import UpstreamBusyError, UpstreamLimiter
+from core.metrics import UPSTREAM_RETRIES
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -175,6 +187,404 @@ class XingyunService:
         return {"message": "此功能需要根据实际API文档实现"}
 
 
+STREAM_DONE = object()
+
+
+def parse_sse_line(line: str):
+    """
+    解析 v1/chat/completions 返回的单行SSE数据
+
+    Args:
+        line (str): SSE中的一行
+
+    Returns:
+        增量文本；流结束时返回 STREAM_DONE；无内容的行返回 None
+    """
+    line = line.strip()
+    if not line.startswith("data:"):
+        return None
+
+    payload = line[len("data:") :].strip()
+    if payload == "[DONE]":
+        return STREAM_DONE
+
+    try:
+        chunk = json.loads(payload)
+    except json.JSONDecodeError:
+        logger.warning(f"无法解析的流式数据: {payload[:100]}")
+        return None
+
+    choices = chunk.get("choices") if isinstance(chunk, dict) else None
+    if not choices:
+        return None
+    delta = choices[0].get("delta") or {}
+    return delta.get("content") or None
+
+
+# 可重试的响应状态码
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class XingyunAPIError(Exception):
+    """星云接口请求失败"""
+
+    def __init__(
+        self,
+        message: str,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        retryable: bool = False,
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或HTTP日期），返回需等待的秒数"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def to_api_error(error: httpx.HTTPError) -> XingyunAPIError:
+    """将 httpx 异常转换为 XingyunAPIError，并判断是否可以重试"""
+    if isinstance(error, httpx.HTTPStatusError):
+        response = error.response
+        return XingyunAPIError(
+            f"API请求失败: {str(error)}",
+            status_code=response.status_code,
+            retry_after=parse_retry_after(response.headers.get("Retry-After")),
+            retryable=response.status_code in RETRY_STATUS_CODES,
+        )
+    # 读取超时说明模型已在生成，重试只会重复占用上游资源
+    retryable = isinstance(error, httpx.TransportError) and not isinstance(
+        error, httpx.ReadTimeout
+    )
+    return XingyunAPIError(f"API请求失败: {str(error)}", retryable=retryable)
+
+
+class AsyncXingyunService:
+    """星云Agent平台异步服务类，基于共享的长连接池"""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://www.xingyunlink.com/api",
+        pool_size: int = 100,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 600.0,
+        http2: bool = True,
+        limiter: Optional[UpstreamLimiter] = None,
+        max_retries: int = 0,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+    ):
+        """
+        初始化异步星云服务
+
+        Args:
+            api_key (str): API密钥
+            base_url (str): 基础URL
+            pool_size (int): 连接池最大连接数
+            connect_timeout (float): 建立连接超时时间（秒）
+            read_timeout (float): 读取响应超时时间（秒）
+            http2 (bool): 服务端支持时是否使用HTTP/2
+            limiter (Optional[UpstreamLimiter]): 并发与速率限制，为空时不限制
+            max_retries (int): 429/5xx 及连接错误的最大重试次数
+            backoff_base (float): 指数退避的基础等待时间（秒）
+            backoff_max (float): 单次退避的最长等待时间（秒），Retry-After 超过该值时不再重试
+        """
+        self.api_key = api_key
+        self.base_url = base_url
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        self.limits = httpx.Limits(
+            max_connections=pool_size, max_keepalive_connections=pool_size
+        )
+        self.timeout = httpx.Timeout(
+            read_timeout, connect=connect_timeout, pool=connect_timeout
+        )
+        self.http2 = http2
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """懒加载共享的 httpx.AsyncClient，需在事件循环内首次访问"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url.rstrip("/") + "/",
+                headers=self.headers,
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """关闭连接池"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _make_request(
+        self, method: str, endpoint: str, data: Optional[Dict] = None
+    ) -> Dict:
+        """
+        发送异步HTTP请求
+
+        Args:
+            method (str): HTTP方法
+            endpoint (str): 接口端点
+            data (Optional[Dict]): 请求数据
+
+        Returns:
+            Dict: 响应数据
+        """
+        if method.upper() not in ("GET", "POST"):
+            raise ValueError(f"不支持的HTTP方法: {method}")
+
+        try:
+            response = await self.client.request(
+                method.upper(), endpoint.lstrip("/"), json=data
+            )
+            response.raise_for_status()
+            return response.json()
+
+        except httpx.HTTPError as e:
+            logger.error(f"请求失败: {str(e)}")
+            raise to_api_error(e)
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON解析失败: {str(e)}")
+            raise XingyunAPIError(f"响应解析失败: {str(e)}")
+
+    def _slot(self, chat_id: Optional[str]):
+        """占用上游调用名额，未配置限流器时不限制"""
+        if self.limiter is None:
+            return nullcontext()
+        return self.limiter.slot(chat_id)
+
+    async def _throttle(self) -> None:
+        if self.limiter is not None:
+            await self.limiter.throttle()
+
+    async def _before_retry(self, error: XingyunAPIError, attempt: int) -> None:
+        """
+        判断失败的请求能否重试，可以时按退避时间等待
+
+        Raises:
+            UpstreamBusyError: 持续被限流（429）且无法继续重试
+            XingyunAPIError: 其他不可重试的错误
+        """
+        if error.retryable and attempt < self.max_retries:
+            if error.retry_after is not None:
+                delay = error.retry_after
+            else:
+                # 全抖动指数退避，避免大量请求同时重试
+                delay = random.uniform(
+                    0, min(self.backoff_max, self.backoff_base * 2**attempt)
+                )
+            if delay <= self.backoff_max:
+                reason = str(error.status_code) if error.status_code else "network"
+                UPSTREAM_RETRIES.inc(reason=reason)
+                logger.warning(f"{str(error)}，{delay:.1f}秒后第{attempt + 1}次重试")
+                await asyncio.sleep(delay)
+                return
+
+        if error.status_code == 429:
+            raise UpstreamBusyError(
+                "星云接口限流，请稍后重试", retry_after=error.retry_after
+            ) from error
+        raise error
+
+    async def chat_completion(
+        self,
+        messages: List[Dict],
+        chat_id: Optional[str] = None,
+        stream: bool = False,
+        detail: bool = False,
+        response_chat_item_id: Optional[str] = None,
+        variables: Optional[Dict] = None,
+        custom_uid: Optional[str] = None,
+    ) -> Dict:
+        """
+        发起对话请求
+
+        Args:
+            messages (List[Dict]): 消息列表
+            chat_id (Optional[str]): 对话ID
+            stream (bool): 是否流式响应
+            detail (bool): 是否返回详细信息
+            response_chat_item_id (Optional[str]): 响应消息ID
+            variables (Optional[Dict]): 变量
+            custom_uid (Optional[str]): 自定义用户ID
+
+        Returns:
+            Dict: 响应数据
+        """
+        endpoint = "v1/chat/completions"
+
+        data = {"messages": messages, "stream": stream, "detail": detail}
+
+        # 可选参数
+        if chat_id is not None:
+            data["chatId"] = chat_id
+        if response_chat_item_id is not None:
+            data["responseChatItemId"] = response_chat_item_id
+        if variables is not None:
+            data["variables"] = variables
+        if custom_uid is not None:
+            data["customUid"] = custom_uid
+
+        logger.info(f"发送对话请求: chat_id={chat_id}, stream={stream}")
+        async with self._slot(chat_id):
+            attempt = 0
+            while True:
+                await self._throttle()
+                try:
+                    return await self._make_request("POST", endpoint, data)
+                except XingyunAPIError as e:
+                    await self._before_retry(e, attempt)
+                    attempt += 1
+
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict],
+        chat_id: Optional[str] = None,
+        detail: bool = False,
+        variables: Optional[Dict] = None,
+        custom_uid: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        以流式方式发起对话请求，逐段返回模型输出的文本
+
+        Args:
+            messages (List[Dict]): 消息列表
+            chat_id (Optional[str]): 对话ID
+            detail (bool): 是否返回详细信息
+            variables (Optional[Dict]): 变量
+            custom_uid (Optional[str]): 自定义用户ID
+
+        Yields:
+            str: 增量文本片段
+        """
+        endpoint = "v1/chat/completions"
+
+        data = {"messages": messages, "stream": True, "detail": detail}
+        if chat_id is not None:
+            data["chatId"] = chat_id
+        if variables is not None:
+            data["variables"] = variables
+        if custom_uid is not None:
+            data["customUid"] = custom_uid
+
+        logger.info(f"发送流式对话请求: chat_id={chat_id}")
+        async with self._slot(chat_id):
+            attempt = 0
+            while True:
+                await self._throttle()
+                received = False
+                try:
+                    async with self.client.stream("POST", endpoint, json=data) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            content = parse_sse_line(line)
+                            if content is None:
+                                continue
+                            if content is STREAM_DONE:
+                                break
+                            received = True
+                            yield content
+                    return
+                except httpx.HTTPError as e:
+                    logger.error(f"流式请求失败: {str(e)}")
+                    error = to_api_error(e)
+                # 已输出部分内容后无法透明重试
+                if received:
+                    raise error
+                await self._before_retry(error, attempt)
+                attempt += 1
+
+    async def stream_chat_with_text(
+        self, text: str, chat_id: Optional[str] = None, **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        以流式方式发送文本消息
+
+        Args:
+            text (str): 文本内容
+            chat_id (Optional[str]): 对话ID
+            **kwargs: 其他参数
+
+        Yields:
+            str: 增量文本片段
+        """
+        messages = [{"role": "user", "content": text}]
+
+        async for content in self.stream_chat_completion(messages, chat_id, **kwargs):
+            yield content
+
+    async def chat_with_text(
+        self, text: str, chat_id: Optional[str] = None, **kwargs
+    ) -> Dict:
+        """
+        发送文本消息
+
+        Args:
+            text (str): 文本内容
+            chat_id (Optional[str]): 对话ID
+            **kwargs: 其他参数
+
+        Returns:
+            Dict: 响应数据
+        """
+        messages = [{"role": "user", "content": text}]
+
+        return await self.chat_completion(messages, chat_id, **kwargs)
+
+    async def chat_with_image(
+        self, text: str, image_url: str, chat_id: Optional[str] = None, **kwargs
+    ) -> Dict:
+        """
+        发送包含图片的消息
+
+        Args:
+            text (str): 文本内容
+            image_url (str): 图片URL
+            chat_id (Optional[str]): 对话ID
+            **kwargs: 其他参数
+
+        Returns:
+            Dict: 响应数据
+        """
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": text},
+                    {"type": "image_url", "image_url": {"url": image_url}},
+                ],
+            }
+        ]
+
+        return await self.chat_completion(messages, chat_id, **kwargs)
+
+
 class XingyunExcelAnalyzer:
     """星云Excel分析器"""
 
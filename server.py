@@ -8,6 +8,7 @@ from app import app
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
     host = "0.0.0.0"
+    workers = int(os.environ.get("WORKERS", 1))
 
     # 启动服务器
-    app.run(host=host, port=port, debug=False, access_log=True)
+    app.run(host=host, port=port, workers=workers, debug=False, access_log=True)